@@ -2,14 +2,49 @@
 Amadeus API client for real flight search.
 Uses Flight Offers Search when AMADEUS_API_KEY and AMADEUS_API_SECRET are set.
 """
+import asyncio
+import re
+import threading
 import time
-import requests
+from datetime import date
+from functools import lru_cache
+from urllib.parse import urlencode
+
+import httpx
 from django.conf import settings
+from django.core.cache import cache
+
+from .http_session import build_session, get_with_etag
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Pooled keep-alive session shared by all Amadeus calls
+_SESSION = build_session()
+
+# Hour/minute components of an ISO 8601 duration such as PT2H10M
+_ISO_DURATION_RE = re.compile(r'(\d+)([HMhm])')
+
+# Identical searches are served from the Django cache: briefly for same-day departures and
+# empty results, longer for future dates whose fares move slowly
+_OFFER_CACHE_TTL_SAME_DAY = 15 * 60
+_OFFER_CACHE_TTL_FUTURE = 6 * 3600
+_OFFER_CACHE_TTL_EMPTY = 120
+# ETag/body pairs kept for If-None-Match revalidation, as get_with_etag does by default
+_OFFER_ETAG_TTL = 900
+
+# Upper bound on in-flight Flight Offers requests per process, shared by threaded callers
+_MAX_CONCURRENT_REQUESTS = 10
+_request_slots = threading.BoundedSemaphore(_MAX_CONCURRENT_REQUESTS)
 
 # Token cache (in production use Redis or similar)
 _token_cache = {'token': None, 'expires': 0}
+_token_lock = threading.Lock()
 
 
+@lru_cache(maxsize=1)
 def _get_api_key():
     try:
         from decouple import config
@@ -18,6 +53,7 @@ def _get_api_key():
         return getattr(settings, 'AMADEUS_API_KEY', '') or ''
 
 
+@lru_cache(maxsize=1)
 def _get_api_secret():
     try:
         from decouple import config
@@ -31,6 +67,13 @@ def is_configured():
     return bool(_get_api_key() and _get_api_secret())
 
 
+def _response_json(resp):
+    """Decode a JSON response body, using orjson when available."""
+    if orjson is None:
+        return resp.json()
+    return orjson.loads(resp.content)
+
+
 def _normalize_base_url(url):
     return (url or '').strip().rstrip('/')
 
@@ -54,56 +97,184 @@ def _flight_offers_url():
     return base + path
 
 
-def get_token():
-    """Get OAuth token; use cache until near expiry."""
-    now = time.time()
+def _cached_token(now):
     if _token_cache['token'] and _token_cache['expires'] > now + 60:
         return _token_cache['token']
+    return None
+
+
+def get_token():
+    """Get OAuth token; use cache until near expiry."""
+    token = _cached_token(time.time())
+    if token:
+        return token
     key = _get_api_key()
     secret = _get_api_secret()
     if not key or not secret:
         return None
-    resp = requests.post(
-        _token_url(),
-        data={
-            'grant_type': 'client_credentials',
-            'client_id': key,
-            'client_secret': secret,
-        },
-        headers={'Content-Type': 'application/x-www-form-urlencoded'},
-        timeout=10,
-    )
-    if not resp.ok:
-        return None
-    data = resp.json()
-    _token_cache['token'] = data.get('access_token')
-    _token_cache['expires'] = now + (data.get('expires_in', 1799) - 60)
-    return _token_cache['token']
+    with _token_lock:
+        # Another thread may have refreshed the token while we waited.
+        now = time.time()
+        token = _cached_token(now)
+        if token:
+            return token
+        resp = _SESSION.post(
+            _token_url(),
+            data={
+                'grant_type': 'client_credentials',
+                'client_id': key,
+                'client_secret': secret,
+            },
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=10,
+        )
+        if not resp.ok:
+            return None
+        data = _response_json(resp)
+        _token_cache['expires'] = now + (data.get('expires_in', 1799) - 60)
+        _token_cache['token'] = data.get('access_token')
+        return _token_cache['token']
 
 
-def _fetch_flight_offers_raw(origin_iata, destination_iata, departure_date, return_date=None, adults=1):
-    """Call Amadeus Flight Offers Search. Returns raw list of offer dicts from API."""
-    token = get_token()
-    if not token:
-        return []
+def _flight_offer_params(origin_iata, destination_iata, departure_date, return_date=None, adults=1):
     params = {
         'originLocationCode': origin_iata[:3],
         'destinationLocationCode': destination_iata[:3],
         'departureDate': departure_date,
         'adults': adults,
     }
+    max_offers = getattr(settings, 'AMADEUS_MAX_OFFERS', None)
+    if max_offers:
+        params['max'] = max_offers
     if return_date:
         params['returnDate'] = return_date
-    resp = requests.get(
-        _flight_offers_url(),
-        params=params,
-        headers={'Authorization': 'Bearer ' + token},
-        timeout=15,
-    )
-    if not resp.ok:
+    return params
+
+
+def _offer_cache_key(query_string):
+    return 'amadeus:offers:' + query_string
+
+
+def _offer_etag_cache_key(query_string):
+    return 'amadeus:offers:etag:' + query_string
+
+
+def _offer_cache_ttl(departure_date, offers):
+    if not offers:
+        return _OFFER_CACHE_TTL_EMPTY
+    try:
+        day = date.fromisoformat(str(departure_date)[:10])
+    except ValueError:
+        return _OFFER_CACHE_TTL_SAME_DAY
+    return _OFFER_CACHE_TTL_FUTURE if day > date.today() else _OFFER_CACHE_TTL_SAME_DAY
+
+
+def _fetch_flight_offers_raw(origin_iata, destination_iata, departure_date, return_date=None, adults=1):
+    """Call Amadeus Flight Offers Search. Returns raw list of offer dicts from API."""
+    # Encode the query once; it doubles as the cache key and skips requests' param re-encoding.
+    query_string = urlencode(_flight_offer_params(
+        origin_iata, destination_iata, departure_date, return_date=return_date, adults=adults))
+    cache_key = _offer_cache_key(query_string)
+    cached = cache.get(cache_key)
+    if cached is not None:
+        return cached
+    token = get_token()
+    if not token:
+        return []
+    with _request_slots:
+        offers = get_with_etag(
+            _SESSION,
+            _flight_offers_url() + '?' + query_string,
+            _offer_etag_cache_key(query_string),
+            lambda resp: _response_json(resp).get('data') or [],
+            headers={'Authorization': 'Bearer ' + token},
+            timeout=15,
+        )
+    if offers is None:
+        return []
+    cache.set(cache_key, offers, _offer_cache_ttl(departure_date, offers))
+    return offers
+
+
+async def _get_flight_offers(client, url, headers, stored):
+    """
+    One Flight Offers GET for the batch path, revalidated with If-None-Match like get_with_etag.
+    Returns (offers, fresh (etag, offers) pair or None); offers is None when the call failed.
+    """
+    if stored:
+        headers = {**headers, 'If-None-Match': stored[0]}
+    # Take a slot from the same per-process cap as threaded callers, waiting off the event loop
+    await asyncio.to_thread(_request_slots.acquire)
+    try:
+        resp = await client.get(url, headers=headers)
+    finally:
+        _request_slots.release()
+    if stored and resp.status_code == 304:
+        return stored[1], None
+    if not resp.is_success:
+        return None, None
+    offers = _response_json(resp).get('data') or []
+    etag = resp.headers.get('ETag')
+    return offers, ((etag, offers) if etag else None)
+
+
+async def _gather_flight_offers_raw(token, query_strings):
+    """Return one offer list per encoded query, or None where the call failed."""
+    headers = {'Authorization': 'Bearer ' + token}
+    url = _flight_offers_url() + '?'
+    etag_keys = [_offer_etag_cache_key(query_string) for query_string in query_strings]
+    stored = cache.get_many(etag_keys)
+    limits = httpx.Limits(max_connections=_MAX_CONCURRENT_REQUESTS, max_keepalive_connections=_MAX_CONCURRENT_REQUESTS)
+    async with httpx.AsyncClient(limits=limits, timeout=15.0) as client:
+        responses = await asyncio.gather(
+            *[_get_flight_offers(client, url + query_string, headers, stored.get(key))
+              for query_string, key in zip(query_strings, etag_keys)],
+            return_exceptions=True,
+        )
+    results = []
+    fresh = {}
+    for key, resp in zip(etag_keys, responses):
+        if isinstance(resp, Exception):
+            results.append(None)
+            continue
+        offers, pair = resp
+        results.append(offers)
+        if pair is not None:
+            fresh[key] = pair
+    if fresh:
+        cache.set_many(fresh, _OFFER_ETAG_TTL)
+    return results
+
+
+def _fetch_flight_offers_raw_many(queries):
+    """
+    Fetch several Flight Offers Search queries concurrently over one client.
+    Each query is a tuple (origin_iata, destination_iata, departure_date[, return_date]).
+    Returns one raw offer list per query, in the same order; failed calls yield [].
+    """
+    # Callers may pass a generator; it is walked again below for each query's departure date
+    queries = list(queries)
+    query_strings = [urlencode(_flight_offer_params(*query)) for query in queries]
+    if not query_strings:
         return []
-    data = resp.json()
-    return data.get('data') or []
+    keys = [_offer_cache_key(query_string) for query_string in query_strings]
+    cached = cache.get_many(keys)
+    missing = [i for i, key in enumerate(keys) if key not in cached]
+    results = [cached.get(key) for key in keys]
+    if missing:
+        token = get_token()
+        fetched = asyncio.run(
+            _gather_flight_offers_raw(token, [query_strings[i] for i in missing])
+        ) if token else [None] * len(missing)
+        to_cache = {}
+        for i, offers in zip(missing, fetched):
+            results[i] = offers or []
+            if offers is not None:
+                ttl = _offer_cache_ttl(queries[i][2], offers)
+                to_cache.setdefault(ttl, {})[keys[i]] = offers
+        for ttl, entries in to_cache.items():
+            cache.set_many(entries, ttl)
+    return results
 
 
 def search_flight_offers(origin_iata, destination_iata, departure_date, return_date=None, adults=1):
@@ -137,18 +308,40 @@ def search_flight_offers_for_ai_search(origin_iata, destination_iata, departure_
     return [_map_one_offer_rich(offer, origin, dest) for offer in offers]
 
 
+def search_flight_offers_many(queries):
+    """
+    Batch form of search_flight_offers: queries are (origin_iata, destination_iata, departure_date[, return_date])
+    tuples, issued concurrently. Returns one list of mapped offers per query.
+    """
+    return [
+        [_map_one_offer(offer) for offer in offers]
+        for offers in _fetch_flight_offers_raw_many(queries)
+    ]
+
+
+def search_flight_offers_for_ai_search_many(origin_iata, departure_date, destinations, origin_airport_dict=None):
+    """
+    Batch form of search_flight_offers_for_ai_search for one origin and several destinations.
+    destinations is a list of (destination_iata, destination_airport_dict) pairs.
+    Returns one list of rich flight dicts per destination.
+    """
+    origin = origin_airport_dict or {'iata_code': origin_iata[:3], 'name': origin_iata, 'city': ''}
+    raw = _fetch_flight_offers_raw_many(
+        (origin_iata, destination_iata, departure_date) for destination_iata, _ in destinations
+    )
+    results = []
+    for (destination_iata, dest_dict), offers in zip(destinations, raw):
+        dest = dest_dict or {'iata_code': destination_iata[:3], 'name': destination_iata, 'city': ''}
+        results.append([_map_one_offer_rich(offer, origin, dest) for offer in offers])
+    return results
+
+
 def _map_one_offer_rich(offer, origin_airport_dict, destination_airport_dict):
     """Map one Amadeus offer to a flight dict with airport and times for AI search display."""
-    base = _map_one_offer(offer)
-    itineraries = offer.get('itineraries') or []
-    segments = (itineraries[0].get('segments') or []) if itineraries else []
-    seg0 = segments[0] if segments else {}
-    dep = (seg0.get('departure') or {}).get('at') or ''
-    arr = (seg0.get('arrival') or {}).get('at') or ''
+    base, seg0 = _map_offer_and_first_segment(offer)
     base['origin_airport'] = origin_airport_dict
     base['destination_airport'] = destination_airport_dict
-    base['departure_time'] = dep
-    base['arrival_time'] = arr
+    base['arrival_time'] = _segment_time(seg0, 'arrival')
     base['flight_number'] = base.get('number', '') or ''
     return base
 
@@ -174,59 +367,51 @@ def _segment_time(segment, side):
 
 
 def _airline_from_segment(segment):
-    operating = segment.get('operating') or {}
-    operating_code = operating.get('carrierCode') if isinstance(operating, dict) else None
-    return operating_code or segment.get('carrierCode', '') or 'Airline'
+    """Operating carrier if present, else the marketing carrier."""
+    operating = segment.get('operating')
+    if isinstance(operating, dict):
+        code = operating.get('carrierCode')
+        if code:
+            return code
+    return segment.get('carrierCode') or 'Airline'
 
 
 def _map_one_offer(offer):
     """Map one Amadeus flight offer to our minimal flight dict."""
+    return _map_offer_and_first_segment(offer)[0]
+
+
+def _map_offer_and_first_segment(offer):
+    """Walk the offer's itineraries once; return the mapped dict and the first outbound segment."""
     price_eur = _price_total_eur(offer)
     itineraries = offer.get('itineraries') or []
     outbound = _itinerary_at(itineraries, 0)
     inbound = _itinerary_at(itineraries, 1)
-    outbound_duration_minutes = _parse_iso_duration(outbound.get('duration') or 'PT0M')
-    return_duration_minutes = _parse_iso_duration(inbound.get('duration') or 'PT0M')
-    duration_minutes = outbound_duration_minutes + return_duration_minutes
+    outbound_duration_minutes = _parse_iso_duration(outbound.get('duration'))
+    return_duration_minutes = _parse_iso_duration(inbound.get('duration'))
     segments = _segments_for_itinerary(outbound)
     seg0 = segments[0] if segments else {}
-    airline = _airline_from_segment(seg0)
-    first_outbound = segments[0] if segments else {}
-    last_outbound = segments[-1] if segments else {}
     inbound_segments = _segments_for_itinerary(inbound)
-    first_inbound = inbound_segments[0] if inbound_segments else {}
-    last_inbound = inbound_segments[-1] if inbound_segments else {}
-    offer_id = offer.get('id', '') or ''
+    offer_id = offer.get('id') or ''
     return {
         'id': offer.get('id'),
         'price_eur': price_eur,
-        'duration_minutes': duration_minutes,
+        'duration_minutes': outbound_duration_minutes + return_duration_minutes,
         'outbound_duration_minutes': outbound_duration_minutes,
         'return_duration_minutes': return_duration_minutes,
         'trip_type': 'round_trip' if inbound else 'one_way',
-        'airline': airline,
+        'airline': _airline_from_segment(seg0),
         'number': seg0.get('number', '') or offer_id[:6],
-        'departure_time': _segment_time(first_outbound, 'departure'),
-        'arrival_time': _segment_time(last_outbound, 'arrival'),
-        'return_departure_time': _segment_time(first_inbound, 'departure'),
-        'return_arrival_time': _segment_time(last_inbound, 'arrival'),
-    }
+        'departure_time': _segment_time(seg0, 'departure'),
+        'arrival_time': _segment_time(segments[-1] if segments else {}, 'arrival'),
+        'return_departure_time': _segment_time(inbound_segments[0] if inbound_segments else {}, 'departure'),
+        'return_arrival_time': _segment_time(inbound_segments[-1] if inbound_segments else {}, 'arrival'),
+    }, seg0
 
 
 def _parse_iso_duration(s):
     """Parse ISO 8601 duration (e.g. PT2H10M) to minutes."""
-    s = (s or 'PT0M').upper().replace('PT', '')
     minutes = 0
-    acc = ''
-    for c in s:
-        if c == 'H':
-            minutes += 60 * int(acc or 0)
-            acc = ''
-        elif c == 'M':
-            minutes += int(acc or 0)
-            acc = ''
-        elif c.isdigit():
-            acc += c
-        else:
-            acc = ''
+    for amount, unit in _ISO_DURATION_RE.findall(s or ''):
+        minutes += int(amount) * (60 if unit in 'Hh' else 1)
     return minutes
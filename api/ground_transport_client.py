@@ -5,15 +5,34 @@ Providers:
 - google_routes (preferred)
 - navitia (legacy fallback)
 """
+from functools import lru_cache
+
 import requests
 from django.conf import settings
+from django.core.cache import cache
+
+from .http_session import build_session, get_with_etag
 
 try:
     from decouple import config
 except Exception:
     config = None
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Pooled keep-alive session shared by Navitia and Google Routes calls
+_SESSION = build_session()
 
+_NAVITIA_JOURNEYS_URL = '%s/coverage/%s/journeys'
+
+# Identical ground lookups within this window are served from the Django cache
+_GROUND_CACHE_TTL = 120
+
+
+@lru_cache(maxsize=None)
 def _get_setting(name, default=''):
     env_value = ''
     if config:
@@ -26,6 +45,13 @@ def _get_setting(name, default=''):
     return str(getattr(settings, name, default) or default).strip()
 
 
+def _response_json(resp):
+    """Decode a JSON response body, using orjson when available."""
+    if orjson is None:
+        return resp.json()
+    return orjson.loads(resp.content)
+
+
 def get_provider():
     """Return configured ground provider name."""
     provider = _get_setting('GROUND_PROVIDER', 'navitia').lower()
@@ -71,6 +97,18 @@ def is_configured():
 
 def get_ground_options(from_lat, from_lon, to_lat, to_lon):
     """Return normalized ground options from active provider."""
+    # ~10 m of rounding lets nearby repeat searches share an entry.
+    cache_key = 'ground:options:{}:{:.4f},{:.4f}:{:.4f},{:.4f}'.format(
+        get_provider(), float(from_lat), float(from_lon), float(to_lat), float(to_lon))
+    options = cache.get(cache_key)
+    if options is None:
+        options = _fetch_ground_options(from_lat, from_lon, to_lat, to_lon)
+        if options:
+            cache.set(cache_key, options, _GROUND_CACHE_TTL)
+    return options
+
+
+def _fetch_ground_options(from_lat, from_lon, to_lat, to_lon):
     provider = get_provider()
     options = []
     if provider == 'google_routes':
@@ -216,12 +254,12 @@ def _fetch_google_routes_for_payload(headers, payload):
     if not url:
         return []
     try:
-        resp = requests.post(url, headers=headers, json=payload, timeout=15)
+        resp = _SESSION.post(url, headers=headers, json=payload, timeout=15)
     except requests.RequestException:
         return []
     if not resp.ok:
         return []
-    data = resp.json() if resp.content else {}
+    data = _response_json(resp) if resp.content else {}
     return data.get('routes') or []
 
 
@@ -283,54 +321,72 @@ def _get_navitia_journeys(from_lat, from_lon, to_lat, to_lon):
     base_url = _get_navitia_base_url()
     if not base_url:
         return []
-    region = _get_navitia_region()
-    from_param = '{};{}'.format(from_lon, from_lat)
-    to_param = '{};{}'.format(to_lon, to_lat)
-    url = '{}/coverage/{}/journeys'.format(base_url.rstrip('/'), region)
-    params = {'from': from_param, 'to': to_param}
-    auth = (token, '')
+    url = _NAVITIA_JOURNEYS_URL % (base_url.rstrip('/'), _get_navitia_region())
+    params = {'from': f'{from_lon};{from_lat}', 'to': f'{to_lon};{to_lat}'}
     try:
-        resp = requests.get(url, params=params, auth=auth, timeout=15)
+        journeys = get_with_etag(
+            _SESSION, url,
+            'navitia:journeys:etag:{}:{}:{}'.format(url, params['from'], params['to']),
+            lambda resp: (_response_json(resp).get('journeys') or [])[:5],
+            params=params, auth=(token, ''), timeout=15,
+        )
     except requests.RequestException:
         return []
-    if not resp.ok:
-        return []
-    data = resp.json()
-    journeys = data.get('journeys') or []
     result = []
-    for journey in journeys[:5]:
-        duration_seconds = _journey_duration_seconds(journey)
+    for journey in journeys or []:
+        duration_seconds, summary = _journey_duration_and_summary(journey)
         if duration_seconds is None:
             continue
-        duration_minutes = max(0, int(round(duration_seconds / 60.0)))
-        fare = _journey_fare(journey)
         result.append({
-            'duration_minutes': duration_minutes,
-            'cost_eur': fare,
+            'duration_minutes': max(0, int(round(duration_seconds / 60.0))),
+            'cost_eur': _journey_fare(journey),
             'estimated_cost_eur': None,
             'distance_km': None,
             'mode': 'transit',
-            'name': _journey_summary(journey),
+            'name': summary,
             'transport_type': 'train',
             'provider': 'navitia',
         })
     return result
 
 
-def _journey_duration_seconds(journey):
-    if journey.get('durations'):
-        total = journey.get('durations', {}).get('total')
-        if total is not None:
-            return int(total)
+def _public_transport_label(section):
+    pt = section.get('mode') or section.get('pt_display_information')
+    if isinstance(pt, dict):
+        return pt.get('name') or 'Train'
+    return 'Train'
+
+
+def _street_network_label(section):
+    return 'Walk' if section.get('mode') == 'walking' else None
+
+
+# Navitia section types are lowercase per the API contract
+_SECTION_LABELERS = {
+    'public_transport': _public_transport_label,
+    'street_network': _street_network_label,
+}
+
+
+def _journey_duration_and_summary(journey):
+    """Single pass over a journey's sections: (duration_seconds or None, summary label)."""
     sections = journey.get('sections') or []
-    if not sections:
-        return None
-    total = 0
+    total = (journey.get('durations') or {}).get('total')
+    section_total = 0
+    modes = []
     for sec in sections:
         duration = sec.get('duration')
         if duration is not None:
-            total += int(duration)
-    return total if total > 0 else None
+            section_total += int(duration)
+        labeler = _SECTION_LABELERS.get(sec.get('type'))
+        label = labeler(sec) if labeler else None
+        if label:
+            modes.append(label)
+    if total is not None:
+        duration_seconds = int(total)
+    else:
+        duration_seconds = section_total if section_total > 0 else None
+    return duration_seconds, (' + '.join(modes) if modes else 'Public transport')
 
 
 def _journey_fare(journey):
@@ -343,17 +399,3 @@ def _journey_fare(journey):
             except (TypeError, ValueError):
                 pass
     return None
-
-
-def _journey_summary(journey):
-    sections = journey.get('sections') or []
-    modes = []
-    for sec in sections:
-        mode = (sec.get('type') or '').lower()
-        if mode == 'public_transport':
-            pt = sec.get('mode') or sec.get('pt_display_information') or {}
-            name = pt.get('name') if isinstance(pt, dict) else None
-            modes.append(name or 'Train')
-        elif mode == 'street_network' and sec.get('mode') == 'walking':
-            modes.append('Walk')
-    return ' + '.join(modes) if modes else 'Public transport'
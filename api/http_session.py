@@ -0,0 +1,44 @@
+"""
+Shared HTTP session factory for outbound provider calls (Amadeus, Navitia, Google Routes).
+"""
+import requests
+from django.core.cache import cache
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+
+def build_session(pool_connections=10, pool_maxsize=20):
+    """Return a requests.Session with keep-alive pooling and retries on transient gateway errors."""
+    session = requests.Session()
+    retry = Retry(
+        total=2,
+        backoff_factor=0.2,
+        status_forcelist=[502, 503, 504],
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retry)
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def get_with_etag(session, url, cache_key, decode, ttl=900, **kwargs):
+    """
+    GET url, revalidating a previously seen body with If-None-Match.
+    On 304 the stored decoded payload is returned without reading a body; on 200 the result of
+    decode(resp) is returned and stored with the response ETag. Returns None on other statuses.
+    """
+    stored = cache.get(cache_key)
+    headers = dict(kwargs.pop('headers', None) or {})
+    if stored:
+        headers['If-None-Match'] = stored[0]
+    resp = session.get(url, headers=headers, **kwargs)
+    if stored and resp.status_code == 304:
+        return stored[1]
+    if not resp.ok:
+        return None
+    data = decode(resp)
+    etag = resp.headers.get('ETag')
+    if etag:
+        cache.set(cache_key, (etag, data), ttl)
+    return data
@@ -0,0 +1,10 @@
+"""
+Pagination classes for API list endpoints.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class IataCursorPagination(CursorPagination):
+    """Keyset pagination over the unique iata_code, so deep pages stay an index range scan."""
+
+    ordering = 'iata_code'
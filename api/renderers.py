@@ -0,0 +1,32 @@
+"""
+orjson-backed DRF renderer.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+_drf_encoder = JSONEncoder()
+
+
+class ORJSONRenderer(JSONRenderer):
+    """
+    Drop-in JSONRenderer that encodes with orjson. Types orjson does not handle natively
+    (Decimal, lazy strings, querysets, datetimes) go through DRF's encoder so output matches.
+    Falls back to the stock renderer when orjson is missing or indentation is requested.
+    """
+
+    options = (
+        orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_PASSTHROUGH_DATETIME
+        if orjson else 0
+    )
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if orjson is None or data is None:
+            return super().render(data, accepted_media_type, renderer_context)
+        if self.get_indent(accepted_media_type or '', renderer_context or {}):
+            return super().render(data, accepted_media_type, renderer_context)
+        return orjson.dumps(data, default=_drf_encoder.default, option=self.options)
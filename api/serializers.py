@@ -8,9 +8,23 @@ from core.models import (
 
 
 class AirportSerializer(serializers.ModelSerializer):
+    def to_representation(self, instance):
+        # List serializers may provide a per-response cache so each airport is rendered once.
+        cache = self.context.get('airport_representations')
+        if cache is None:
+            return super().to_representation(instance)
+        representation = cache.get(instance.pk)
+        if representation is None:
+            representation = cache[instance.pk] = super().to_representation(instance)
+        return representation
+
     class Meta:
         model = Airport
-        fields = '__all__'
+        fields = (
+            'id', 'icao_code', 'iata_code', 'name', 'city', 'country',
+            'latitude', 'longitude', 'has_lounge', 'has_sleeping_pods',
+            'city_access_time', 'layover_quality_score',
+        )
 
 
 class GroundTransportSerializer(serializers.ModelSerializer):
@@ -19,7 +33,18 @@ class GroundTransportSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = GroundTransport
-        fields = '__all__'
+        fields = (
+            'id', 'name', 'transport_type', 'from_airport', 'to_airport', 'to_address',
+            'duration_minutes', 'cost_eur', 'distance_km',
+        )
+
+
+class FlightListSerializer(serializers.ListSerializer):
+    """Flight lists repeat a handful of airports; render each nested airport once per response."""
+
+    def to_representation(self, data):
+        self.context.setdefault('airport_representations', {})
+        return super().to_representation(data)
 
 
 class FlightSerializer(serializers.ModelSerializer):
@@ -28,7 +53,12 @@ class FlightSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Flight
-        fields = '__all__'
+        list_serializer_class = FlightListSerializer
+        fields = (
+            'id', 'flight_number', 'airline', 'origin_airport', 'destination_airport',
+            'departure_time', 'arrival_time', 'price_eur', 'duration_minutes', 'available_seats',
+            'historical_delay_probability', 'avg_delay_minutes', 'is_mistake_fare', 'normal_price_eur',
+        )
 
 
 class FlightConnectionSerializer(serializers.ModelSerializer):
@@ -38,7 +68,11 @@ class FlightConnectionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = FlightConnection
-        fields = '__all__'
+        fields = (
+            'id', 'first_flight', 'second_flight', 'ground_transport', 'layover_minutes',
+            'total_duration_minutes', 'total_cost_eur', 'connection_quality_score',
+            'is_self_transfer', 'self_transfer_risk', 'created_at',
+        )
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -53,7 +87,12 @@ class UserProfileSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = UserProfile
-        fields = '__all__'
+        fields = (
+            'id', 'user', 'first_name', 'last_name', 'email', 'phone_number', 'country_code',
+            'home_airport', 'currency', 'preferred_language', 'location_latitude', 'location_longitude',
+            'partner', 'partner_sync_code', 'budget_preference_eur', 'preferred_airlines',
+            'created_at', 'updated_at',
+        )
 
 
 class TripSearchSerializer(serializers.ModelSerializer):
@@ -61,7 +100,11 @@ class TripSearchSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TripSearch
-        fields = '__all__'
+        fields = (
+            'id', 'user', 'query_text', 'origin_city', 'destination_type', 'max_duration_hours',
+            'max_price_eur', 'date_range_start', 'date_range_end', 'weather_preference',
+            'ai_confidence_score', 'ai_parsed_data', 'created_at',
+        )
 
 
 class TripOptionSerializer(serializers.ModelSerializer):
@@ -72,7 +115,31 @@ class TripOptionSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = TripOption
-        fields = '__all__'
+        fields = (
+            'id', 'search', 'flight_connection', 'flight', 'final_destination_address',
+            'ground_transport_to_destination', 'total_trip_cost_eur', 'total_trip_time_minutes',
+            'match_score', 'rank', 'saved_at', 'display_data', 'created_at',
+        )
+
+    # Relations walked by the nested serializers above
+    SELECT_RELATED = (
+        'search__user',
+        'flight_connection__first_flight__origin_airport',
+        'flight_connection__first_flight__destination_airport',
+        'flight_connection__second_flight__origin_airport',
+        'flight_connection__second_flight__destination_airport',
+        'flight_connection__ground_transport__from_airport',
+        'flight_connection__ground_transport__to_airport',
+        'flight__origin_airport',
+        'flight__destination_airport',
+        'ground_transport_to_destination__from_airport',
+        'ground_transport_to_destination__to_airport',
+    )
+
+    @classmethod
+    def setup_eager_loading(cls, queryset, prefix=''):
+        """Join everything the serializer reads so a list serializes without N+1 queries."""
+        return queryset.select_related(*[prefix + path for path in cls.SELECT_RELATED])
 
 
 class CollaborativeVoteSerializer(serializers.ModelSerializer):
@@ -81,7 +148,7 @@ class CollaborativeVoteSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = CollaborativeVote
-        fields = '__all__'
+        fields = ('id', 'user', 'trip_option', 'vote_type', 'created_at')
 
 
 class PerfectMatchSerializer(serializers.ModelSerializer):
@@ -91,10 +158,18 @@ class PerfectMatchSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = PerfectMatch
-        fields = '__all__'
+        fields = ('id', 'user1', 'user2', 'trip_option', 'match_score', 'created_at')
+
+    @classmethod
+    def setup_eager_loading(cls, queryset):
+        queryset = queryset.select_related('user1', 'user2', 'trip_option')
+        return TripOptionSerializer.setup_eager_loading(queryset, prefix='trip_option__')
 
 
 class DelayPredictionSerializer(serializers.ModelSerializer):
     class Meta:
         model = DelayPrediction
-        fields = '__all__'
+        fields = (
+            'id', 'route', 'airline', 'day_of_week', 'time_of_day', 'delay_probability',
+            'avg_delay_minutes', 'sample_size', 'created_at', 'updated_at',
+        )
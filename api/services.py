@@ -1,21 +1,100 @@
 """
 Service layer for business logic
 """
+import hashlib
 import json
+import re
+import secrets
+import string
+import threading
 import time
+from bisect import bisect_left
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import groupby
 from datetime import datetime, timedelta, date, timezone
 from copy import deepcopy
 from urllib.parse import parse_qsl, urlencode, urlparse, urlunparse
 
 import httpx
+import numpy as np
 import openai
 from django.conf import settings
-from django.db.models import Q, F, DecimalField, ExpressionWrapper
-from django.db.models.functions import Coalesce
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q, F, Case, When, Value, BooleanField, IntegerField, FloatField, OuterRef, Subquery, Window, DecimalField, ExpressionWrapper
+from django.db.models.functions import Cast, Coalesce, Greatest, Least, RowNumber
 from geopy.geocoders import Nominatim
 from geopy.distance import geodesic
 
-from core.models import Airport, Flight, FlightConnection, GroundTransport, TripOption, TripSearch, CollaborativeVote, PerfectMatch, DelayPrediction, UserProfile
+from core.delays import lookup_delay
+from core.geo import airport_by_iata, airports_by_id, airports_within_radius
+from core.models import Airport, Flight, FlightConnection, GroundTransport, TripOption, TripSearch, CollaborativeVote, PerfectMatch, UserProfile
+
+
+_SYNC_CODE_ALPHABET = string.ascii_uppercase + string.digits
+_SYNC_CODE_ATTEMPTS = 5
+
+_GEOCODE_CACHE_TTL = 30 * 86400
+_GEOCODE_MISS_TTL = 3600
+# Nominatim usage policy: at most one request per second per application
+_NOMINATIM_MIN_INTERVAL = 1.0
+_nominatim_lock = threading.Lock()
+_nominatim_state = {'geolocator': None, 'last_call': 0.0}
+
+def _airport_gazetteer_coords(normalized):
+    """
+    Resolve an exact IATA or ICAO airport code from the local Airport table.
+    Returns (lat, lon) or None; city names and addresses are left to the geocoder.
+    """
+    if not normalized.isalpha():
+        return None
+    if len(normalized) == 3:
+        airport = airport_by_iata(normalized)
+        if airport:
+            return float(airport.latitude), float(airport.longitude)
+    elif len(normalized) == 4:
+        coords = Airport.objects.filter(icao_code=normalized.upper()).values_list(
+            'latitude', 'longitude').first()
+        if coords:
+            return float(coords[0]), float(coords[1])
+    return None
+
+
+# Keyword fallback parses are cached briefly so a failing LLM is not retried on every request
+_PARSE_FALLBACK_CACHE_TTL = 300
+
+# Keyword parsing patterns for AI search, compiled once
+_ORIGIN_FROM_RE = re.compile(r'(?:from|flying from)\s+([a-z]+)', re.IGNORECASE)
+_FIRST_WORD_RE = re.compile(r'^\s*([a-z]+)', re.IGNORECASE)
+_PRICE_RE = re.compile(r'€?\s*(\d+)\s*(?:eur|euro|€|euros)?')
+_DURATION_RE = re.compile(r'(\d+)\s*-?\s*h(?:our)?s?')
+_ORIGIN_PREFIX_RE = re.compile(r'^(?:from|flying from)\s+', re.IGNORECASE)
+_TRAILING_PUNCT_RE = re.compile(r'[.,;!?]+$')
+# (keywords, destination_type, weather implied by it); the first matching rule wins
+_DESTINATION_KEYWORDS = (
+    (('beach', 'sea'), 'beach', 'warm'),
+    (('mountain', 'ski'), 'mountain', 'snow'),
+    (('city', 'cities'), 'city', None),
+)
+# (keywords, weather_preference); an explicit weather word overrides the implied one
+_WEATHER_KEYWORDS = (
+    (('warm', 'sun'), 'warm'),
+    (('snow', 'cold'), 'snow'),
+)
+
+
+def _nominatim_geocode(address):
+    with _nominatim_lock:
+        if _nominatim_state['geolocator'] is None:
+            _nominatim_state['geolocator'] = Nominatim(user_agent="nearnode")
+        wait = _nominatim_state['last_call'] + _NOMINATIM_MIN_INTERVAL - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        try:
+            return _nominatim_state['geolocator'].geocode(address)
+        finally:
+            _nominatim_state['last_call'] = time.monotonic()
 
 
 class NearestAlternateService:
@@ -23,32 +102,43 @@ class NearestAlternateService:
 
     @staticmethod
     def geocode_address(address):
-        """Convert street address to lat/lon"""
-        geolocator = Nominatim(user_agent="nearnode")
+        """Convert street address to lat/lon (cached; addresses don't move)"""
+        normalized = ' '.join((address or '').split()).lower()
+        if not normalized:
+            return None, None
+        cache_key = 'geocode:' + hashlib.sha1(normalized.encode('utf-8')).hexdigest()
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return tuple(cached)
+        # Airport codes resolve offline; city names and free-form addresses go to Nominatim
+        coords = _airport_gazetteer_coords(normalized)
+        if coords:
+            cache.set(cache_key, coords, _GEOCODE_CACHE_TTL)
+            return coords
         try:
-            location = geolocator.geocode(address)
-            if location:
-                return location.latitude, location.longitude
+            location = _nominatim_geocode(address)
         except Exception as e:
             print(f"Geocoding error: {e}")
+            return None, None
+        if location:
+            coords = (location.latitude, location.longitude)
+            cache.set(cache_key, coords, _GEOCODE_CACHE_TTL)
+            return coords
+        cache.set(cache_key, (None, None), _GEOCODE_MISS_TTL)
         return None, None
 
     @staticmethod
-    def find_airports_in_radius(dest_lat, dest_lon, radius_km=100):
-        """Find all airports within radius"""
-        airports = Airport.objects.all()
-        nearby_airports = []
-
-        for airport in airports:
-            distance = geodesic((dest_lat, dest_lon), (float(
-                airport.latitude), float(airport.longitude))).kilometers
-            if distance <= radius_km:
-                nearby_airports.append({
-                    'airport': airport,
-                    'distance_km': distance
-                })
-
-        return sorted(nearby_airports, key=lambda x: x['distance_km'])
+    def find_airports_in_radius(dest_lat, dest_lon, radius_km=100, limit=None):
+        """Find all airports within radius, nearest first (optionally only the nearest `limit`)"""
+        ids, distances = airports_within_radius(float(dest_lat), float(dest_lon), radius_km)
+        if limit is not None:
+            ids, distances = ids[:limit], distances[:limit]
+        airports = airports_by_id(ids)
+        return [
+            {'airport': airports[airport_id], 'distance_km': distance}
+            for airport_id, distance in zip(ids, distances)
+            if airport_id in airports
+        ]
 
     @staticmethod
     def calculate_total_trip_cost(flight, ground_transport=None):
@@ -68,17 +158,8 @@ class NearestAlternateService:
 
     @staticmethod
     def _resolve_destination_coords(final_destination_address):
-        """Resolve destination to (lat, lon). Supports address or 3-letter airport code."""
-        addr = (final_destination_address or '').strip()
-        # If it looks like an airport code (3 letters), try airport first
-        if len(addr) == 3 and addr.isalpha():
-            try:
-                airport = Airport.objects.get(iata_code=addr.upper())
-                return float(airport.latitude), float(airport.longitude)
-            except Airport.DoesNotExist:
-                pass
-        dest_lat, dest_lon = NearestAlternateService.geocode_address(addr)
-        return dest_lat, dest_lon
+        """Resolve destination to (lat, lon). Supports address, city or airport code (see geocode_address)."""
+        return NearestAlternateService.geocode_address(final_destination_address)
 
     @staticmethod
     def find_best_alternates(origin_airport_code, final_destination_address, date, radius_km=100):
@@ -95,36 +176,29 @@ class NearestAlternateService:
             dest_lat, dest_lon, radius_km)
 
         # Get origin airport
-        try:
-            origin_airport = Airport.objects.get(iata_code=origin_code)
-        except Airport.DoesNotExist:
+        origin_airport = airport_by_iata(origin_code)
+        if origin_airport is None:
             return []
 
+        # One query each for flights and ground transport across all nearby airports
+        airport_ids = [item['airport'].id for item in nearby_airports]
+        flights_by_dest = defaultdict(list)
+        for flight in Flight.objects.filter(
+            origin_airport=origin_airport,
+            destination_airport_id__in=airport_ids,
+            departure_time__date=date
+        ).select_related('origin_airport', 'destination_airport'):
+            flights_by_dest[flight.destination_airport_id].append(flight)
+
+        transports = _preferred_ground_transports(airport_ids, final_destination_address)
+
         results = []
         for item in nearby_airports:
             airport = item['airport']
             distance = item['distance_km']
+            transport = transports.get(airport.id)
 
-            flights = Flight.objects.filter(
-                origin_airport=origin_airport,
-                destination_airport=airport,
-                departure_time__date=date
-            )
-
-            # Prefer transport to exact address, then any transport from this airport
-            ground_transports = list(
-                GroundTransport.objects.filter(
-                    from_airport=airport,
-                    to_address=final_destination_address.strip()
-                )
-            )
-            if not ground_transports:
-                ground_transports = list(
-                    GroundTransport.objects.filter(from_airport=airport)[:1]
-                )
-            transport = ground_transports[0] if ground_transports else None
-
-            for flight in flights:
+            for flight in flights_by_dest[airport.id]:
                 total_cost = NearestAlternateService.calculate_total_trip_cost(
                     flight, transport)
                 total_time = NearestAlternateService.calculate_total_trip_time(
@@ -140,9 +214,45 @@ class NearestAlternateService:
                     'ground_cost': transport.cost_eur if transport else 0,
                 })
 
-        results.sort(key=lambda x: (
-            x['total_cost_eur'], x['total_time_minutes']))
-        return results
+        return _sorted_by_columns(
+            results,
+            [r['total_cost_eur'] for r in results],
+            [r['total_time_minutes'] for r in results])
+
+
+def _sorted_by_columns(rows, primary, secondary):
+    """
+    Return rows ordered by (primary, secondary) ascending, ties kept in input order.
+
+    The keys are packed into two float arrays and ordered with one np.lexsort instead of
+    building a Python tuple per row.
+    """
+    if len(rows) < 2:
+        return list(rows)
+    order = np.lexsort((
+        np.fromiter(secondary, dtype=np.float64, count=len(rows)),
+        np.fromiter(primary, dtype=np.float64, count=len(rows)),
+    ))
+    return [rows[i] for i in order]
+
+
+def _preferred_ground_transports(airport_ids, final_destination_address):
+    """
+    Map airport id -> GroundTransport from that airport, preferring one to the exact
+    destination address, else any (lowest id). One query for all airports.
+    """
+    address = (final_destination_address or '').strip()
+    transports = GroundTransport.objects.filter(from_airport_id__in=airport_ids).annotate(
+        address_rank=Case(When(to_address=address, then=Value(0)), default=Value(1), output_field=IntegerField())
+    ).order_by('from_airport_id', 'address_rank', 'id')
+    return {
+        airport_id: next(group)
+        for airport_id, group in groupby(transports, key=lambda gt: gt.from_airport_id)
+    }
+
+
+# Upper bound on concurrent provider calls (Amadeus, Navitia/Google) per search
+_PROVIDER_MAX_WORKERS = 8
 
 
 def _safe_float(value, default=0.0):
@@ -167,7 +277,7 @@ class SmartNearbyAirportService:
         if isinstance(search_date, date):
             return search_date
         if isinstance(search_date, str):
-            return datetime.strptime(search_date, '%Y-%m-%d').date()
+            return date.fromisoformat(search_date)
         raise ValueError('Invalid date input')
 
     @staticmethod
@@ -176,7 +286,7 @@ class SmartNearbyAirportService:
         if not origin:
             return None
         if SmartNearbyAirportService._looks_like_iata(origin):
-            airport = Airport.objects.filter(iata_code=origin.upper()).first()
+            airport = airport_by_iata(origin)
             if airport:
                 return {
                     'lat': float(airport.latitude),
@@ -203,19 +313,10 @@ class SmartNearbyAirportService:
 
     @staticmethod
     def _find_origin_airports(origin_lat, origin_lon, radius_km=200, limit=12):
-        candidates = []
-        for airport in Airport.objects.all():
-            distance = geodesic(
-                (origin_lat, origin_lon),
-                (float(airport.latitude), float(airport.longitude))
-            ).kilometers
-            if distance <= radius_km:
-                candidates.append({
-                    'airport': airport,
-                    'origin_distance_km': distance,
-                })
-        candidates.sort(key=lambda x: x['origin_distance_km'])
-        return candidates[:limit]
+        return [
+            {'airport': item['airport'], 'origin_distance_km': item['distance_km']}
+            for item in NearestAlternateService.find_airports_in_radius(origin_lat, origin_lon, radius_km, limit)
+        ]
 
     @staticmethod
     def _resolve_destination_airports(destination_query, destination_radius_km=150, limit=12):
@@ -223,7 +324,7 @@ class SmartNearbyAirportService:
         if not query:
             return [], None
         if SmartNearbyAirportService._looks_like_iata(query):
-            airport = Airport.objects.filter(iata_code=query.upper()).first()
+            airport = airport_by_iata(query)
             return ([airport] if airport else []), (
                 (float(airport.latitude), float(
                     airport.longitude)) if airport else None
@@ -247,9 +348,9 @@ class SmartNearbyAirportService:
         if lat is None or lon is None:
             return [], None
         nearby = NearestAlternateService.find_airports_in_radius(
-            float(lat), float(lon), destination_radius_km
+            float(lat), float(lon), destination_radius_km, limit
         )
-        return [item['airport'] for item in nearby[:limit]], (float(lat), float(lon))
+        return [item['airport'] for item in nearby], (float(lat), float(lon))
 
     @staticmethod
     def _pick_ground_leg(origin_lat, origin_lon, origin_airport):
@@ -294,7 +395,16 @@ class SmartNearbyAirportService:
         ]
 
     @staticmethod
-    def _build_result(origin_info, destination_airport, flight_candidate, ground_leg, destination_coords):
+    def _destination_distance_km(destination_airport, destination_coords):
+        if not destination_coords:
+            return 0.0
+        return geodesic(
+            destination_coords,
+            (float(destination_airport.latitude), float(destination_airport.longitude))
+        ).kilometers
+
+    @staticmethod
+    def _build_result(origin_info, destination_airport, flight_candidate, ground_leg, destination_distance_km):
         origin_airport = origin_info['airport']
         origin_distance = origin_info['origin_distance_km']
         ground_cost = _safe_float(ground_leg.get('cost_eur'), None)
@@ -333,14 +443,6 @@ class SmartNearbyAirportService:
             }
             flight_id = offer.get('id')
 
-        destination_distance_km = 0.0
-        if destination_coords:
-            destination_distance_km = geodesic(
-                destination_coords,
-                (float(destination_airport.latitude),
-                 float(destination_airport.longitude))
-            ).kilometers
-
         return {
             'origin_airport': origin_airport,
             'airport': destination_airport,
@@ -361,14 +463,17 @@ class SmartNearbyAirportService:
     @staticmethod
     def _sort_results(results, sort_by='cost', sort_order='asc'):
         sort_key = (sort_by or 'cost').lower()
-        reverse = (sort_order or 'asc').lower() == 'desc'
+        sign = -1.0 if (sort_order or 'asc').lower() == 'desc' else 1.0
         if sort_key in ('duration', 'total_duration'):
-            def key(x): return (x['total_time_minutes'], x['total_cost_eur'])
+            primary, secondary = 'total_time_minutes', 'total_cost_eur'
         elif sort_key in ('radius', 'distance', 'origin_distance_km'):
-            def key(x): return (x['origin_distance_km'], x['total_cost_eur'])
+            primary, secondary = 'origin_distance_km', 'total_cost_eur'
         else:
-            def key(x): return (x['total_cost_eur'], x['total_time_minutes'])
-        return sorted(results, key=key, reverse=reverse)
+            primary, secondary = 'total_cost_eur', 'total_time_minutes'
+        return _sorted_by_columns(
+            results,
+            [sign * r[primary] for r in results],
+            [sign * r[secondary] for r in results])
 
     @staticmethod
     def _search_return(results, return_meta, origin_codes=None, destination_codes=None, origins_with_ground=None, origins_without_ground=None):
@@ -389,23 +494,45 @@ class SmartNearbyAirportService:
         results = []
         origins_with_ground = []
         origins_without_ground = []
-        for origin_info in origins:
-            origin_airport = origin_info['airport']
-            ground_leg = SmartNearbyAirportService._pick_ground_leg(
-                resolved_origin['lat'], resolved_origin['lon'], origin_airport
-            )
-            if ground_leg is None:
-                origins_without_ground.append(origin_airport.iata_code)
-                continue
-            origins_with_ground.append(origin_airport.iata_code)
-            for destination_airport in destinations:
-                if destination_airport.id == origin_airport.id:
+        # Ground and flight lookups are independent network calls; run them on a
+        # small pool so the search waits on the slowest call, not the sum of all.
+        with ThreadPoolExecutor(max_workers=_PROVIDER_MAX_WORKERS) as pool:
+            ground_futures = [
+                pool.submit(
+                    SmartNearbyAirportService._pick_ground_leg,
+                    resolved_origin['lat'], resolved_origin['lon'], origin_info['airport'],
+                )
+                for origin_info in origins
+            ]
+            flight_futures = []
+            for origin_info, ground_future in zip(origins, ground_futures):
+                origin_airport = origin_info['airport']
+                ground_leg = ground_future.result()
+                if ground_leg is None:
+                    origins_without_ground.append(origin_airport.iata_code)
                     continue
-                for candidate in SmartNearbyAirportService._flight_candidates(
-                        origin_airport, destination_airport, date_obj, use_real_api, trip_type, return_date):
+                origins_with_ground.append(origin_airport.iata_code)
+                for destination_airport in destinations:
+                    if destination_airport.id == origin_airport.id:
+                        continue
+                    flight_futures.append((
+                        origin_info, destination_airport, ground_leg,
+                        pool.submit(
+                            SmartNearbyAirportService._flight_candidates,
+                            origin_airport, destination_airport, date_obj, use_real_api, trip_type, return_date,
+                        ),
+                    ))
+            # Distance to the destination point depends only on the destination airport
+            destination_distances = {
+                airport.id: SmartNearbyAirportService._destination_distance_km(airport, destination_coords)
+                for airport in destinations
+            }
+            for origin_info, destination_airport, ground_leg, flight_future in flight_futures:
+                for candidate in flight_future.result():
                     results.append(
                         SmartNearbyAirportService._build_result(
-                            origin_info, destination_airport, candidate, ground_leg, destination_coords
+                            origin_info, destination_airport, candidate, ground_leg,
+                            destination_distances[destination_airport.id],
                         )
                     )
         return results, origins_with_ground, origins_without_ground
@@ -460,9 +587,10 @@ class SmartNearbyAirportService:
 
 
 def _real_alternates_for_airport(origin_code, origin_airport, airport, distance, date_str,
-                                 final_destination_address, dest_lat, dest_lon):
+                                 final_destination_address, dest_lat, dest_lon, db_transports=None):
     """Get Amadeus offers for origin->airport and return list of result dicts.
-    Ground transport: real from Navitia if configured, else from DB.
+    Ground transport: real from Navitia if configured, else from DB
+    (db_transports: optional prefetched _preferred_ground_transports map).
     """
     from api.amadeus_client import search_flight_offers
     from api import ground_transport_client as gtc
@@ -483,16 +611,9 @@ def _real_alternates_for_airport(origin_code, origin_airport, airport, distance,
             )
             transport_duration = int(transport.get('duration_minutes', 0))
     if transport is None:
-        ground_transports = list(
-            GroundTransport.objects.filter(
-                from_airport=airport,
-                to_address=(final_destination_address or '').strip()
-            )
-        )
-        if not ground_transports:
-            ground_transports = list(
-                GroundTransport.objects.filter(from_airport=airport)[:1])
-        transport = ground_transports[0] if ground_transports else None
+        if db_transports is None:
+            db_transports = _preferred_ground_transports([airport.id], final_destination_address)
+        transport = db_transports.get(airport.id)
         if transport:
             ground_cost = float(transport.cost_eur)
             transport_duration = transport.duration_minutes
@@ -537,19 +658,30 @@ def find_best_alternates_real(origin_airport_code, final_destination_address, da
         return []
     nearby_airports = NearestAlternateService.find_airports_in_radius(
         dest_lat, dest_lon, radius_km)
-    try:
-        origin_airport = Airport.objects.get(iata_code=origin_code)
-    except Airport.DoesNotExist:
+    origin_airport = airport_by_iata(origin_code)
+    if origin_airport is None:
+        return []
+    if not nearby_airports:
         return []
     date_str = date.strftime('%Y-%m-%d')
+    db_transports = _preferred_ground_transports(
+        [item['airport'].id for item in nearby_airports], final_destination_address)
     results = []
-    for item in nearby_airports:
-        results.extend(_real_alternates_for_airport(
-            origin_code, origin_airport, item['airport'], item['distance_km'],
-            date_str, final_destination_address, dest_lat, dest_lon
-        ))
-    results.sort(key=lambda x: (x['total_cost_eur'], x['total_time_minutes']))
-    return results
+    # Offer and journey lookups are independent network calls, so overlap them
+    with ThreadPoolExecutor(max_workers=min(_PROVIDER_MAX_WORKERS, len(nearby_airports))) as pool:
+        per_airport = pool.map(
+            lambda item: _real_alternates_for_airport(
+                origin_code, origin_airport, item['airport'], item['distance_km'],
+                date_str, final_destination_address, dest_lat, dest_lon, db_transports
+            ),
+            nearby_airports,
+        )
+        for airport_results in per_airport:
+            results.extend(airport_results)
+    return _sorted_by_columns(
+        results,
+        [r['total_cost_eur'] for r in results],
+        [r['total_time_minutes'] for r in results])
 
 
 class MultiModalConnectionService:
@@ -582,6 +714,37 @@ class MultiModalConnectionService:
             score += 1.0
         return min(10.0, max(0.0, score))
 
+    @staticmethod
+    def layover_quality_scores(airports, layover_minutes):
+        """Vectorized calculate_layover_quality_score over parallel sequences of airports and layovers."""
+        if not airports:
+            return []
+        present = np.array([airport is not None for airport in airports])
+        base = np.array([_safe_float(getattr(airport, 'layover_quality_score', 0), 0.0) for airport in airports])
+        lounge = np.array([bool(getattr(airport, 'has_lounge', False)) for airport in airports])
+        pods = np.array([bool(getattr(airport, 'has_sleeping_pods', False)) for airport in airports])
+        city_access = np.array([getattr(airport, 'city_access_time', 0) or 0 for airport in airports])
+        minutes = np.array([int(m) if m is not None else 0 for m in layover_minutes])
+        score = base + np.select(
+            [(minutes >= 60) & (minutes <= 180), minutes < 45, minutes > 360],
+            [2.0, -3.0, -1.0],
+            default=0.0,
+        )
+        score += np.where(lounge, 1.5, 0.0) + np.where(pods, 1.0, 0.0)
+        score += np.where((city_access > 0) & (minutes > 180), 1.0, 0.0)
+        return np.where(present, np.clip(score, 0.0, 10.0), 0.0).tolist()
+
+    @staticmethod
+    def _score_layovers(connections):
+        """Fill connection_quality for all layover connections in one vectorized pass."""
+        pending = [c for c in connections if c.get('connection_quality') is None]
+        scores = MultiModalConnectionService.layover_quality_scores(
+            [c['intermediate_airport'] for c in pending],
+            [c['layover_minutes'] for c in pending],
+        )
+        for connection, score in zip(pending, scores):
+            connection['connection_quality'] = score
+
     @staticmethod
     def find_train_connections(flight1, flight2, max_layover_hours=6):
         """Find train connections between two flights if layover is long"""
@@ -616,7 +779,7 @@ class MultiModalConnectionService:
             origin_airport=origin,
             destination_airport=destination,
             departure_time__date=date
-        ):
+        ).select_related('origin_airport', 'destination_airport'):
             connections.append({
                 'type': 'direct',
                 'flight': flight,
@@ -637,8 +800,6 @@ class MultiModalConnectionService:
         if key in seen:
             return
         seen.add(key)
-        quality = MultiModalConnectionService.calculate_layover_quality_score(
-            airport_a, int(layover))
         connections.append({
             'type': 'train_link',
             'flight1': flight1,
@@ -648,7 +809,7 @@ class MultiModalConnectionService:
             'intermediate_airport_b': airport_b,
             'total_cost': flight1.price_eur + flight2.price_eur + train.cost_eur,
             'total_time': flight1.duration_minutes + flight2.duration_minutes + train.duration_minutes,
-            'connection_quality': quality,
+            'connection_quality': None,  # scored in bulk by _score_layovers
             'layover_minutes': int(layover)
         })
 
@@ -664,8 +825,6 @@ class MultiModalConnectionService:
         if key in seen:
             return
         seen.add(key)
-        quality = MultiModalConnectionService.calculate_layover_quality_score(
-            intermediate, int(layover))
         connections.append({
             'type': 'connection',
             'flight1': flight1,
@@ -673,10 +832,35 @@ class MultiModalConnectionService:
             'intermediate_airport': intermediate,
             'total_cost': flight1.price_eur + flight2.price_eur,
             'total_time': flight1.duration_minutes + flight2.duration_minutes + int(layover),
-            'connection_quality': quality,
+            'connection_quality': None,  # scored in bulk by _score_layovers
             'layover_minutes': int(layover)
         })
 
+    @staticmethod
+    def _departures_by_origin(origin_ids, destination, **filters):
+        """Flights from any of origin_ids to destination, as {origin_id: (departure_times, flights)} sorted by departure."""
+        legs = {}
+        if not origin_ids:
+            return legs
+        for flight in Flight.objects.filter(
+            origin_airport_id__in=origin_ids,
+            destination_airport=destination,
+            **filters
+        ).select_related('origin_airport', 'destination_airport').order_by('departure_time', 'id'):
+            times, flights = legs.setdefault(flight.origin_airport_id, ([], []))
+            times.append(flight.departure_time)
+            flights.append(flight)
+        return legs
+
+    @staticmethod
+    def _first_departure_after(legs, origin_id, earliest):
+        """Earliest flight in legs[origin_id] departing at or after earliest, or None."""
+        if origin_id not in legs:
+            return None
+        times, flights = legs[origin_id]
+        i = bisect_left(times, earliest)
+        return flights[i] if i < len(flights) else None
+
     @staticmethod
     def create_multi_modal_connection(origin, destination, date):
         """Create connections with train links when beneficial.
@@ -692,56 +876,68 @@ class MultiModalConnectionService:
         MultiModalConnectionService._add_direct_connections(
             connections, origin, destination, date)
 
-        first_legs = Flight.objects.filter(
+        first_legs = list(Flight.objects.filter(
             origin_airport=origin,
             departure_time__date=date
-        ).select_related('destination_airport').exclude(
+        ).select_related('origin_airport', 'destination_airport').exclude(
             destination_airport=destination
-        )[:50]
-        for flight1 in first_legs:
-            airport_a = flight1.destination_airport
+        )[:50])
+        trains_by_airport = defaultdict(list)
+        if first_legs:
             for train in GroundTransport.objects.filter(
-                    from_airport=airport_a,
+                    from_airport_id__in={f.destination_airport_id for f in first_legs},
                     transport_type='train'
-            ).exclude(to_airport__isnull=True).exclude(to_airport=airport_a):
+            ).exclude(to_airport__isnull=True).exclude(
+                    to_airport_id=F('from_airport_id')).exclude(
+                    to_airport=destination).select_related('from_airport', 'to_airport').order_by('id'):
+                trains_by_airport[train.from_airport_id].append(train)
+        train_legs = MultiModalConnectionService._departures_by_origin(
+            {t.to_airport_id for trains in trains_by_airport.values() for t in trains},
+            destination, departure_time__date=date)
+        for flight1 in first_legs:
+            airport_a = flight1.destination_airport
+            for train in trains_by_airport.get(airport_a.id, ()):
                 airport_b = train.to_airport
-                if airport_b.id == destination.id:
-                    continue
                 layover_min = min_connection_mins + train.duration_minutes
-                flight2 = Flight.objects.filter(
-                    origin_airport=airport_b,
-                    destination_airport=destination,
-                    departure_time__date=date,
-                    departure_time__gte=flight1.arrival_time +
-                    timedelta(minutes=layover_min)
-                ).first()
+                flight2 = MultiModalConnectionService._first_departure_after(
+                    train_legs, airport_b.id,
+                    flight1.arrival_time + timedelta(minutes=layover_min))
                 if flight2:
                     MultiModalConnectionService._add_train_link_connection(
                         connections, seen, flight1, train, flight2,
                         airport_a, airport_b, max_layover_mins)
 
-        for intermediate in Airport.objects.exclude(
-                Q(id=origin.id) | Q(id=destination.id))[:20]:
-            flight1 = Flight.objects.filter(
-                origin_airport=origin,
-                destination_airport=intermediate,
-                departure_time__date=date
-            ).first()
+        intermediates = list(Airport.objects.exclude(
+            Q(id=origin.id) | Q(id=destination.id))[:20])
+        first_by_intermediate = {}
+        for flight1 in Flight.objects.filter(
+            origin_airport=origin,
+            destination_airport_id__in=[a.id for a in intermediates],
+            departure_time__date=date
+        ).select_related('origin_airport', 'destination_airport'):
+            first_by_intermediate.setdefault(flight1.destination_airport_id, flight1)
+        connecting_legs = {}
+        if first_by_intermediate:
+            connecting_legs = MultiModalConnectionService._departures_by_origin(
+                first_by_intermediate, destination,
+                departure_time__gte=min(f.arrival_time for f in first_by_intermediate.values()) +
+                timedelta(minutes=min_connection_mins))
+        for intermediate in intermediates:
+            flight1 = first_by_intermediate.get(intermediate.id)
             if not flight1:
                 continue
-            flight2 = Flight.objects.filter(
-                origin_airport=intermediate,
-                destination_airport=destination,
-                departure_time__gte=flight1.arrival_time +
-                timedelta(minutes=min_connection_mins)
-            ).first()
+            flight2 = MultiModalConnectionService._first_departure_after(
+                connecting_legs, intermediate.id,
+                flight1.arrival_time + timedelta(minutes=min_connection_mins))
             if flight2:
                 MultiModalConnectionService._add_same_airport_connection(
                     connections, seen, flight1, flight2, intermediate, max_layover_mins)
 
-        connections.sort(key=lambda x: (
-            x['total_cost'], -x['connection_quality']))
-        return connections
+        MultiModalConnectionService._score_layovers(connections)
+        return _sorted_by_columns(
+            connections,
+            [c['total_cost'] for c in connections],
+            [-c['connection_quality'] for c in connections])
 
 
 class AISearchService:
@@ -836,13 +1032,63 @@ class AISearchService:
             ).values_list('city', flat=True).distinct().order_by('city')
         )
 
+    @staticmethod
+    def _parse_cache_key(query_text, available_origin_cities=None, available_destination_cities=None):
+        normalized = ' '.join(str(query_text).lower().split())
+        context = '|'.join((','.join(available_origin_cities or ()), ','.join(available_destination_cities or ())))
+        digest = hashlib.sha256('{}\n{}'.format(normalized, context).encode('utf-8')).hexdigest()
+        return 'ai:parse:v2:' + digest
+
     @staticmethod
     def parse_query_with_ai(query_text, available_origin_cities=None, available_destination_cities=None):
-        """Use configured LLM to parse natural language query. Optionally pass DB-derived origin/destination cities so the model can normalize to actual data."""
+        """
+        Use configured LLM to parse natural language query. Optionally pass DB-derived origin/destination cities so the model can normalize to actual data.
+
+        LLM parses are cached per normalized query; when the LLM fails, the keyword fallback is cached for a few
+        minutes so a slow or down model is not retried on every request. With AI_SEARCH_ASYNC_PARSE on, a cache miss
+        returns the keyword parse right away and a Celery task fills the cache for the next request.
+        """
+        cached = cache.get(AISearchService._parse_cache_key(
+            query_text, available_origin_cities, available_destination_cities))
+        if cached is not None:
+            return cached
         client, model = AISearchService._get_llm_client_and_model()
         if client is None:
             return AISearchService._simple_parse(query_text), 0.5
+        if getattr(settings, 'AI_SEARCH_ASYNC_PARSE', False):
+            from .tasks import refresh_ai_query_parse
+            try:
+                refresh_ai_query_parse.delay(
+                    query_text, list(available_origin_cities or []), list(available_destination_cities or []))
+                return AISearchService._simple_parse(query_text), 0.5
+            except Exception as e:
+                import logging
+                logging.getLogger(__name__).warning("AI search: could not queue parse, parsing inline: %s", e)
+        return AISearchService._parse_query_with_llm(
+            client, model, query_text, available_origin_cities, available_destination_cities)
 
+    @staticmethod
+    def refresh_parsed_query(query_text, available_origin_cities=None, available_destination_cities=None):
+        """Parse query_text with the LLM and cache the result. Returns (parsed, confidence)."""
+        client, model = AISearchService._get_llm_client_and_model()
+        if client is None:
+            return AISearchService._simple_parse(query_text), 0.5
+        return AISearchService._parse_query_with_llm(
+            client, model, query_text, available_origin_cities, available_destination_cities)
+
+    @staticmethod
+    def _parse_query_with_llm(client, model, query_text, available_origin_cities, available_destination_cities):
+        """Run the LLM parse and cache (parsed, confidence); keyword fallbacks are only cached briefly."""
+        parsed, confidence = AISearchService._run_llm_parse(
+            client, model, query_text, available_origin_cities, available_destination_cities)
+        ttl = settings.AI_SEARCH_PARSE_CACHE_TTL if confidence >= 0.9 else _PARSE_FALLBACK_CACHE_TTL
+        cache.set(
+            AISearchService._parse_cache_key(query_text, available_origin_cities, available_destination_cities),
+            (parsed, confidence), ttl)
+        return parsed, confidence
+
+    @staticmethod
+    def _run_llm_parse(client, model, query_text, available_origin_cities, available_destination_cities):
         db_context = ''
         if available_origin_cities:
             db_context += f"\nAvailable origin cities in our flight database (use one of these if the user's origin matches): {', '.join(available_origin_cities)}."
@@ -902,12 +1148,10 @@ Return only a single JSON object with these keys. Use null for missing values. N
     @staticmethod
     def _parse_origin_keywords(query_text, query_lower):
         """Extract origin_city from 'from X' or first word. Case-insensitive."""
-        import re
-        from_match = re.search(
-            r'(?:from|flying from)\s+([a-z]+)', query_text, re.IGNORECASE)
+        from_match = _ORIGIN_FROM_RE.search(query_text)
         if from_match:
             return from_match.group(1).strip()
-        first_word = re.match(r'^\s*([a-z]+)', query_text, re.IGNORECASE)
+        first_word = _FIRST_WORD_RE.match(query_text)
         if not first_word:
             return None
         w = first_word.group(1).strip()
@@ -919,22 +1163,19 @@ Return only a single JSON object with these keys. Use null for missing values. N
     def _parse_destination_weather_keywords(query_lower):
         """Extract destination_type and weather_preference from keywords. Returns (dest_type, weather)."""
         dest_type, weather = None, None
-        if 'beach' in query_lower or 'sea' in query_lower:
-            dest_type, weather = 'beach', 'warm'
-        elif 'mountain' in query_lower or 'ski' in query_lower:
-            dest_type, weather = 'mountain', 'snow'
-        elif 'city' in query_lower or 'cities' in query_lower:
-            dest_type = 'city'
-        if 'warm' in query_lower or 'sun' in query_lower or 'sunny' in query_lower:
-            weather = 'warm'
-        elif 'snow' in query_lower or 'cold' in query_lower:
-            weather = 'snow'
+        for keywords, rule_type, rule_weather in _DESTINATION_KEYWORDS:
+            if any(keyword in query_lower for keyword in keywords):
+                dest_type, weather = rule_type, rule_weather
+                break
+        for keywords, rule_weather in _WEATHER_KEYWORDS:
+            if any(keyword in query_lower for keyword in keywords):
+                weather = rule_weather
+                break
         return dest_type, weather
 
     @staticmethod
     def _simple_parse(query_text):
         """Keyword-based parsing when Ollama is not used. Extracts origin, destination type, budget, duration, weather."""
-        import re
         empty = {
             'origin_city': None, 'destination_type': None, 'max_duration_hours': None,
             'max_price_eur': None, 'date_range_start': None, 'date_range_end': None,
@@ -946,14 +1187,13 @@ Return only a single JSON object with these keys. Use null for missing values. N
         result = dict(empty)
         result['origin_city'] = AISearchService._parse_origin_keywords(
             query_text, query_lower)
-        price_match = re.search(
-            r'€?\s*(\d+)\s*(?:eur|euro|€|euros)?', query_lower)
+        price_match = _PRICE_RE.search(query_lower)
         if price_match:
             try:
                 result['max_price_eur'] = float(price_match.group(1))
             except (TypeError, ValueError):
                 pass
-        duration_match = re.search(r'(\d+)\s*-?\s*h(?:our)?s?', query_lower)
+        duration_match = _DURATION_RE.search(query_lower)
         if duration_match:
             try:
                 result['max_duration_hours'] = int(duration_match.group(1))
@@ -974,8 +1214,7 @@ Return only a single JSON object with these keys. Use null for missing values. N
         if start:
             if isinstance(start, str):
                 try:
-                    dt = datetime.strptime(start[:10], '%Y-%m-%d')
-                    return start[:10], dt.date()
+                    return start[:10], date.fromisoformat(start[:10])
                 except ValueError:
                     pass
             if hasattr(start, 'strftime'):
@@ -996,7 +1235,7 @@ Return only a single JSON object with these keys. Use null for missing values. N
     @staticmethod
     def _search_by_query_amadeus(parsed_query, origin_airport, max_price, max_minutes):
         """Run AI search using Amadeus Flight Offers API. Returns list of match dicts."""
-        from api.amadeus_client import search_flight_offers_for_ai_search
+        from api.amadeus_client import search_flight_offers_for_ai_search_many
         date_str, _ = AISearchService._departure_date_from_parsed(parsed_query)
         dest_airports = AISearchService._dest_airports_for_amadeus(
             parsed_query, origin_airport)
@@ -1005,20 +1244,17 @@ Return only a single JSON object with these keys. Use null for missing values. N
             'name': origin_airport.name,
             'city': getattr(origin_airport, 'city', '') or '',
         }
-        all_offers = []
-        for dest_airport in dest_airports:
-            dest_dict = {
+        destinations = [
+            (dest_airport.iata_code, {
                 'iata_code': dest_airport.iata_code,
                 'name': dest_airport.name,
                 'city': getattr(dest_airport, 'city', '') or '',
-            }
-            offers = search_flight_offers_for_ai_search(
-                origin_airport.iata_code,
-                dest_airport.iata_code,
-                date_str,
-                origin_airport_dict=origin_dict,
-                destination_airport_dict=dest_dict,
-            )
+            })
+            for dest_airport in dest_airports
+        ]
+        all_offers = []
+        for offers in search_flight_offers_for_ai_search_many(
+                origin_airport.iata_code, date_str, destinations, origin_airport_dict=origin_dict):
             all_offers.extend(
                 AISearchService._amadeus_offers_to_matches(
                     offers, parsed_query, max_price, max_minutes)
@@ -1029,19 +1265,26 @@ Return only a single JSON object with these keys. Use null for missing values. N
 
     @staticmethod
     def _amadeus_offers_to_matches(offers, parsed_query, max_price, max_minutes):
-        """Convert Amadeus offer dicts to match dicts, filtering by price/duration."""
-        out = []
-        for flight_dict in offers:
-            price_eur = float(flight_dict.get('price_eur', 0))
-            dur = int(flight_dict.get('duration_minutes', 0))
-            if price_eur <= max_price and dur <= max_minutes:
-                out.append({
-                    'flight': flight_dict,
-                    'match_score': AISearchService._calculate_match_score(flight_dict, parsed_query),
-                    'total_trip_cost_eur': price_eur,
-                    'total_trip_time_minutes': dur,
-                })
-        return out
+        """Convert Amadeus offer dicts to match dicts, filtering by price/duration and scoring the batch at once."""
+        if not offers:
+            return []
+        prices = [float(flight_dict.get('price_eur', 0)) for flight_dict in offers]
+        durations = [int(flight_dict.get('duration_minutes', 0)) for flight_dict in offers]
+        kept = [
+            i for i, (price_eur, dur) in enumerate(zip(prices, durations))
+            if price_eur <= max_price and dur <= max_minutes
+        ]
+        scores = AISearchService._match_scores(
+            [prices[i] for i in kept], [durations[i] for i in kept], parsed_query)
+        return [
+            {
+                'flight': offers[i],
+                'match_score': float(score),
+                'total_trip_cost_eur': prices[i],
+                'total_trip_time_minutes': durations[i],
+            }
+            for i, score in zip(kept, scores.tolist())
+        ]
 
     @staticmethod
     def _parse_budget_and_duration(parsed_query):
@@ -1061,31 +1304,43 @@ Return only a single JSON object with these keys. Use null for missing values. N
         """Run AI search using flights in the database. Returns (search, options list of TripOption)."""
         matching_airports = AISearchService._find_matching_airports(
             parsed_query, origin_airport)
-        dest_airports = [a for a in matching_airports[:10]
-                         if a.id != origin_airport.id]
-        options = []
-        for dest_airport in dest_airports:
-            flights = Flight.objects.filter(
-                origin_airport=origin_airport,
-                destination_airport=dest_airport,
-                price_eur__lte=max_price,
-                duration_minutes__lte=max_minutes
-            )[:3]
-            for flight in flights:
-                match_score = AISearchService._calculate_match_score(
-                    flight, parsed_query)
-                option = TripOption.objects.create(
-                    search=search,
-                    flight=flight,
-                    total_trip_cost_eur=flight.price_eur,
-                    total_trip_time_minutes=flight.duration_minutes,
-                    match_score=match_score
-                )
-                options.append(option)
-        options.sort(key=lambda x: x.match_score, reverse=True)
-        for i, option in enumerate(options[:3], 1):
-            option.rank = i
-            option.save()
+        dest_ids = [a.id for a in matching_airports[:10]
+                    if a.id != origin_airport.id]
+        if not dest_ids:
+            return search, []
+        # One query: earliest three matching flights per destination, scored and ordered in SQL.
+        # Ties keep destination order, then departure, like the old per-destination loop.
+        # Every candidate is stored; only the top three get a rank and are returned.
+        flights = list(Flight.objects.filter(
+            origin_airport=origin_airport,
+            destination_airport_id__in=dest_ids,
+            price_eur__lte=max_price,
+            duration_minutes__lte=max_minutes
+        ).annotate(
+            nth_for_destination=Window(
+                RowNumber(),
+                partition_by=[F('destination_airport_id')],
+                order_by=[F('departure_time').asc(), F('id').asc()],
+            ),
+            destination_rank=Case(
+                *[When(destination_airport_id=pk, then=Value(i)) for i, pk in enumerate(dest_ids)],
+                output_field=IntegerField(),
+            ),
+            match_score=AISearchService._match_score_expression(parsed_query),
+        ).filter(nth_for_destination__lte=3).select_related(
+            'origin_airport', 'destination_airport'
+        ).order_by('-match_score', 'destination_rank', 'nth_for_destination'))
+        options = TripOption.objects.bulk_create([
+            TripOption(
+                search=search,
+                flight=flight,
+                total_trip_cost_eur=flight.price_eur,
+                total_trip_time_minutes=flight.duration_minutes,
+                match_score=flight.match_score,
+                rank=position if position <= 3 else 0,
+            )
+            for position, flight in enumerate(flights, 1)
+        ])
         return search, options[:3]
 
     @staticmethod
@@ -1129,12 +1384,14 @@ Return only a single JSON object with these keys. Use null for missing values. N
     @staticmethod
     def _origin_airport_candidates(origin):
         """Return list of Airport candidates for origin city name (city, name, or aliases)."""
-        candidates = list(Airport.objects.filter(city__icontains=origin))
-        if candidates:
-            return candidates
-        candidates = list(Airport.objects.filter(name__icontains=origin))
+        # City matches win over name matches; one query fetches both and tags which is which
+        candidates = list(Airport.objects.filter(
+            Q(city__icontains=origin) | Q(name__icontains=origin)
+        ).annotate(city_match=Case(
+            When(city__icontains=origin, then=Value(True)), default=Value(False), output_field=BooleanField(),
+        )))
         if candidates:
-            return candidates
+            return [a for a in candidates if a.city_match] or candidates
         aliases = {'milan': ['milano'], 'rome': [
             'roma'], 'munich': ['muenchen', 'münchen']}
         lower = origin.lower()
@@ -1154,13 +1411,11 @@ Return only a single JSON object with these keys. Use null for missing values. N
         """Resolve origin city name to an Airport. Prefers an airport that has outgoing flights in the database."""
         if not origin_city or not str(origin_city).strip():
             return None
-        import re
         origin = str(origin_city).strip()
         # Strip "from X" prefix so we match city name
-        origin = re.sub(r'^(?:from|flying from)\s+', '', origin,
-                        flags=re.IGNORECASE).strip() or origin
+        origin = _ORIGIN_PREFIX_RE.sub('', origin).strip() or origin
         # trailing punctuation
-        origin = re.sub(r'[.,;!?]+$', '', origin).strip() or origin
+        origin = _TRAILING_PUNCT_RE.sub('', origin).strip() or origin
         if not origin:
             return None
         candidates = AISearchService._origin_airport_candidates(origin)
@@ -1198,9 +1453,11 @@ Return only a single JSON object with these keys. Use null for missing values. N
             q = Q()
             for k in keywords:
                 q |= Q(city__icontains=k) | Q(name__icontains=k)
-            qs = Airport.objects.filter(q).distinct()
-            if qs.exists():
-                return qs
+            # Callers use at most ten destinations; fetch them in the same query that checks for any.
+            # Explicit name/id order keeps the ten stable across runs and backends.
+            matches = list(Airport.objects.filter(q).order_by('name', 'id')[:10])
+            if matches:
+                return matches
         # Use actual flights database: destinations that have at least one flight from origin
         if origin_airport:
             dest_ids = Flight.objects.filter(origin_airport=origin_airport).values_list(
@@ -1209,6 +1466,54 @@ Return only a single JSON object with these keys. Use null for missing values. N
             return Airport.objects.filter(id__in=dest_ids)
         return Airport.objects.all()[:20]
 
+    @staticmethod
+    def _score_limits(parsed_query):
+        """Return (max_price, max_hours) used for match scoring; 0 disables that term."""
+        try:
+            max_price = float(parsed_query.get('max_price_eur') or 0)
+        except (TypeError, ValueError):
+            max_price = 0
+        try:
+            max_hours = int(parsed_query.get('max_duration_hours') or 0)
+        except (TypeError, ValueError):
+            max_hours = 0
+        return max_price, max_hours
+
+    @staticmethod
+    def _match_score_expression(parsed_query):
+        """SQL form of _match_scores, for annotating Flight querysets."""
+        max_price, max_hours = AISearchService._score_limits(parsed_query)
+        score = Value(100.0)
+        if max_price > 0:
+            score = score + Case(
+                When(price_eur__gt=max_price, then=Value(-50.0)),
+                default=(Value(1.0) - Cast('price_eur', FloatField()) / Value(max_price)) * Value(20.0),
+                output_field=FloatField(),
+            )
+        if max_hours > 0:
+            max_minutes = max_hours * 60
+            score = score + Case(
+                When(duration_minutes__gt=max_minutes, then=Value(-30.0)),
+                default=(Value(1.0) - Cast('duration_minutes', FloatField()) / Value(float(max_minutes))) * Value(10.0),
+                output_field=FloatField(),
+            )
+        return Greatest(Value(0.0), Least(Value(100.0), score, output_field=FloatField()), output_field=FloatField())
+
+    @staticmethod
+    def _match_scores(prices, durations, parsed_query):
+        """Vectorized _calculate_match_score over parallel price/duration sequences. Returns a float array."""
+        max_price, max_hours = AISearchService._score_limits(parsed_query)
+        price = np.array([float(p or 0) for p in prices], dtype=np.float64)
+        duration = np.array([int(d or 0) for d in durations], dtype=np.float64)
+        score = np.full(price.shape, 100.0)
+        # Branch-free form of the scalar scorer: the bonus term is already 0 wherever the penalty applies
+        if max_price > 0:
+            score += np.maximum(0.0, 1 - price / max_price) * 20 - 50.0 * (price > max_price)
+        if max_hours > 0:
+            max_minutes = max_hours * 60
+            score += np.maximum(0.0, 1 - duration / max_minutes) * 10 - 30.0 * (duration > max_minutes)
+        return np.clip(score, 0, 100)
+
     @staticmethod
     def _calculate_match_score(flight, parsed_query):
         """Calculate how well flight matches query. flight can be a Flight model or a dict with price_eur, duration_minutes."""
@@ -1246,27 +1551,41 @@ class CollaborativeService:
 
     @staticmethod
     def generate_sync_code():
-        """Generate unique sync code for partner linking"""
-        import random
-        import string
-        return ''.join(random.choices(string.ascii_uppercase + string.digits, k=8))
+        """Generate a random sync code for partner linking"""
+        return ''.join(secrets.choice(_SYNC_CODE_ALPHABET) for _ in range(8))
+
+    @staticmethod
+    def assign_sync_code(profile):
+        """
+        Give profile a fresh sync code. Uniqueness is enforced by the column's unique constraint;
+        a collision just retries with a new code. Returns the code, or None if every attempt collided.
+        """
+        for _ in range(_SYNC_CODE_ATTEMPTS):
+            profile.partner_sync_code = CollaborativeService.generate_sync_code()
+            try:
+                with transaction.atomic():
+                    profile.save(update_fields=['partner_sync_code', 'updated_at'])
+                return profile.partner_sync_code
+            except IntegrityError:
+                continue
+        profile.partner_sync_code = None
+        return None
 
     @staticmethod
     def link_partners(user1, sync_code):
         """Link two users via sync code"""
-        try:
-            profile2 = UserProfile.objects.get(partner_sync_code=sync_code)
-            profile1, _ = UserProfile.objects.get_or_create(user=user1)
+        profile2 = UserProfile.objects.select_related('user').filter(partner_sync_code=sync_code).first()
+        if profile2 is None:
+            return False
+        profile1, _ = UserProfile.objects.get_or_create(user=user1)
 
-            profile1.partner = profile2.user
-            profile1.save()
+        profile1.partner = profile2.user
+        profile1.save(update_fields=['partner', 'updated_at'])
 
-            profile2.partner = user1
-            profile2.save()
+        profile2.partner = user1
+        profile2.save(update_fields=['partner', 'updated_at'])
 
-            return True
-        except UserProfile.DoesNotExist:
-            return False
+        return True
 
     @staticmethod
     def vote_on_option(user, trip_option, vote_type):
@@ -1279,45 +1598,52 @@ class CollaborativeService:
         return vote
 
     @staticmethod
-    def find_perfect_matches(user1, user2):
-        """Find perfect matches where both users liked the same option"""
-        user1_votes = CollaborativeVote.objects.filter(
-            user=user1,
-            vote_type__in=['like', 'super_like']
-        ).values_list('trip_option_id', flat=True)
-
-        user2_votes = CollaborativeVote.objects.filter(
+    def find_perfect_matches(user1, user2, limit=None):
+        """
+        Find perfect matches where both users liked the same option. Returns an unevaluated queryset,
+        best first, so callers can add their own select_related; limit is applied in SQL.
+        """
+        liked = ['like', 'super_like']
+        partner_vote = CollaborativeVote.objects.filter(
             user=user2,
-            vote_type__in=['like', 'super_like']
-        ).values_list('trip_option_id', flat=True)
-
-        # Find common options
-        common_options = set(user1_votes) & set(user2_votes)
+            trip_option=OuterRef('trip_option_id'),
+            vote_type__in=liked
+        ).values('vote_type')[:1]
+        # One query: options user1 liked, joined to user2's like on the same option
+        common_votes = CollaborativeVote.objects.filter(
+            user=user1,
+            vote_type__in=liked
+        ).annotate(partner_vote=Subquery(partner_vote)).filter(
+            partner_vote__isnull=False
+        ).values_list('trip_option_id', 'vote_type', 'partner_vote')
 
         matches = []
-        for option_id in common_options:
-            option = TripOption.objects.get(id=option_id)
-            user1_vote = CollaborativeVote.objects.get(
-                user=user1, trip_option=option)
-            user2_vote = CollaborativeVote.objects.get(
-                user=user2, trip_option=option)
-
+        for option_id, user1_vote, user2_vote in common_votes:
             # Calculate match score
             score = 50.0
-            if user1_vote.vote_type == 'super_like':
+            if user1_vote == 'super_like':
                 score += 25
-            if user2_vote.vote_type == 'super_like':
+            if user2_vote == 'super_like':
                 score += 25
-
-            match, _ = PerfectMatch.objects.update_or_create(
-                user1=user1,
-                user2=user2,
-                trip_option=option,
-                defaults={'match_score': score}
-            )
-            matches.append(match)
-
-        return sorted(matches, key=lambda x: x.match_score, reverse=True)
+            matches.append(PerfectMatch(
+                user1=user1, user2=user2, trip_option_id=option_id, match_score=score))
+        if not matches:
+            return PerfectMatch.objects.none()
+
+        PerfectMatch.objects.bulk_create(
+            matches,
+            update_conflicts=True,
+            unique_fields=['user1', 'user2', 'trip_option'],
+            update_fields=['match_score'],
+        )
+        ranked = PerfectMatch.objects.filter(
+            user1=user1,
+            user2=user2,
+            trip_option_id__in=[match.trip_option_id for match in matches]
+        ).order_by('-match_score', 'id')
+        if limit is not None:
+            ranked = ranked[:limit]
+        return ranked
 
 
 class DelayPredictionService:
@@ -1329,18 +1655,15 @@ class DelayPredictionService:
         route = f"{flight.origin_airport.iata_code}-{flight.destination_airport.iata_code}"
         day_of_week = flight.departure_time.weekday()
 
-        # Try to get historical data
-        prediction = DelayPrediction.objects.filter(
-            route=route,
-            airline=flight.airline,
-            day_of_week=day_of_week
-        ).first()
+        # Try to get historical data (in-process table, reloaded after writes)
+        prediction = lookup_delay(route, flight.airline, day_of_week)
 
         if prediction:
+            delay_probability, avg_delay_minutes, sample_size = prediction
             return {
-                'delay_probability': float(prediction.delay_probability),
-                'avg_delay_minutes': prediction.avg_delay_minutes,
-                'sample_size': prediction.sample_size
+                'delay_probability': delay_probability,
+                'avg_delay_minutes': avg_delay_minutes,
+                'sample_size': sample_size
             }
 
         # Default prediction
@@ -1393,7 +1716,7 @@ class DelayPredictionService:
         """Check if self-transfer is safe enough"""
         risk = DelayPredictionService.calculate_self_transfer_risk(connection)
         connection.self_transfer_risk = risk
-        connection.save()
+        connection.save(update_fields=['self_transfer_risk'])
 
         if risk < 30:
             recommendation = 'Safe'
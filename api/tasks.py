@@ -0,0 +1,12 @@
+"""
+Celery tasks for the API app
+"""
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def refresh_ai_query_parse(query_text, available_origin_cities=None, available_destination_cities=None):
+    """Run the LLM parse for an AI search query and cache it for the next request."""
+    from .services import AISearchService
+    AISearchService.refresh_parsed_query(
+        query_text, available_origin_cities, available_destination_cities)
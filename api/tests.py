@@ -2,16 +2,20 @@
 API tests for NearNode.
 Run: python manage.py test api
 """
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from rest_framework.test import APIClient
 from datetime import timedelta
 from decimal import Decimal
-from unittest.mock import patch
+from unittest.mock import AsyncMock, MagicMock, patch
 
-from core.models import Airport, Flight
+from core.models import Airport, Flight, GroundTransport, TripOption, CollaborativeVote, PerfectMatch, UserProfile
 from api import amadeus_client
+from api.serializers import FlightSerializer
 
 User = get_user_model()
 
@@ -36,6 +40,12 @@ class NearestAlternateAPITest(TestCase):
         self.assertEqual(r.status_code, 400)
         self.assertIn('error', r.json())
 
+    def test_nearest_alternate_malformed_json(self):
+        """Malformed JSON body returns 400."""
+        r = self.client.post(self.url, '{"origin_airport_code":', content_type='application/json')
+        self.assertEqual(r.status_code, 400)
+        self.assertIn('detail', r.json())
+
     def test_nearest_alternate_invalid_date(self):
         """Invalid date format returns 400."""
         r = self.client.post(
@@ -75,6 +85,13 @@ class NearestAlternateAPITest(TestCase):
             self.assertIn('error', data)
             self.assertIn('AMADEUS', data.get('error', '').upper())
 
+    def test_max_results_is_capped(self):
+        from api.views import _NEAREST_ALTERNATE_MAX_RESULTS, _nearest_alternate_request_params
+        self.assertEqual(_nearest_alternate_request_params({'max_results': 5000})['max_results'],
+                         _NEAREST_ALTERNATE_MAX_RESULTS)
+        self.assertEqual(_nearest_alternate_request_params({'max_results': 0})['max_results'], 1)
+        self.assertEqual(_nearest_alternate_request_params({})['max_results'], 30)
+
 
 class NearestAirportAPITest(TestCase):
     """Test nearest-airport endpoint."""
@@ -100,6 +117,15 @@ class NearestAirportAPITest(TestCase):
             self.assertIn('airport', data)
             self.assertIn('iata_code', data)
 
+    def test_nearest_airport_reports_indexed_distance(self):
+        Airport.objects.create(
+            icao_code='EGLL', iata_code='LHR', name='Heathrow', city='London', country='United Kingdom',
+            latitude=Decimal('51.4700'), longitude=Decimal('-0.4543'))
+        with self.assertNumQueries(1):
+            r = self.client.get('/api/nearest-airport/?lat=51.5074&lon=-0.1278')
+        self.assertEqual(r.json()['iata_code'], 'LHR')
+        self.assertAlmostEqual(r.json()['distance_km'], 23.0, delta=0.5)
+
 
 class SmartNearestAlternateSearchTest(TestCase):
     """Covers nearby-origin expansion and deterministic sorting."""
@@ -360,3 +386,934 @@ class BookingProviderHealthAPITest(TestCase):
         by_name = {row.get('name'): row for row in payload.get('providers', [])}
         if 'Kayak' in by_name:
             self.assertFalse(by_name['Kayak'].get('is_healthy'))
+
+
+class PerfectMatchesAPITest(TestCase):
+    """Collaborative perfect matches are serialized with nested flight data."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='votera', email='a@example.com', password=TEST_AUTH_SECRET
+        )
+        self.partner = User.objects.create_user(
+            username='voterb', email='b@example.com', password=TEST_AUTH_SECRET
+        )
+        UserProfile.objects.filter(user=self.user).update(partner=self.partner)
+        self.client.force_authenticate(user=self.user)
+
+        origin = Airport.objects.create(
+            icao_code='LFPG', iata_code='CDG', name='Charles de Gaulle', city='Paris',
+            country='France', latitude=Decimal('49.0097'), longitude=Decimal('2.5479'),
+        )
+        destination = Airport.objects.create(
+            icao_code='LIRF', iata_code='FCO', name='Fiumicino', city='Rome',
+            country='Italy', latitude=Decimal('41.8003'), longitude=Decimal('12.2389'),
+        )
+        departure = timezone.now() + timedelta(days=7)
+        for index, (vote_a, vote_b) in enumerate([('like', 'like'), ('super_like', 'like'), ('like', 'dislike')]):
+            flight = Flight.objects.create(
+                flight_number='AZ{}'.format(index), airline='ITA', origin_airport=origin,
+                destination_airport=destination, departure_time=departure,
+                arrival_time=departure + timedelta(hours=2), price_eur=Decimal('100'), duration_minutes=120,
+            )
+            option = TripOption.objects.create(
+                flight=flight, total_trip_cost_eur=Decimal('100'), total_trip_time_minutes=120,
+            )
+            CollaborativeVote.objects.create(user=self.user, trip_option=option, vote_type=vote_a)
+            CollaborativeVote.objects.create(user=self.partner, trip_option=option, vote_type=vote_b)
+
+    def test_matches_sorted_by_score_with_nested_flight(self):
+        # Profile, both users' votes, match upsert, one joined SELECT for the serialized matches
+        with self.assertNumQueries(4):
+            r = self.client.get('/api/collaborative/matches/')
+        self.assertEqual(r.status_code, 200)
+        data = r.json()
+        self.assertEqual(len(data), 2)
+        self.assertEqual([float(m['match_score']) for m in data], [75.0, 50.0])
+        flight = data[0]['trip_option']['flight']
+        self.assertEqual(flight['origin_airport']['iata_code'], 'CDG')
+        self.assertEqual(flight['destination_airport']['iata_code'], 'FCO')
+
+    def test_vote_loads_profile_and_partner_in_one_query(self):
+        option = TripOption.objects.first()
+        with patch('api.views.CollaborativeService.find_perfect_matches',
+                   return_value=PerfectMatch.objects.none()) as find, \
+                CaptureQueriesContext(connection) as ctx:
+            r = self.client.post(
+                '/api/collaborative/vote/', {'trip_option_id': option.id, 'vote_type': 'like'}, format='json')
+        self.assertEqual(r.status_code, 200)
+        find.assert_called_once_with(self.user, self.partner, limit=5)
+        profile_queries = [q['sql'] for q in ctx.captured_queries if 'core_userprofile' in q['sql']]
+        self.assertEqual(len(profile_queries), 1)
+
+    def test_limit_keeps_best_matches(self):
+        from api.services import CollaborativeService
+        matches = CollaborativeService.find_perfect_matches(self.user, self.partner, limit=1)
+        self.assertEqual([float(m.match_score) for m in matches], [75.0])
+
+    def test_sync_code_retries_on_collision(self):
+        from api.services import CollaborativeService
+        UserProfile.objects.filter(user=self.partner).update(partner_sync_code='TAKEN123')
+        with patch.object(CollaborativeService, 'generate_sync_code', side_effect=['TAKEN123', 'FREE4567']):
+            r = self.client.post('/api/collaborative/generate-code/')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()['sync_code'], 'FREE4567')
+        self.assertEqual(UserProfile.objects.get(user=self.user).partner_sync_code, 'FREE4567')
+
+    def test_profile_loads_user_and_partner_in_one_query(self):
+        with self.assertNumQueries(1):
+            r = self.client.get('/api/profile/')
+        self.assertEqual(r.json()['partner']['username'], 'voterb')
+
+    def test_matches_without_profile_returns_404(self):
+        UserProfile.objects.filter(user=self.user).delete()
+        r = self.client.get('/api/collaborative/matches/')
+        self.assertEqual(r.status_code, 404)
+
+
+class AmadeusDurationParsingTest(TestCase):
+    """ISO 8601 duration parsing for Amadeus offers."""
+
+    def test_hours_and_minutes(self):
+        self.assertEqual(amadeus_client._parse_iso_duration('PT2H10M'), 130)
+        self.assertEqual(amadeus_client._parse_iso_duration('pt45m'), 45)
+        self.assertEqual(amadeus_client._parse_iso_duration('PT3H'), 180)
+
+    def test_empty_and_unknown_units(self):
+        self.assertEqual(amadeus_client._parse_iso_duration(None), 0)
+        self.assertEqual(amadeus_client._parse_iso_duration(''), 0)
+        self.assertEqual(amadeus_client._parse_iso_duration('PT30S'), 0)
+
+
+class AmadeusOfferMappingTest(TestCase):
+    """Mapping raw Amadeus offers to flight dicts."""
+
+    OFFER = {
+        'id': '42',
+        'price': {'total': '199.90'},
+        'itineraries': [
+            {'duration': 'PT3H5M', 'segments': [
+                {'carrierCode': 'AF', 'number': '1234',
+                 'departure': {'at': '2026-05-01T08:00:00'}, 'arrival': {'at': '2026-05-01T09:10:00'}},
+                {'carrierCode': 'AZ', 'number': '77', 'operating': {'carrierCode': 'KL'},
+                 'departure': {'at': '2026-05-01T10:00:00'}, 'arrival': {'at': '2026-05-01T11:05:00'}},
+            ]},
+            {'duration': 'PT2H', 'segments': [
+                {'carrierCode': 'AF', 'number': '4321',
+                 'departure': {'at': '2026-05-08T18:00:00'}, 'arrival': {'at': '2026-05-08T20:00:00'}},
+            ]},
+        ],
+    }
+
+    def test_map_one_offer(self):
+        mapped = amadeus_client._map_one_offer(self.OFFER)
+        self.assertEqual(mapped['price_eur'], 199.9)
+        self.assertEqual(mapped['duration_minutes'], 305)
+        self.assertEqual(mapped['trip_type'], 'round_trip')
+        self.assertEqual(mapped['airline'], 'AF')
+        self.assertEqual(mapped['number'], '1234')
+        self.assertEqual(mapped['arrival_time'], '2026-05-01T11:05:00')
+        self.assertEqual(mapped['return_arrival_time'], '2026-05-08T20:00:00')
+
+    def test_map_one_offer_rich_uses_first_segment_arrival(self):
+        mapped = amadeus_client._map_one_offer_rich(self.OFFER, {'iata_code': 'CDG'}, {'iata_code': 'FCO'})
+        self.assertEqual(mapped['departure_time'], '2026-05-01T08:00:00')
+        self.assertEqual(mapped['arrival_time'], '2026-05-01T09:10:00')
+        self.assertEqual(mapped['flight_number'], '1234')
+        self.assertEqual(mapped['destination_airport'], {'iata_code': 'FCO'})
+
+    def test_airline_prefers_operating_carrier(self):
+        self.assertEqual(amadeus_client._airline_from_segment({'carrierCode': 'AZ', 'operating': {'carrierCode': 'KL'}}), 'KL')
+        self.assertEqual(amadeus_client._airline_from_segment({'carrierCode': 'AZ', 'operating': {}}), 'AZ')
+        self.assertEqual(amadeus_client._airline_from_segment({'carrierCode': 'AZ', 'operating': 'KL'}), 'AZ')
+        self.assertEqual(amadeus_client._airline_from_segment({}), 'Airline')
+
+    def test_empty_offer(self):
+        mapped = amadeus_client._map_one_offer({})
+        self.assertEqual(mapped['price_eur'], 0.0)
+        self.assertEqual(mapped['airline'], 'Airline')
+        self.assertEqual(mapped['trip_type'], 'one_way')
+
+
+class ProviderResponseCacheTest(TestCase):
+    """Repeat provider lookups are served from the cache."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    @patch('api.amadeus_client.get_token', return_value='token')
+    def test_flight_offers_cached_per_query(self, _mock_token):
+        resp = MagicMock(ok=True, status_code=200, headers={}, content=b'{"data": [{"id": "1"}]}')
+        resp.json.return_value = {'data': [{'id': '1'}]}
+        with patch.object(amadeus_client._SESSION, 'get', return_value=resp) as mock_get:
+            first = amadeus_client._fetch_flight_offers_raw('CDG', 'FCO', '2026-05-01')
+            second = amadeus_client._fetch_flight_offers_raw('CDG', 'FCO', '2026-05-01')
+            amadeus_client._fetch_flight_offers_raw('CDG', 'FCO', '2026-05-02')
+        self.assertEqual(first, [{'id': '1'}])
+        self.assertEqual(second, first)
+        self.assertEqual(mock_get.call_count, 2)
+
+    def test_offer_cache_ttl_by_departure_and_result(self):
+        from datetime import date
+        today = date.today()
+        tomorrow = (today + timedelta(days=1)).isoformat()
+        self.assertEqual(amadeus_client._offer_cache_ttl(tomorrow, [{'id': '1'}]), amadeus_client._OFFER_CACHE_TTL_FUTURE)
+        self.assertEqual(amadeus_client._offer_cache_ttl(today.isoformat(), [{'id': '1'}]),
+                         amadeus_client._OFFER_CACHE_TTL_SAME_DAY)
+        self.assertEqual(amadeus_client._offer_cache_ttl(tomorrow, []), amadeus_client._OFFER_CACHE_TTL_EMPTY)
+
+    @patch('api.amadeus_client.get_token', return_value='token')
+    def test_batch_offers_from_generator_are_returned_and_cached_by_ttl(self, _mock_token):
+        from datetime import date
+        offer = {'id': '1', 'price': {'total': '120.00'}, 'itineraries': [{'duration': 'PT2H', 'segments': [
+            {'carrierCode': 'AF', 'number': '1000', 'departure': {'at': '2026-05-01T08:00:00'},
+             'arrival': {'at': '2026-05-01T10:00:00'}}]}]}
+        gather = AsyncMock(return_value=[[offer], []])
+        today = date.today().isoformat()
+        with patch('api.amadeus_client._gather_flight_offers_raw', gather), \
+                patch.object(amadeus_client.cache, 'set_many', wraps=amadeus_client.cache.set_many) as set_many:
+            results = amadeus_client.search_flight_offers_for_ai_search_many(
+                'CDG', today, [('FCO', None), ('BER', None)])
+        self.assertEqual([len(offers) for offers in results], [1, 0])
+        self.assertEqual(results[0][0]['price_eur'], 120.0)
+        self.assertEqual(results[0][0]['destination_airport']['iata_code'], 'FCO')
+        ttls = {call.args[1]: list(call.args[0].values()) for call in set_many.call_args_list}
+        self.assertEqual(ttls, {
+            amadeus_client._OFFER_CACHE_TTL_SAME_DAY: [[offer]],
+            amadeus_client._OFFER_CACHE_TTL_EMPTY: [[]],
+        })
+        # Second call is served from the cache
+        with patch('api.amadeus_client._gather_flight_offers_raw', gather):
+            again = amadeus_client.search_flight_offers_for_ai_search_many('CDG', today, [('FCO', None)])
+        self.assertEqual(gather.await_count, 1)
+        self.assertEqual(again[0][0]['id'], '1')
+
+    def test_batch_gather_shares_request_slots_and_revalidates_etags(self):
+        import asyncio
+        import threading
+        import httpx
+        in_flight = {'now': 0, 'max': 0}
+        seen_etags = []
+
+        async def handler(request):
+            in_flight['now'] += 1
+            in_flight['max'] = max(in_flight['max'], in_flight['now'])
+            await asyncio.sleep(0)
+            in_flight['now'] -= 1
+            seen_etags.append(request.headers.get('If-None-Match'))
+            if request.headers.get('If-None-Match'):
+                return httpx.Response(304)
+            return httpx.Response(200, json={'data': [{'id': request.url.params['destinationLocationCode']}]},
+                                  headers={'ETag': '"v1"'})
+
+        real_client = httpx.AsyncClient
+        queries = [amadeus_client.urlencode(amadeus_client._flight_offer_params('CDG', dest, '2026-05-01'))
+                   for dest in ('FCO', 'BER', 'MAD')]
+        with patch.object(amadeus_client, '_request_slots', threading.BoundedSemaphore(1)), \
+                patch('api.amadeus_client.httpx.AsyncClient',
+                      lambda **kwargs: real_client(transport=httpx.MockTransport(handler))):
+            first = asyncio.run(amadeus_client._gather_flight_offers_raw('token', queries))
+            second = asyncio.run(amadeus_client._gather_flight_offers_raw('token', queries))
+        self.assertEqual(first, [[{'id': 'FCO'}], [{'id': 'BER'}], [{'id': 'MAD'}]])
+        self.assertEqual(second, first)
+        self.assertEqual(in_flight['max'], 1)
+        self.assertEqual(seen_etags, [None] * 3 + ['"v1"'] * 3)
+
+    @patch('api.amadeus_client.get_token', return_value='token')
+    def test_failed_flight_offers_not_cached(self, _mock_token):
+        with patch.object(amadeus_client._SESSION, 'get', return_value=MagicMock(ok=False)) as mock_get:
+            amadeus_client._fetch_flight_offers_raw('CDG', 'FCO', '2026-05-01')
+            amadeus_client._fetch_flight_offers_raw('CDG', 'FCO', '2026-05-01')
+        self.assertEqual(mock_get.call_count, 2)
+
+    @patch('api.amadeus_client.get_token', return_value='token')
+    def test_flight_offers_revalidated_with_etag(self, _mock_token):
+        fresh = MagicMock(ok=True, status_code=200, headers={'ETag': '"v1"'}, content=b'{"data": [{"id": "1"}]}')
+        fresh.json.return_value = {'data': [{'id': '1'}]}
+        not_modified = MagicMock(ok=False, status_code=304, headers={}, content=b'')
+        with patch.object(amadeus_client._SESSION, 'get', side_effect=[fresh, not_modified]) as mock_get:
+            amadeus_client._fetch_flight_offers_raw('CDG', 'FCO', '2026-05-01')
+            cache.delete('amadeus:offers:' + mock_get.call_args[0][0].split('?', 1)[1])
+            offers = amadeus_client._fetch_flight_offers_raw('CDG', 'FCO', '2026-05-01')
+        self.assertEqual(offers, [{'id': '1'}])
+        self.assertEqual(mock_get.call_args[1]['headers'].get('If-None-Match'), '"v1"')
+
+    def test_geocode_cached_by_normalized_address(self):
+        from api.services import NearestAlternateService
+        location = MagicMock(latitude=51.5074, longitude=-0.1278)
+        with patch('api.services._nominatim_geocode', return_value=location) as mock_geocode:
+            first = NearestAlternateService.geocode_address('London,  UK')
+            second = NearestAlternateService.geocode_address(' london, uk ')
+        self.assertEqual(first, (51.5074, -0.1278))
+        self.assertEqual(second, first)
+        self.assertEqual(mock_geocode.call_count, 1)
+
+    def test_ground_options_cached(self):
+        from api import ground_transport_client as gtc
+        with patch.object(gtc, '_fetch_ground_options', return_value=[{'mode': 'train'}]) as mock_fetch:
+            gtc.get_ground_options(48.8566, 2.3522, 49.0097, 2.5479)
+            options = gtc.get_ground_options(48.85661, 2.35221, 49.0097, 2.5479)
+        self.assertEqual(options, [{'mode': 'train'}])
+        self.assertEqual(mock_fetch.call_count, 1)
+
+
+class NavitiaJourneyParsingTest(TestCase):
+    """Navitia journey duration and summary extraction."""
+
+    def test_duration_from_sections_and_summary(self):
+        from api.ground_transport_client import _journey_duration_and_summary
+        journey = {'sections': [
+            {'type': 'street_network', 'mode': 'walking', 'duration': 300},
+            {'type': 'public_transport', 'duration': 1500, 'pt_display_information': {'name': 'RER B'}},
+            {'type': 'waiting', 'duration': 120},
+        ]}
+        self.assertEqual(_journey_duration_and_summary(journey), (1920, 'Walk + RER B'))
+
+    def test_total_duration_preferred(self):
+        from api.ground_transport_client import _journey_duration_and_summary
+        journey = {'durations': {'total': 2400}, 'sections': [{'type': 'public_transport', 'duration': 60}]}
+        self.assertEqual(_journey_duration_and_summary(journey), (2400, 'Train'))
+        self.assertEqual(_journey_duration_and_summary({}), (None, 'Public transport'))
+
+
+class FlightListAPITest(TestCase):
+    """Flight list endpoint renders nested airports."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(
+            username='flightuser', email='flight@example.com', password=TEST_AUTH_SECRET
+        )
+        self.client.force_authenticate(user=self.user)
+        self.origin = Airport.objects.create(
+            icao_code='EGLL', iata_code='LHR', name='Heathrow', city='London',
+            country='United Kingdom', latitude=Decimal('51.4700'), longitude=Decimal('-0.4543'),
+        )
+        self.destination = Airport.objects.create(
+            icao_code='LEMD', iata_code='MAD', name='Barajas', city='Madrid',
+            country='Spain', latitude=Decimal('40.4983'), longitude=Decimal('-3.5676'),
+        )
+        departure = timezone.now() + timedelta(days=3)
+        for index in range(3):
+            Flight.objects.create(
+                flight_number='IB{}'.format(index), airline='Iberia', origin_airport=self.origin,
+                destination_airport=self.destination, departure_time=departure,
+                arrival_time=departure + timedelta(hours=2), price_eur=Decimal('80'), duration_minutes=140,
+            )
+
+    def test_list_includes_nested_airports(self):
+        r = self.client.get('/api/flights/', {'origin': 'LHR'})
+        self.assertEqual(r.status_code, 200)
+        results = r.json()['results']
+        self.assertEqual(len(results), 3)
+        for row in results:
+            self.assertEqual(row['origin_airport']['iata_code'], 'LHR')
+            self.assertEqual(row['destination_airport']['city'], 'Madrid')
+            self.assertNotIn('created_at', row)
+
+    def test_list_pages_break_departure_ties_by_id(self):
+        r = self.client.get('/api/flights/', {'origin': 'LHR'})
+        ids = [row['id'] for row in r.json()['results']]
+        self.assertEqual(ids, sorted(ids))
+
+    def test_list_loads_airports_in_same_query(self):
+        from core.geo import airport_index
+        airport_index()
+        # ETag version of the filtered flights, page count, page rows; codes and airport version are in memory
+        with self.assertNumQueries(3):
+            r = self.client.get('/api/flights/', {'origin': 'LHR'})
+        self.assertEqual(len(r.json()['results']), 3)
+
+    def test_unfiltered_list_skips_etag_aggregate(self):
+        # Page count and page rows only; no whole-table version query
+        with self.assertNumQueries(2):
+            r = self.client.get('/api/flights/')
+        self.assertEqual(r.status_code, 200)
+        self.assertNotIn('ETag', r)
+        self.assertIn('max-age=60', r['Cache-Control'])
+
+    def test_list_filters_codes_case_insensitively(self):
+        self.assertEqual(len(self.client.get('/api/flights/', {'origin': 'lhr', 'destination': 'mad'}).json()['results']), 3)
+        self.assertEqual(self.client.get('/api/flights/', {'origin': 'XXX'}).json()['results'], [])
+
+    def test_detail_loads_airports_in_same_query(self):
+        flight = Flight.objects.first()
+        # ETag is list-only, so detail is a single joined SELECT
+        with self.assertNumQueries(1):
+            r = self.client.get('/api/flights/{}/'.format(flight.pk))
+        self.assertEqual(r.json()['destination_airport']['iata_code'], 'MAD')
+
+    def test_list_revalidates_with_etag(self):
+        r = self.client.get('/api/flights/', {'origin': 'LHR'})
+        etag = r['ETag']
+        self.assertIn('max-age=60', r['Cache-Control'])
+        with self.assertNumQueries(1):
+            r = self.client.get('/api/flights/', {'origin': 'LHR'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+        # A flight on another route leaves this filter's tag alone
+        departure = timezone.now() + timedelta(days=4)
+        Flight.objects.create(
+            flight_number='IB9', airline='Iberia', origin_airport=self.destination,
+            destination_airport=self.origin, departure_time=departure,
+            arrival_time=departure + timedelta(hours=2), price_eur=Decimal('80'), duration_minutes=140,
+        )
+        r = self.client.get('/api/flights/', {'origin': 'LHR'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+        self.destination.name = 'Adolfo Suarez Barajas'
+        self.destination.save()
+        r = self.client.get('/api/flights/', {'origin': 'LHR'}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 200)
+        self.assertNotEqual(r['ETag'], etag)
+
+
+class AirportListAPITest(TestCase):
+    """Airport list pages by cursor over iata_code."""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = User.objects.create_user(username='airportuser', password=TEST_AUTH_SECRET)
+        self.client.force_authenticate(user=self.user)
+        for icao, iata in (('LIRF', 'FCO'), ('EGLL', 'LHR'), ('LFPG', 'CDG')):
+            Airport.objects.create(
+                icao_code=icao, iata_code=iata, name=iata, city=iata, country='X',
+                latitude=Decimal('45'), longitude=Decimal('5'))
+
+    @patch('api.pagination.IataCursorPagination.page_size', 2)
+    def test_cursor_pages_follow_iata_order(self):
+        first = self.client.get('/api/airports/').json()
+        self.assertEqual([a['iata_code'] for a in first['results']], ['CDG', 'FCO'])
+        self.assertNotIn('count', first)
+        second = self.client.get(first['next']).json()
+        self.assertEqual([a['iata_code'] for a in second['results']], ['LHR'])
+        self.assertIsNone(second['next'])
+
+    def test_nearby_etag_uses_airport_index_version(self):
+        params = {'lat': '45', 'lon': '5', 'radius': '50'}
+        etag = self.client.get('/api/airports/nearby/', params)['ETag']
+        with self.assertNumQueries(0):
+            r = self.client.get('/api/airports/nearby/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(r.status_code, 304)
+        Airport.objects.filter(iata_code='FCO').update(name='Fiumicino', updated_at=timezone.now())
+        from core.geo import invalidate_airport_index
+        invalidate_airport_index()
+        self.assertEqual(self.client.get('/api/airports/nearby/', params, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AirportsInRadiusTest(TestCase):
+    """Radius search over the cached airport coordinate index."""
+
+    def setUp(self):
+        for icao, iata, city, lat, lon in [
+            ('LFPG', 'CDG', 'Paris', '49.0097', '2.5479'),
+            ('LFPO', 'ORY', 'Paris', '48.7262', '2.3652'),
+            ('LFOB', 'BVA', 'Beauvais', '49.4544', '2.1128'),
+            ('EGLL', 'LHR', 'London', '51.4700', '-0.4543'),
+        ]:
+            Airport.objects.create(
+                icao_code=icao, iata_code=iata, name=iata, city=city, country='X',
+                latitude=Decimal(lat), longitude=Decimal(lon),
+            )
+
+    def test_radius_sorted_nearest_first(self):
+        from api.services import NearestAlternateService
+        found = NearestAlternateService.find_airports_in_radius(48.8566, 2.3522, 100)
+        self.assertEqual([item['airport'].iata_code for item in found], ['ORY', 'CDG', 'BVA'])
+        self.assertAlmostEqual(found[0]['distance_km'], 14.5, delta=0.5)
+
+    def test_distance_to_matches_geodesic_within_half_percent(self):
+        from geopy.distance import geodesic
+        cdg = Airport.objects.get(iata_code='CDG')
+        expected = geodesic((cdg.latitude, cdg.longitude), (51.47, -0.4543)).kilometers
+        self.assertAlmostEqual(cdg.distance_to(Decimal('51.4700'), -0.4543), expected, delta=expected * 0.005)
+
+    def test_bounding_box_handles_antimeridian(self):
+        import numpy as np
+        from core.geo import bounding_box_mask
+        lat = np.radians(np.array([0.0, 0.0, 0.0]))
+        lon = np.radians(np.array([179.5, -179.5, 170.0]))
+        mask = bounding_box_mask(0.0, 179.9, 100, lat, lon)
+        self.assertEqual(mask.tolist(), [True, True, False])
+
+    def test_radius_term_matches_distance_filter(self):
+        import numpy as np
+        from core.geo import haversine_km, haversine_term, radius_term
+        lat = np.radians(np.linspace(-80.0, 80.0, 41))
+        lon = np.radians(np.linspace(-170.0, 170.0, 41))
+        for radius in (50, 500, 5000, 25000):
+            self.assertEqual(
+                (haversine_term(10.0, 20.0, lat, lon) <= radius_term(radius)).tolist(),
+                (haversine_km(10.0, 20.0, lat, lon) <= radius).tolist())
+
+    def test_nearest_airport_tree_matches_scan(self):
+        from core import geo
+        for lat, lon in ((48.8566, 2.3522), (51.5, -0.1), (49.4, 2.0), (-33.9, 151.2)):
+            airport, distance = geo.nearest_airport(lat, lon)
+            with patch.dict(geo.airport_index(), {'tree': None}):
+                self.assertEqual(geo.nearest_airport(lat, lon), (airport, distance))
+        self.assertEqual(geo.nearest_airport(48.8566, 2.3522)[0].iata_code, 'ORY')
+
+    def test_radius_tree_matches_scan(self):
+        from core import geo
+        for lat, lon, radius in ((48.8566, 2.3522, 100), (50.0, 1.0, 300), (49.0097, 2.5479, 0), (0.0, 0.0, 25000)):
+            found = geo.airports_within_radius(lat, lon, radius)
+            with patch.dict(geo.airport_index(), {'tree': None}):
+                self.assertEqual(geo.airports_within_radius(lat, lon, radius), found)
+        self.assertEqual(len(geo.airports_within_radius(0.0, 0.0, 25000)[0]), 4)
+
+    def test_index_notices_writes_from_other_processes(self):
+        from core import geo
+        self.assertIsNotNone(geo.airport_by_iata('LHR'))
+        # queryset.update() sends no signals, like a write made by another worker
+        Airport.objects.filter(iata_code='LHR').update(iata_code='LGW', updated_at=timezone.now())
+        self.assertIsNotNone(geo.airport_by_iata('LHR'))
+        with patch.object(geo, '_checked_at', -geo.INDEX_RECHECK_SECONDS):
+            self.assertIsNone(geo.airport_by_iata('LHR'))
+        self.assertIsNotNone(geo.airport_by_iata('LGW'))
+
+    def test_index_refreshes_after_airport_changes(self):
+        from api.services import NearestAlternateService
+        self.assertEqual(len(NearestAlternateService.find_airports_in_radius(51.47, -0.45, 50)), 1)
+        Airport.objects.filter(iata_code='LHR').first().delete()
+        self.assertEqual(NearestAlternateService.find_airports_in_radius(51.47, -0.45, 50), [])
+
+
+
+class FindBestAlternatesTest(TestCase):
+    """DB-backed nearest-alternate search."""
+
+    def setUp(self):
+        cache.clear()
+
+        def airport(icao, iata, city, lat, lon):
+            return Airport.objects.create(
+                icao_code=icao, iata_code=iata, name=iata, city=city, country='X',
+                latitude=Decimal(lat), longitude=Decimal(lon),
+            )
+        self.origin = airport('LIRF', 'FCO', 'Rome', '41.8003', '12.2389')
+        self.cdg = airport('LFPG', 'CDG', 'Paris', '49.0097', '2.5479')
+        self.ory = airport('LFPO', 'ORY', 'Paris', '48.7262', '2.3652')
+        self.date = (timezone.now() + timedelta(days=5)).date()
+        departure = timezone.make_aware(timezone.datetime.combine(self.date, timezone.datetime.min.time())) + timedelta(hours=9)
+        for number, dest, price in [('AZ1', self.cdg, '120'), ('AZ2', self.ory, '90'), ('AZ3', self.cdg, '60')]:
+            Flight.objects.create(
+                flight_number=number, airline='ITA', origin_airport=self.origin, destination_airport=dest,
+                departure_time=departure, arrival_time=departure + timedelta(hours=2),
+                price_eur=Decimal(price), duration_minutes=120,
+            )
+        GroundTransport.objects.create(
+            name='Taxi', transport_type='uber', from_airport=self.cdg, to_address='Somewhere',
+            duration_minutes=60, cost_eur=Decimal('70'),
+        )
+        GroundTransport.objects.create(
+            name='RER', transport_type='train', from_airport=self.cdg, to_address='ORY',
+            duration_minutes=50, cost_eur=Decimal('12'),
+        )
+
+    def test_batched_lookup_prefers_exact_address_transport(self):
+        from api.services import NearestAlternateService
+        # airport index (serves destination, nearby rows and origin), flights, ground transport
+        with self.assertNumQueries(3):
+            results = NearestAlternateService.find_best_alternates('FCO', 'ORY', self.date, radius_km=100)
+        self.assertEqual([r['flight'].flight_number for r in results], ['AZ3', 'AZ2', 'AZ1'])
+        self.assertEqual(results[0]['ground_transport'].name, 'RER')
+        self.assertEqual(results[0]['total_cost_eur'], Decimal('72'))
+        self.assertIsNone(results[1]['ground_transport'])
+
+    def test_real_alternates_query_each_airport_and_merge_sorted(self):
+        from api.services import find_best_alternates_real
+        offers = {
+            'CDG': [{'id': 'c1', 'price_eur': 100.0, 'duration_minutes': 120}],
+            'ORY': [{'id': 'o1', 'price_eur': 50.0, 'duration_minutes': 130},
+                    {'id': 'o2', 'price_eur': 150.0, 'duration_minutes': 110}],
+        }
+        with patch('api.amadeus_client.search_flight_offers', side_effect=lambda o, d, date: offers[d]) as search, \
+                patch('api.ground_transport_client.is_configured', return_value=False):
+            results = find_best_alternates_real('FCO', 'ORY', self.date, radius_km=100)
+        self.assertEqual(search.call_count, 2)
+        self.assertEqual([r['flight_id'] for r in results], ['o1', 'c1', 'o2'])
+        self.assertEqual(results[1]['ground_transport'].name, 'RER')
+
+
+class LayoverQualityScoreTest(TestCase):
+    """Vectorized layover scoring matches the per-airport scorer."""
+
+    def test_vectorized_matches_scalar(self):
+        from api.services import MultiModalConnectionService as service
+        hub = Airport(layover_quality_score=Decimal('6.5'), has_lounge=True, has_sleeping_pods=True, city_access_time=30)
+        plain = Airport(layover_quality_score=Decimal('1.0'))
+        airports = [hub, hub, plain, plain, None]
+        minutes = [120, 400, 30, 200, 90]
+        expected = [service.calculate_layover_quality_score(a, m) for a, m in zip(airports, minutes)]
+        self.assertEqual(service.layover_quality_scores(airports, minutes), expected)
+        self.assertEqual(expected[:3], [10.0, 9.0, 0.0])
+
+
+class AISearchDatabaseRankingTest(TestCase):
+    """DB-backed AI search stores every scored candidate and ranks the top three."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='aiuser', email='ai@example.com', password=TEST_AUTH_SECRET)
+        self.origin = Airport.objects.create(
+            icao_code='EDDB', iata_code='BER', name='Brandenburg', city='Berlin', country='Germany',
+            latitude=Decimal('52.3667'), longitude=Decimal('13.5033'),
+        )
+        self.destinations = [
+            Airport.objects.create(
+                icao_code='LEB{}'.format(i), iata_code='BC{}'.format(i), name='Dest {}'.format(i), city='City {}'.format(i),
+                country='Spain', latitude=Decimal('41.2974'), longitude=Decimal('2.0833'),
+            )
+            for i in range(2)
+        ]
+        departure = timezone.now() + timedelta(days=10)
+        for i, (dest, price, minutes) in enumerate([
+            (self.destinations[0], '150', 200), (self.destinations[0], '60', 150),
+            (self.destinations[1], '90', 140), (self.destinations[1], '40', 400),
+        ]):
+            Flight.objects.create(
+                flight_number='EW{}'.format(i), airline='Eurowings', origin_airport=self.origin, destination_airport=dest,
+                departure_time=departure, arrival_time=departure + timedelta(minutes=minutes),
+                price_eur=Decimal(price), duration_minutes=minutes,
+            )
+
+    def test_origin_candidates_prefer_city_matches_in_one_query(self):
+        from api.services import AISearchService
+        Airport.objects.create(
+            icao_code='EDDT', iata_code='TXL', name='Berlin Tegel', city='Tegel', country='Germany',
+            latitude=Decimal('52.5597'), longitude=Decimal('13.2877'),
+        )
+        with self.assertNumQueries(1):
+            self.assertEqual(AISearchService._origin_airport_candidates('berlin'), [self.origin])
+        with self.assertNumQueries(1):
+            self.assertEqual([a.iata_code for a in AISearchService._origin_airport_candidates('tegel')], ['TXL'])
+
+    def test_scores_match_scalar_scorer(self):
+        from api.services import AISearchService
+        query = {'max_price_eur': 100, 'max_duration_hours': 4}
+        flights = list(Flight.objects.all())
+        vectorized = AISearchService._match_scores(
+            [f.price_eur for f in flights], [f.duration_minutes for f in flights], query)
+        expected = [AISearchService._calculate_match_score(f, query) for f in flights]
+        for got, want in zip(vectorized.tolist(), expected):
+            self.assertAlmostEqual(got, want)
+
+    def test_sql_scores_match_vectorized_scorer(self):
+        from api.services import AISearchService
+        for query in ({'max_price_eur': 100, 'max_duration_hours': 2}, {'max_price_eur': 500}, {}):
+            flights = list(Flight.objects.annotate(score=AISearchService._match_score_expression(query)))
+            expected = AISearchService._match_scores(
+                [f.price_eur for f in flights], [f.duration_minutes for f in flights], query)
+            for flight, want in zip(flights, expected.tolist()):
+                self.assertAlmostEqual(flight.score, want)
+
+    def test_ranking_runs_in_one_select(self):
+        from api.services import AISearchService
+        from core.models import TripSearch
+        search = TripSearch.objects.create(user=self.user, query_text='sunny')
+        with patch.object(AISearchService, '_find_matching_airports', return_value=self.destinations), \
+                self.assertNumQueries(2):
+            AISearchService._search_by_query_db(search, {'max_price_eur': 100}, self.origin, 200, 480)
+
+    def test_amadeus_offers_filtered_and_scored_like_scalar(self):
+        from api.services import AISearchService
+        query = {'max_price_eur': 100, 'max_duration_hours': 2}
+        offers = [
+            {'id': 'a', 'price_eur': 100.0, 'duration_minutes': 120},
+            {'id': 'b', 'price_eur': 40.0, 'duration_minutes': 200},
+            {'id': 'c', 'price_eur': 250.0, 'duration_minutes': 60},
+            {'id': 'd', 'price_eur': 0.0, 'duration_minutes': 0},
+        ]
+        matches = AISearchService._amadeus_offers_to_matches(offers, query, 200.0, 180)
+        self.assertEqual([m['flight']['id'] for m in matches], ['a', 'd'])
+        for match in matches:
+            self.assertAlmostEqual(
+                match['match_score'], AISearchService._calculate_match_score(match['flight'], query))
+
+    def test_all_candidates_bulk_created_top_three_ranked(self):
+        from api.services import AISearchService
+        from core.models import TripSearch
+        search = TripSearch.objects.create(user=self.user, query_text='sunny')
+        query = {'max_price_eur': 100, 'max_duration_hours': 3}
+        with patch.object(AISearchService, '_find_matching_airports', return_value=self.destinations):
+            _, options = AISearchService._search_by_query_db(search, query, self.origin, 200, 480)
+        self.assertEqual([o.rank for o in options], [1, 2, 3])
+        self.assertEqual([o.flight.flight_number for o in options], ['EW1', 'EW2', 'EW3'])
+        self.assertTrue(all(o.pk for o in options))
+        stored = TripOption.objects.filter(search=search).order_by('-match_score', 'id')
+        self.assertEqual([o.rank for o in stored], [1, 2, 3, 0])
+        self.assertEqual(stored.last().flight.flight_number, 'EW0')
+
+
+    def test_keyword_destinations_are_first_ten_by_name_then_id(self):
+        from api.services import AISearchService
+        for i in range(12):
+            Airport.objects.create(
+                icao_code='LEP{}'.format(chr(65 + i)), iata_code='P{:02d}'.format(i),
+                name='Beach {}'.format('Z' if i % 2 else 'A'), city='Palma', country='Spain',
+                latitude=Decimal('39.55'), longitude=Decimal('2.73'))
+        matches = AISearchService._find_matching_airports({'destination_type': 'beach'})
+        expected = list(Airport.objects.filter(city='Palma').order_by('name', 'id')[:10])
+        self.assertEqual(matches, expected)
+        self.assertEqual([a.name for a in matches], ['Beach A'] * 6 + ['Beach Z'] * 4)
+
+class DelayPredictionLookupTest(TestCase):
+    """Delay predictions are served from an in-process table that reloads after writes."""
+
+    def setUp(self):
+        from core.models import DelayPrediction
+        self.origin = Airport.objects.create(
+            iata_code='DUS', icao_code='EDDL', name='Dusseldorf', city='Dusseldorf', country='Germany',
+            latitude=Decimal('51.2895'), longitude=Decimal('6.7668'))
+        self.dest = Airport.objects.create(
+            iata_code='PMI', icao_code='LEPA', name='Palma', city='Palma', country='Spain',
+            latitude=Decimal('39.5517'), longitude=Decimal('2.7388'))
+        departure = timezone.now().replace(hour=9, minute=0, second=0, microsecond=0)
+        self.flight = Flight.objects.create(
+            flight_number='EW100', airline='Eurowings', origin_airport=self.origin, destination_airport=self.dest,
+            departure_time=departure, arrival_time=departure + timedelta(minutes=130),
+            price_eur=Decimal('90'), duration_minutes=130,
+        )
+        self.prediction = DelayPrediction.objects.create(
+            route='DUS-PMI', airline='Eurowings', day_of_week=departure.weekday(),
+            time_of_day=departure.time(), delay_probability=Decimal('42.50'), avg_delay_minutes=25, sample_size=80)
+
+    def test_repeated_predictions_hit_db_once(self):
+        from api.services import DelayPredictionService
+        with self.assertNumQueries(1):
+            first = DelayPredictionService.predict_delay(self.flight)
+            second = DelayPredictionService.predict_delay(self.flight)
+        self.assertEqual(first, second)
+        self.assertEqual(first, {'delay_probability': 42.5, 'avg_delay_minutes': 25, 'sample_size': 80})
+
+    def test_table_reloads_after_save(self):
+        from api.services import DelayPredictionService
+        DelayPredictionService.predict_delay(self.flight)
+        self.prediction.delay_probability = Decimal('10.00')
+        self.prediction.save()
+        self.assertEqual(DelayPredictionService.predict_delay(self.flight)['delay_probability'], 10.0)
+        self.prediction.delete()
+        self.assertEqual(DelayPredictionService.predict_delay(self.flight)['sample_size'], 0)
+
+    def test_self_transfer_check_joins_connection_legs(self):
+        from core.models import FlightConnection
+        connection = FlightConnection.objects.create(
+            first_flight=self.flight, second_flight=self.flight, layover_minutes=100,
+            total_duration_minutes=360, total_cost_eur=Decimal('180'), is_self_transfer=True)
+        user = User.objects.create_user(username='transferuser', password=TEST_AUTH_SECRET)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        # Joined connection, delay table load, risk update
+        with self.assertNumQueries(3):
+            r = client.post('/api/self-transfer-check/', {'connection_id': connection.id}, format='json')
+        self.assertEqual(r.status_code, 200)
+        self.assertEqual(r.json()['connection']['second_flight']['destination_airport']['iata_code'], 'PMI')
+        r = client.post('/api/self-transfer-check/', {'connection_id': connection.id + 1}, format='json')
+        self.assertEqual(r.status_code, 404)
+
+    def test_view_response_cached_until_flight_saved(self):
+        cache.clear()
+        user = User.objects.create_user(username='delayuser', password=TEST_AUTH_SECRET)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = '/api/delay-prediction/?flight_id={}'.format(self.flight.id)
+        first = client.get(url)
+        self.assertEqual(first.status_code, 200)
+        with self.assertNumQueries(0):
+            second = client.get(url)
+        self.assertEqual(second.json(), first.json())
+        self.flight.flight_number = 'EW101'
+        self.flight.save()
+        self.assertEqual(client.get(url).json()['flight']['flight_number'], 'EW101')
+
+
+    def test_table_and_cached_response_notice_writes_from_other_processes(self):
+        from core import delays
+        from core.models import DelayPrediction
+        cache.clear()
+        user = User.objects.create_user(username='delayother', password=TEST_AUTH_SECRET)
+        client = APIClient()
+        client.force_authenticate(user=user)
+        url = '/api/delay-prediction/?flight_id={}'.format(self.flight.id)
+        self.assertEqual(client.get(url).json()['delay_prediction']['delay_probability'], 42.5)
+        # queryset.update() sends no signals, like a write made by another worker
+        DelayPrediction.objects.filter(pk=self.prediction.pk).update(
+            delay_probability=Decimal('5.00'), updated_at=timezone.now())
+        self.assertEqual(client.get(url).json()['delay_prediction']['delay_probability'], 42.5)
+        with patch.object(delays, '_checked_at', -delays.TABLE_RECHECK_SECONDS):
+            self.assertEqual(client.get(url).json()['delay_prediction']['delay_probability'], 5.0)
+
+
+class MultiModalConnectionTest(TestCase):
+    """Train-link and same-airport connections are built from a fixed number of queries."""
+
+    def setUp(self):
+        from datetime import datetime, timezone as dt_timezone
+        def airport(iata, icao):
+            return Airport.objects.create(
+                iata_code=iata, icao_code=icao, name=iata, city=iata, country='Germany',
+                latitude=Decimal('50.0'), longitude=Decimal('8.0'))
+        self.origin = airport('HAM', 'EDDH')
+        self.hub = airport('FRA', 'EDDF')
+        self.rail_hub = airport('STR', 'EDDS')
+        self.destination = airport('FCO', 'LIRF')
+        self.day = datetime(2030, 5, 10, tzinfo=dt_timezone.utc)
+
+        def flight(number, origin, dest, hour, minutes, price):
+            departure = self.day.replace(hour=hour)
+            return Flight.objects.create(
+                flight_number=number, airline='Lufthansa', origin_airport=origin, destination_airport=dest,
+                departure_time=departure, arrival_time=departure + timedelta(minutes=minutes),
+                price_eur=Decimal(price), duration_minutes=minutes)
+        self.first = flight('LH1', self.origin, self.hub, 8, 60, '80')
+        flight('LH2', self.hub, self.destination, 9, 120, '50')  # departs before the connection window
+        self.same_airport = flight('LH3', self.hub, self.destination, 11, 120, '90')
+        self.after_train = flight('LH4', self.rail_hub, self.destination, 12, 110, '70')
+        flight('LH5', self.rail_hub, self.destination, 10, 110, '40')  # departs before the train arrives
+        self.train = GroundTransport.objects.create(
+            name='ICE', transport_type='train', from_airport=self.hub, to_airport=self.rail_hub,
+            duration_minutes=60, cost_eur=Decimal('30'))
+
+    def test_connections_use_fixed_query_count(self):
+        from api.services import MultiModalConnectionService
+        with self.assertNumQueries(7):
+            connections = MultiModalConnectionService.create_multi_modal_connection(
+                self.origin, self.destination, self.day.date())
+        by_type = {c['type']: c for c in connections}
+        self.assertEqual(set(by_type), {'train_link', 'connection'})
+        self.assertEqual(by_type['train_link']['flight2'], self.after_train)
+        self.assertEqual(by_type['train_link']['train'], self.train)
+        self.assertEqual(by_type['connection']['flight2'], self.same_airport)
+        self.assertEqual(by_type['connection']['layover_minutes'], 120)
+
+    def test_view_serializes_shared_legs_once(self):
+        client = APIClient()
+        client.force_authenticate(user=User.objects.create_user(
+            username='mmuser', email='mm@example.com', password=TEST_AUTH_SECRET))
+        with patch('api.views.FlightSerializer', wraps=FlightSerializer) as flight_serializer:
+            r = client.post('/api/multi-modal/', {
+                'origin_airport_code': 'ham', 'destination_airport_code': 'FCO', 'date': '2030-05-10',
+            }, format='json')
+        self.assertEqual(r.status_code, 200)
+        connections = {c['type']: c for c in r.json()['connections']}
+        self.assertEqual(connections['train_link']['flight1'], connections['connection']['flight1'])
+        self.assertEqual(connections['train_link']['flight2']['flight_number'], 'LH4')
+        self.assertEqual(connections['train_link']['intermediate_airport_b']['iata_code'], 'STR')
+        self.assertEqual(flight_serializer.call_count, 1)
+
+
+class ResultSortingTest(TestCase):
+    """Column sorts match the tuple-key sorts they replaced, including ties and descending order."""
+
+    def test_sort_results_matches_tuple_sort(self):
+        from api.services import SmartNearbyAirportService
+        rows = [
+            {'total_cost_eur': 120.0, 'total_time_minutes': 300, 'origin_distance_km': 40.0},
+            {'total_cost_eur': 80.0, 'total_time_minutes': 420, 'origin_distance_km': 40.0},
+            {'total_cost_eur': 120.0, 'total_time_minutes': 240, 'origin_distance_km': 10.0},
+            {'total_cost_eur': 80.0, 'total_time_minutes': 420, 'origin_distance_km': 5.0},
+        ]
+        keys = {
+            'cost': lambda x: (x['total_cost_eur'], x['total_time_minutes']),
+            'duration': lambda x: (x['total_time_minutes'], x['total_cost_eur']),
+            'radius': lambda x: (x['origin_distance_km'], x['total_cost_eur']),
+        }
+        for sort_by, key in keys.items():
+            for order in ('asc', 'desc'):
+                self.assertEqual(
+                    SmartNearbyAirportService._sort_results(rows, sort_by, order),
+                    sorted(rows, key=key, reverse=order == 'desc'))
+
+
+class AIQueryParseCacheTest(TestCase):
+    """LLM query parses are cached per normalized query; async mode defers the LLM call."""
+
+    def setUp(self):
+        cache.clear()
+        self.client_mock = MagicMock()
+        message = MagicMock(content='{"origin_city": "Berlin", "max_price_eur": 150}')
+        self.client_mock.chat.completions.create.return_value = MagicMock(choices=[MagicMock(message=message)])
+
+    def test_repeated_query_calls_llm_once(self):
+        from api.services import AISearchService
+        with patch.object(AISearchService, '_get_llm_client_and_model', return_value=(self.client_mock, 'llama3')):
+            first = AISearchService.parse_query_with_ai('Beach from Berlin under 150', ['Berlin'], ['Palma'])
+            second = AISearchService.parse_query_with_ai('  beach FROM berlin under 150 ', ['Berlin'], ['Palma'])
+        self.assertEqual(first, ({'origin_city': 'Berlin', 'max_price_eur': 150}, 0.9))
+        self.assertEqual(second, first)
+        self.assertEqual(self.client_mock.chat.completions.create.call_count, 1)
+
+    def test_failed_llm_parse_caches_keyword_fallback(self):
+        from api.services import AISearchService
+        self.client_mock.chat.completions.create.side_effect = TimeoutError('timed out')
+        with patch.object(AISearchService, '_get_llm_client_and_model', return_value=(self.client_mock, 'llama3')):
+            first = AISearchService.parse_query_with_ai('beach from Berlin under 150 euro')
+            second = AISearchService.parse_query_with_ai('beach from Berlin under 150 euro')
+        self.assertEqual(first[1], 0.5)
+        self.assertEqual(first[0]['max_price_eur'], 150.0)
+        self.assertEqual(second, first)
+        self.assertEqual(self.client_mock.chat.completions.create.call_count, 1)
+
+    @override_settings(AI_SEARCH_ASYNC_PARSE=True)
+    def test_async_miss_returns_keyword_parse_and_queues_task(self):
+        from api.services import AISearchService
+        with patch.object(AISearchService, '_get_llm_client_and_model', return_value=(self.client_mock, 'llama3')), \
+                patch('api.tasks.refresh_ai_query_parse.delay') as delay:
+            parsed, confidence = AISearchService.parse_query_with_ai('beach from Berlin under 150 euro')
+        self.assertEqual(confidence, 0.5)
+        self.assertEqual(parsed['max_price_eur'], 150.0)
+        delay.assert_called_once_with('beach from Berlin under 150 euro', [], [])
+        self.client_mock.chat.completions.create.assert_not_called()
+
+
+class OfflineGeocodeTest(TestCase):
+    """Airport codes are geocoded from the Airport table without Nominatim."""
+
+    def setUp(self):
+        cache.clear()
+        for iata, icao, lat, lon in (('CDG', 'LFPG', '49.0097', '2.5479'), ('ORY', 'LFPO', '48.7262', '2.3652')):
+            Airport.objects.create(
+                iata_code=iata, icao_code=icao, name=iata, city='Paris', country='France',
+                latitude=Decimal(lat), longitude=Decimal(lon))
+
+    def test_codes_skip_nominatim(self):
+        from api.services import NearestAlternateService
+        with patch('api.services._nominatim_geocode') as mock_geocode:
+            self.assertEqual(NearestAlternateService.geocode_address('cdg'), (49.0097, 2.5479))
+            self.assertEqual(NearestAlternateService.geocode_address('LFPO'), (48.7262, 2.3652))
+        mock_geocode.assert_not_called()
+
+    def test_city_name_goes_to_geocoder_not_airports(self):
+        from api.services import NearestAlternateService
+        location = MagicMock(latitude=48.8566, longitude=2.3522)
+        with patch('api.services._nominatim_geocode', return_value=location) as mock_geocode:
+            self.assertEqual(NearestAlternateService.geocode_address('Paris, France'), (48.8566, 2.3522))
+        mock_geocode.assert_called_once()
+
+    def test_street_address_falls_back_to_nominatim(self):
+        from api.services import NearestAlternateService
+        location = MagicMock(latitude=48.8584, longitude=2.2945)
+        with patch('api.services._nominatim_geocode', return_value=location) as mock_geocode:
+            coords = NearestAlternateService.geocode_address('5 Avenue Anatole France, Paris')
+        self.assertEqual(coords, (48.8584, 2.2945))
+        mock_geocode.assert_called_once()
+
+
+class SimpleParseTest(TestCase):
+    """Keyword fallback parser used when no LLM is configured."""
+
+    def test_keywords_budget_and_duration(self):
+        from api.services import AISearchService
+        parsed = AISearchService._simple_parse('From Berlin to a sunny beach, 200 euro, max 3 hours')
+        self.assertEqual(parsed['origin_city'], 'Berlin')
+        self.assertEqual(parsed['destination_type'], 'beach')
+        self.assertEqual(parsed['weather_preference'], 'warm')
+        self.assertEqual(parsed['max_price_eur'], 200.0)
+        self.assertEqual(parsed['max_duration_hours'], 3)
+
+    def test_explicit_weather_overrides_destination_default(self):
+        from api.services import AISearchService
+        self.assertEqual(
+            AISearchService._parse_destination_weather_keywords('mountain trip somewhere warm'), ('mountain', 'warm'))
+        self.assertEqual(AISearchService._parse_destination_weather_keywords('cold cities'), ('city', 'snow'))
+        self.assertEqual(AISearchService._parse_destination_weather_keywords('anywhere'), (None, None))
@@ -1,3 +1,4 @@
+import hashlib
 import logging
 import requests
 from rest_framework import viewsets, status
@@ -6,9 +7,17 @@ from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import models
+from django.db.models import Count, Max
 from django.utils import timezone
-from datetime import datetime, timedelta
+from django.utils.cache import get_conditional_response, patch_cache_control, quote_etag
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+from datetime import date, timedelta
 
+from core.delays import DELAY_RESPONSE_TTL, delay_response_cache_key
+from core.geo import airport_by_iata, airport_index_version, nearest_airport as nearest_airport_to
 from core.models import (
     Airport, Flight, FlightConnection, GroundTransport,
     UserProfile, TripSearch, TripOption, CollaborativeVote,
@@ -26,6 +35,7 @@ from .services import (
     SmartNearbyAirportService, BookingComparisonService,
 )
 from . import amadeus_client
+from .pagination import IataCursorPagination
 
 logger = logging.getLogger(__name__)
 
@@ -112,28 +122,27 @@ def _fetch_weather_for_city(city_name):
         return None
 
 
-def _exchange_rates_to_eur():
-    # Approximate display rates; replace with live FX in production.
-    return {
-        'EUR': 1.0,
-        'USD': 1.10,
-        'GBP': 0.85,
-        'JPY': 160.0,
-        'CAD': 1.50,
-        'AUD': 1.65,
-        'CHF': 0.95,
-        'CNY': 7.80,
-        'INR': 90.0,
-        'AED': 4.05,
-        'BRL': 6.0,
-        'MXN': 20.0,
-        'SGD': 1.47,
-        'HKD': 8.6,
-        'SEK': 11.0,
-        'NOK': 11.5,
-        'DKK': 7.5,
-        'NZD': 1.8,
-    }
+# Approximate display rates; replace with live FX in production.
+_EXCHANGE_RATES_TO_EUR = {
+    'EUR': 1.0,
+    'USD': 1.10,
+    'GBP': 0.85,
+    'JPY': 160.0,
+    'CAD': 1.50,
+    'AUD': 1.65,
+    'CHF': 0.95,
+    'CNY': 7.80,
+    'INR': 90.0,
+    'AED': 4.05,
+    'BRL': 6.0,
+    'MXN': 20.0,
+    'SGD': 1.47,
+    'HKD': 8.6,
+    'SEK': 11.0,
+    'NOK': 11.5,
+    'DKK': 7.5,
+    'NZD': 1.8,
+}
 
 
 @api_view(['GET'])
@@ -155,23 +164,44 @@ def nearest_airport(request):
         lon_f = float(lon)
     except ValueError:
         return Response({'error': 'lat and lon must be numbers'}, status=status.HTTP_400_BAD_REQUEST)
-    airports = list(Airport.objects.all())
-    if not airports:
+    nearest, distance_km = nearest_airport_to(lat_f, lon_f)
+    if nearest is None:
         return Response({'error': 'No airports in database'}, status=status.HTTP_404_NOT_FOUND)
-    nearest = min(airports, key=lambda a: a.distance_to(lat_f, lon_f))
     return Response({
         'airport': AirportSerializer(nearest).data,
         'iata_code': nearest.iata_code,
-        'distance_km': round(nearest.distance_to(lat_f, lon_f), 2),
+        'distance_km': round(distance_km, 2),
     })
 
 
+# Browser/app caches may reuse list responses this long before revalidating with If-None-Match
+_LIST_MAX_AGE = 60
+
+
+def _list_etag(request, *versions):
+    """
+    ETag for read-only list endpoints: the data versions the response depends on, plus the query
+    string and Accept header (JSON vs browsable API).
+    """
+    parts = [request.META.get('QUERY_STRING', ''), request.META.get('HTTP_ACCEPT', '')]
+    parts.extend(str(version) for version in versions)
+    return hashlib.sha1('|'.join(parts).encode('utf-8')).hexdigest()
+
+
+def _airport_list_etag(request, *args, **kwargs):
+    # The airport index already tracks the table's (row count, latest updated_at)
+    return _list_etag(request, airport_index_version())
+
+
 class AirportViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for airports"""
-    queryset = Airport.objects.all()
+    # Timestamps are not serialized
+    queryset = Airport.objects.defer('created_at', 'updated_at')
     serializer_class = AirportSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = IataCursorPagination
 
+    @method_decorator(condition(etag_func=_airport_list_etag))
     @action(detail=False, methods=['get'])
     def nearby(self, request):
         """Find airports near a location"""
@@ -184,32 +214,48 @@ class AirportViewSet(viewsets.ReadOnlyModelViewSet):
 
         airports = NearestAlternateService.find_airports_in_radius(
             float(lat), float(lon), radius)
+        serialized = AirportSerializer(
+            [item['airport'] for item in airports], many=True).data
         results = [{
-            'airport': AirportSerializer(item['airport']).data,
+            'airport': airport_data,
             'distance_km': item['distance_km']
-        } for item in airports]
+        } for airport_data, item in zip(serialized, airports)]
+
+        response = Response(results)
+        patch_cache_control(response, private=True, max_age=_LIST_MAX_AGE)
+        return response
+
 
-        return Response(results)
+# Query parameters that narrow the flight list enough for a per-request ETag aggregate
+_FLIGHT_FILTER_PARAMS = ('origin', 'destination', 'date', 'max_price')
 
 
 class FlightViewSet(viewsets.ReadOnlyModelViewSet):
     """ViewSet for flights"""
-    queryset = Flight.objects.all()
+    # FlightSerializer nests both airports; join them so list and detail stay one query.
+    # Timestamp columns are not serialized, and the id tie-break keeps pages stable.
+    queryset = Flight.objects.select_related('origin_airport', 'destination_airport').defer(
+        'created_at', 'updated_at',
+        'origin_airport__created_at', 'origin_airport__updated_at',
+        'destination_airport__created_at', 'destination_airport__updated_at',
+    ).order_by('departure_time', 'id')
     serializer_class = FlightSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
-        queryset = Flight.objects.all()
+        queryset = super().get_queryset()
         origin = self.request.query_params.get('origin')
         destination = self.request.query_params.get('destination')
         date = self.request.query_params.get('date')
         max_price = self.request.query_params.get('max_price')
 
+        # Resolve codes through the airport index so the filter is on the indexed FK columns
         if origin:
-            queryset = queryset.filter(origin_airport__iata_code=origin)
+            airport = airport_by_iata(origin)
+            queryset = queryset.filter(origin_airport_id=airport.id) if airport else queryset.none()
         if destination:
-            queryset = queryset.filter(
-                destination_airport__iata_code=destination)
+            airport = airport_by_iata(destination)
+            queryset = queryset.filter(destination_airport_id=airport.id) if airport else queryset.none()
         if date:
             queryset = queryset.filter(departure_time__date=date)
         if max_price:
@@ -217,6 +263,29 @@ class FlightViewSet(viewsets.ReadOnlyModelViewSet):
 
         return queryset
 
+    def list(self, request, *args, **kwargs):
+        if not any(request.query_params.get(param) for param in _FLIGHT_FILTER_PARAMS):
+            # Versioning the whole table would scan every flight on each request; serve it untagged
+            response = super().list(request, *args, **kwargs)
+            patch_cache_control(response, private=True, max_age=_LIST_MAX_AGE)
+            return response
+        # Version only the flights this filter selects (served by the origin/departure index),
+        # so writes to unrelated routes do not invalidate the tag
+        stats = self.filter_queryset(self.get_queryset()).order_by().aggregate(
+            latest=Max('updated_at'), rows=Count('pk'))
+        etag = quote_etag(_list_etag(request, airport_index_version(), stats['latest'], stats['rows']))
+        not_modified = get_conditional_response(request._request, etag=etag)
+        if not_modified is not None:
+            return not_modified
+        response = super().list(request, *args, **kwargs)
+        response['ETag'] = etag
+        patch_cache_control(response, private=True, max_age=_LIST_MAX_AGE)
+        return response
+
+
+# Upper bound on nearest-alternate rows per response; keeps payloads and serialization bounded
+_NEAREST_ALTERNATE_MAX_RESULTS = 100
+
 
 def _nearest_alternate_bad_request(message):
     return Response({'error': message}, status=status.HTTP_400_BAD_REQUEST)
@@ -234,7 +303,7 @@ def _nearest_alternate_request_params(data):
         'destination_radius_km': float(data.get('destination_radius_km', radius_km)),
         'sort_by': (data.get('sort_by') or 'cost').strip().lower(),
         'sort_order': (data.get('sort_order') or 'asc').strip().lower(),
-        'max_results': int(data.get('max_results', 30)),
+        'max_results': max(1, min(int(data.get('max_results', 30)), _NEAREST_ALTERNATE_MAX_RESULTS)),
         'trip_type': (data.get('trip_type') or 'one_way').strip().lower(),
         'return_date_str': (data.get('return_date') or '').strip(),
     }
@@ -244,7 +313,7 @@ def _validate_nearest_alternate_dates(params):
     if not all([params['origin_query'], params['destination_query'], params['date_str']]):
         return None, None, 'origin_query/destination_query/date are required (legacy: origin_airport_code/final_destination_address/date).'
     try:
-        departure_date = datetime.strptime(params['date_str'], '%Y-%m-%d').date()
+        departure_date = date.fromisoformat(params['date_str'])
     except ValueError:
         return None, None, 'Invalid date format. Use YYYY-MM-DD'
 
@@ -258,7 +327,7 @@ def _validate_nearest_alternate_dates(params):
     if not return_date_str:
         return None, None, 'return_date is required for round trips'
     try:
-        return_date = datetime.strptime(return_date_str, '%Y-%m-%d').date()
+        return_date = date.fromisoformat(return_date_str)
     except ValueError:
         return None, None, 'Invalid return_date format. Use YYYY-MM-DD'
     if return_date < departure_date:
@@ -325,12 +394,9 @@ def nearest_alternate_search(request):
     results = smart_search.get('results', [])
     search_meta = smart_search.get('meta', {})
     currency = _nearest_alternate_currency_for_user(request.user)
-    rate = _exchange_rates_to_eur().get(currency, 1.0)
+    rate = _EXCHANGE_RATES_TO_EUR.get(currency, 1.0)
     use_real_api = amadeus_client.is_configured()
-    serialized_results = [
-        _serialize_one_alternate(result, rate, currency, use_real_api)
-        for result in results
-    ]
+    serialized_results = _serialize_alternates(results, rate, currency, use_real_api)
 
     payload = {
         'results': serialized_results,
@@ -352,12 +418,43 @@ def nearest_alternate_search(request):
     return Response(payload)
 
 
-def _serialize_one_alternate(result, rate, currency, use_real_api):
+def _serialized_by_id(serializer_class, instances):
+    """Serialize each distinct model instance once, in a single many=True pass. Returns {pk: data}."""
+    unique = {}
+    for instance in instances:
+        if isinstance(instance, models.Model):
+            unique.setdefault(instance.pk, instance)
+    return dict(zip(unique, serializer_class(list(unique.values()), many=True).data))
+
+
+def _serialize_alternates(results, rate, currency, use_real_api):
+    """Serialize nearest-alternate results, rendering each distinct airport, flight and ground leg once."""
+    prepared = {
+        'airports': _serialized_by_id(AirportSerializer, (
+            result.get(key) for result in results
+            for key in ('airport', 'origin_airport', 'destination_airport')
+        )),
+        'flights': _serialized_by_id(FlightSerializer, (result.get('flight') for result in results)),
+        'ground': _serialized_by_id(GroundTransportSerializer, (result.get('ground_transport') for result in results)),
+    }
+    return [
+        _serialize_one_alternate(result, rate, currency, use_real_api, prepared)
+        for result in results
+    ]
+
+
+def _prepared_data(prepared, kind, instance, serializer_class):
+    """Pre-serialized data for instance from _serialize_alternates, serializing on the spot if absent."""
+    data = (prepared or {}).get(kind, {}).get(instance.pk)
+    return data if data is not None else serializer_class(instance).data
+
+
+def _serialize_one_alternate(result, rate, currency, use_real_api, prepared=None):
     """Build one serialized result for nearest-alternate (DB or real API)."""
-    flight_data, flight_id = _serialize_alternate_flight(result, use_real_api)
-    ground_data = _serialize_alternate_ground(result.get('ground_transport'))
-    origin_airport_data = _serialize_origin_airport_data(result, flight_data)
-    destination_airport_data = _serialize_destination_airport_data(result, flight_data)
+    flight_data, flight_id = _serialize_alternate_flight(result, use_real_api, prepared)
+    ground_data = _serialize_alternate_ground(result.get('ground_transport'), prepared)
+    origin_airport_data = _serialize_origin_airport_data(result, flight_data, prepared)
+    destination_airport_data = _serialize_destination_airport_data(result, flight_data, prepared)
     total_cost = _as_float(result.get('total_cost_eur', 0))
     ground_cost = _as_float(result.get('ground_cost', 0))
     flight_duration = _alternate_duration_minutes(
@@ -374,10 +471,11 @@ def _serialize_one_alternate(result, rate, currency, use_real_api):
         result.get('return_flight_time_minutes'),
         _as_float((flight_data or {}).get('return_duration_minutes', 0) if isinstance(flight_data, dict) else 0),
     )
+    trip_type = result.get('trip_type') or (flight_data.get('trip_type') if isinstance(flight_data, dict) else 'one_way') or 'one_way'
     booking_options = BookingComparisonService.build_booking_options(
         flight_data=flight_data if isinstance(flight_data, dict) else {},
         total_cost_eur=total_cost,
-        trip_type=result.get('trip_type') or (flight_data.get('trip_type') if isinstance(flight_data, dict) else 'one_way') or 'one_way',
+        trip_type=trip_type,
     )
     return {
         'flight': flight_data,
@@ -385,7 +483,7 @@ def _serialize_one_alternate(result, rate, currency, use_real_api):
         'flight_id': flight_id,
         'ground_transport': ground_data,
         'ground_leg': ground_data,
-        'airport': AirportSerializer(result['airport']).data,
+        'airport': _prepared_data(prepared, 'airports', result['airport'], AirportSerializer),
         'origin_airport': origin_airport_data,
         'destination_airport': destination_airport_data,
         'origin_distance_km': float(result.get('origin_distance_km', 0) or 0),
@@ -393,7 +491,7 @@ def _serialize_one_alternate(result, rate, currency, use_real_api):
         'total_trip_cost_eur': total_cost,
         'total_trip_cost_converted': total_cost * rate,
         'currency': currency,
-        'trip_type': result.get('trip_type') or (flight_data.get('trip_type') if isinstance(flight_data, dict) else 'one_way') or 'one_way',
+        'trip_type': trip_type,
         'total_trip_time_minutes': result['total_time_minutes'],
         'flight_cost_eur': float(result['flight_cost']),
         'ground_cost_eur': ground_cost,
@@ -406,32 +504,32 @@ def _serialize_one_alternate(result, rate, currency, use_real_api):
     }
 
 
-def _serialize_alternate_flight(result, use_real_api):
+def _serialize_alternate_flight(result, use_real_api, prepared=None):
     if use_real_api and isinstance(result.get('flight'), dict):
         return result['flight'], result.get('flight_id')
-    flight_data = FlightSerializer(result['flight']).data
+    flight_data = _prepared_data(prepared, 'flights', result['flight'], FlightSerializer)
     return flight_data, flight_data.get('id')
 
 
-def _serialize_alternate_ground(ground):
+def _serialize_alternate_ground(ground, prepared=None):
     if isinstance(ground, dict):
         return ground
     if ground:
-        return GroundTransportSerializer(ground).data
+        return _prepared_data(prepared, 'ground', ground, GroundTransportSerializer)
     return None
 
 
-def _serialize_origin_airport_data(result, flight_data):
+def _serialize_origin_airport_data(result, flight_data, prepared=None):
     origin_airport_obj = result.get('origin_airport')
     if origin_airport_obj:
-        return AirportSerializer(origin_airport_obj).data
+        return _prepared_data(prepared, 'airports', origin_airport_obj, AirportSerializer)
     return _flight_field_if_dict(flight_data, 'origin_airport')
 
 
-def _serialize_destination_airport_data(result, flight_data):
+def _serialize_destination_airport_data(result, flight_data, prepared=None):
     destination_airport_obj = result.get('destination_airport') or result.get('airport')
     if destination_airport_obj:
-        return AirportSerializer(destination_airport_obj).data
+        return _prepared_data(prepared, 'airports', destination_airport_obj, AirportSerializer)
     return _flight_field_if_dict(flight_data, 'destination_airport')
 
 
@@ -458,27 +556,29 @@ def _alternate_duration_minutes(result, result_key, leg_data, leg_duration_key):
     return 0
 
 
-def _nearest_alternate_empty_hint(origin_airport_code, final_destination_address, date):
+def _nearest_alternate_empty_hint(origin_airport_code, final_destination_address, date, use_real_api=None):
     """Return a specific hint when nearest-alternate search returns no results."""
     origin_code = (origin_airport_code or '').strip().upper()
-    dest_lat, dest_lon = NearestAlternateService._resolve_destination_coords(
-        final_destination_address
-    )
     is_iata = len(origin_code) == 3 and origin_code.isalpha()
-    if is_iata and not Airport.objects.filter(iata_code=origin_code).exists():
+    if is_iata and airport_by_iata(origin_code) is None:
         return (
             'Origin airport "{}" not in database. Run: python manage.py load_world_airports.'.format(
                 origin_code or ''
             )
         )
+    # Only geocode once the cheap origin check has passed; the geocoder may call out to Nominatim
+    dest_lat, dest_lon = NearestAlternateService._resolve_destination_coords(
+        final_destination_address
+    )
     if not dest_lat or not dest_lon:
         return (
             'Could not find destination. Use a city name (e.g. London), '
             'full address, or 3-letter airport code (e.g. LHR).'
         )
     # When Amadeus is configured, no results means API returned nothing for this route/date
-    from . import amadeus_client
-    if amadeus_client.is_configured():
+    if use_real_api is None:
+        use_real_api = amadeus_client.is_configured()
+    if use_real_api:
         return (
             'No flights from {} to airports near your destination on this date. '
             'Try a different date or larger radius.'.format(origin_code)
@@ -513,6 +613,47 @@ def _smart_search_empty_hint(origin_query, destination_query, origin_radius_km,
     return hint
 
 
+def _serialize_direct_connection(conn, prepared):
+    return {'flight': prepared['flights'][conn['flight'].pk]}
+
+
+def _serialize_two_leg_connection(conn, prepared):
+    flights, airports = prepared['flights'], prepared['airports']
+    return {
+        'flight1': flights[conn['flight1'].pk],
+        'flight2': flights[conn['flight2'].pk],
+        'intermediate_airport': airports[conn['intermediate_airport'].pk],
+        'layover_minutes': conn['layover_minutes'],
+    }
+
+
+def _serialize_train_link_connection(conn, prepared):
+    serialized = _serialize_two_leg_connection(conn, prepared)
+    serialized['train'] = prepared['trains'][conn['train'].pk]
+    if conn.get('intermediate_airport_b'):
+        serialized['intermediate_airport_b'] = prepared['airports'][conn['intermediate_airport_b'].pk]
+    return serialized
+
+
+# Per-type leg serializers for multi-modal connections; any other type is a two-flight connection
+_CONNECTION_SERIALIZERS = {
+    'direct': _serialize_direct_connection,
+    'train_link': _serialize_train_link_connection,
+}
+
+
+def _serialize_connection(conn, prepared):
+    serialized = {
+        'type': conn['type'],
+        'total_cost_eur': float(conn['total_cost']),
+        'total_time_minutes': conn['total_time'],
+        'connection_quality_score': conn['connection_quality'],
+    }
+    serializer = _CONNECTION_SERIALIZERS.get(conn['type'], _serialize_two_leg_connection)
+    serialized.update(serializer(conn, prepared))
+    return serialized
+
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def multi_modal_search(request):
@@ -520,9 +661,10 @@ def multi_modal_search(request):
     Feature 2: Multi-Modal Connection Logic
     Find connections with train links and layover quality scores
     """
-    origin_code = request.data.get('origin_airport_code')
-    destination_code = request.data.get('destination_airport_code')
-    date_str = request.data.get('date')
+    data = request.data
+    origin_code = data.get('origin_airport_code')
+    destination_code = data.get('destination_airport_code')
+    date_str = data.get('date')
 
     if not all([origin_code, destination_code, date_str]):
         return Response(
@@ -530,48 +672,27 @@ def multi_modal_search(request):
             status=status.HTTP_400_BAD_REQUEST
         )
 
-    try:
-        origin = Airport.objects.get(iata_code__iexact=origin_code.strip())
-        destination = Airport.objects.get(
-            iata_code__iexact=destination_code.strip())
-        date = datetime.strptime(date_str, '%Y-%m-%d').date()
-    except Airport.DoesNotExist:
+    origin = airport_by_iata(origin_code)
+    destination = airport_by_iata(destination_code)
+    if origin is None or destination is None:
         return Response({'error': 'Airport not found'}, status=status.HTTP_404_NOT_FOUND)
+    try:
+        travel_date = date.fromisoformat(date_str)
     except ValueError:
         return Response({'error': 'Invalid date format'}, status=status.HTTP_400_BAD_REQUEST)
 
     connections = MultiModalConnectionService.create_multi_modal_connection(
-        origin, destination, date)
-
-    serialized_connections = []
-    for conn in connections:
-        serialized = {
-            'type': conn['type'],
-            'total_cost_eur': float(conn['total_cost']),
-            'total_time_minutes': conn['total_time'],
-            'connection_quality_score': conn['connection_quality'],
-        }
-
-        if conn['type'] == 'direct':
-            serialized['flight'] = FlightSerializer(conn['flight']).data
-        elif conn['type'] == 'train_link':
-            serialized['flight1'] = FlightSerializer(conn['flight1']).data
-            serialized['flight2'] = FlightSerializer(conn['flight2']).data
-            serialized['train'] = GroundTransportSerializer(conn['train']).data
-            serialized['intermediate_airport'] = AirportSerializer(
-                conn['intermediate_airport']).data
-            serialized['layover_minutes'] = conn['layover_minutes']
-            if conn.get('intermediate_airport_b'):
-                serialized['intermediate_airport_b'] = AirportSerializer(
-                    conn['intermediate_airport_b']).data
-        else:
-            serialized['flight1'] = FlightSerializer(conn['flight1']).data
-            serialized['flight2'] = FlightSerializer(conn['flight2']).data
-            serialized['intermediate_airport'] = AirportSerializer(
-                conn['intermediate_airport']).data
-            serialized['layover_minutes'] = conn['layover_minutes']
-
-        serialized_connections.append(serialized)
+        origin, destination, travel_date)
+
+    # Each distinct flight, train and airport is serialized once across all connections
+    prepared = {
+        'flights': _serialized_by_id(FlightSerializer, (
+            conn.get(key) for conn in connections for key in ('flight', 'flight1', 'flight2'))),
+        'trains': _serialized_by_id(GroundTransportSerializer, (conn.get('train') for conn in connections)),
+        'airports': _serialized_by_id(AirportSerializer, (
+            conn.get(key) for conn in connections for key in ('intermediate_airport', 'intermediate_airport_b'))),
+    }
+    serialized_connections = [_serialize_connection(conn, prepared) for conn in connections]
 
     return Response({
         'connections': serialized_connections,
@@ -617,7 +738,12 @@ def ai_search(request):
     if options and isinstance(options[0], dict):
         top_matches = options
     else:
-        top_matches = [TripOptionSerializer(opt).data for opt in options]
+        loaded = TripOptionSerializer.setup_eager_loading(
+            TripOption.objects.filter(id__in=[opt.id for opt in options])
+        ).in_bulk()
+        top_matches = TripOptionSerializer(
+            [loaded.get(opt.id, opt) for opt in options], many=True
+        ).data
     weather_configured = bool((getattr(settings, 'WEATHER_API_KEY', None) or '').strip())
     if weather_configured:
         _attach_destination_weather(top_matches)
@@ -640,11 +766,11 @@ def ai_search(request):
 @permission_classes([IsAuthenticated])
 def generate_partner_sync_code(request):
     """Generate sync code for partner linking"""
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
+    profile = _request_profile(request)
 
-    if not profile.partner_sync_code:
-        profile.partner_sync_code = CollaborativeService.generate_sync_code()
-        profile.save()
+    if not profile.partner_sync_code and CollaborativeService.assign_sync_code(profile) is None:
+        return Response({'error': 'Could not generate a sync code, please retry'},
+                        status=status.HTTP_503_SERVICE_UNAVAILABLE)
 
     return Response({
         'sync_code': profile.partner_sync_code,
@@ -664,7 +790,7 @@ def link_partner(request):
     success = CollaborativeService.link_partners(request.user, sync_code)
 
     if success:
-        profile = UserProfile.objects.get(user=request.user)
+        profile = _profile_with_partner(request.user)
         return Response({
             'success': True,
             'partner': UserProfileSerializer(profile).data['partner'],
@@ -681,9 +807,10 @@ def vote_on_trip(request):
     Feature 4: Collaborative Voting
     User votes on a trip option
     """
-    trip_option_id = request.data.get('trip_option_id')
+    data = request.data
+    trip_option_id = data.get('trip_option_id')
     # 'like', 'dislike', 'super_like'
-    vote_type = request.data.get('vote_type')
+    vote_type = data.get('vote_type')
 
     if not all([trip_option_id, vote_type]):
         return Response({'error': 'trip_option_id and vote_type required'}, status=status.HTTP_400_BAD_REQUEST)
@@ -691,44 +818,55 @@ def vote_on_trip(request):
     if vote_type not in ['like', 'dislike', 'super_like']:
         return Response({'error': 'Invalid vote_type'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        trip_option = TripOption.objects.get(id=trip_option_id)
-    except TripOption.DoesNotExist:
+    trip_option = TripOption.objects.filter(id=trip_option_id).first()
+    if trip_option is None:
         return Response({'error': 'Trip option not found'}, status=status.HTTP_404_NOT_FOUND)
 
     vote = CollaborativeService.vote_on_option(
         request.user, trip_option, vote_type)
 
     # Check for perfect matches if user has a partner
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-        if profile.partner:
-            matches = CollaborativeService.find_perfect_matches(
-                request.user, profile.partner)
-            return Response({
-                'vote': CollaborativeVoteSerializer(vote).data,
-                'perfect_matches': PerfectMatchSerializer(matches[:5], many=True).data
-            })
-    except UserProfile.DoesNotExist:
-        pass
+    profile = _profile_with_partner(request.user)
+    if profile is not None and profile.partner:
+        matches = CollaborativeService.find_perfect_matches(
+            request.user, profile.partner, limit=5)
+        return Response({
+            'vote': CollaborativeVoteSerializer(vote).data,
+            'perfect_matches': _serialize_perfect_matches(matches)
+        })
 
     return Response(CollaborativeVoteSerializer(vote).data)
 
 
+def _profile_with_partner(user):
+    """The user's profile with user and partner joined in, or None."""
+    return UserProfile.objects.select_related('partner', 'user').filter(user=user).first()
+
+
+def _request_profile(request):
+    """Get or create the user's profile with user and partner joined in for the serializer."""
+    profile, _ = UserProfile.objects.select_related('partner', 'user').get_or_create(user=request.user)
+    return profile
+
+
+def _serialize_perfect_matches(matches):
+    """Serialize a find_perfect_matches queryset, joining the nested users and trip option into its one query."""
+    return PerfectMatchSerializer(PerfectMatchSerializer.setup_eager_loading(matches), many=True).data
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_perfect_matches(request):
     """Get perfect matches for user and their partner"""
-    try:
-        profile = UserProfile.objects.get(user=request.user)
-        if not profile.partner:
-            return Response({'error': 'No partner linked'}, status=status.HTTP_400_BAD_REQUEST)
-
-        matches = CollaborativeService.find_perfect_matches(
-            request.user, profile.partner)
-        return Response(PerfectMatchSerializer(matches, many=True).data)
-    except UserProfile.DoesNotExist:
+    profile = _profile_with_partner(request.user)
+    if profile is None:
         return Response({'error': 'Profile not found'}, status=status.HTTP_404_NOT_FOUND)
+    if not profile.partner:
+        return Response({'error': 'No partner linked'}, status=status.HTTP_400_BAD_REQUEST)
+
+    matches = CollaborativeService.find_perfect_matches(
+        request.user, profile.partner)
+    return Response(_serialize_perfect_matches(matches))
 
 
 @api_view(['GET'])
@@ -743,17 +881,25 @@ def predict_delay(request):
     if not flight_id:
         return Response({'error': 'flight_id required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        flight = Flight.objects.get(id=flight_id)
-    except Flight.DoesNotExist:
+    cache_key = delay_response_cache_key(flight_id) if flight_id.isdigit() else None
+    data = cache.get(cache_key) if cache_key else None
+    if data is not None:
+        return Response(data)
+
+    flight = Flight.objects.select_related(
+        'origin_airport', 'destination_airport').filter(id=flight_id).first()
+    if flight is None:
         return Response({'error': 'Flight not found'}, status=status.HTTP_404_NOT_FOUND)
 
     prediction = DelayPredictionService.predict_delay(flight)
 
-    return Response({
+    data = {
         'flight': FlightSerializer(flight).data,
         'delay_prediction': prediction
-    })
+    }
+    if cache_key:
+        cache.set(cache_key, data, DELAY_RESPONSE_TTL)
+    return Response(data)
 
 
 @api_view(['POST'])
@@ -768,9 +914,13 @@ def check_self_transfer_insurance(request):
     if not connection_id:
         return Response({'error': 'connection_id required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        connection = FlightConnection.objects.get(id=connection_id)
-    except FlightConnection.DoesNotExist:
+    # The serializer nests both flights, their airports and the ground leg; join them all
+    connection = FlightConnection.objects.select_related(
+        'first_flight__origin_airport', 'first_flight__destination_airport',
+        'second_flight__origin_airport', 'second_flight__destination_airport',
+        'ground_transport__from_airport', 'ground_transport__to_airport',
+    ).filter(id=connection_id).first()
+    if connection is None:
         return Response({'error': 'Connection not found'}, status=status.HTTP_404_NOT_FOUND)
 
     insurance_check = DelayPredictionService.check_self_transfer_insurance(
@@ -786,7 +936,7 @@ def check_self_transfer_insurance(request):
 @permission_classes([IsAuthenticated])
 def get_user_profile(request):
     """Get or create user profile"""
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
+    profile = _request_profile(request)
     return Response(UserProfileSerializer(profile).data)
 
 
@@ -794,12 +944,13 @@ def get_user_profile(request):
 @permission_classes([IsAuthenticated])
 def update_user_profile(request):
     """Update user profile"""
-    profile, _ = UserProfile.objects.get_or_create(user=request.user)
+    profile = _request_profile(request)
 
-    budget = request.data.get('budget_preference_eur')
-    preferred_airlines = request.data.get('preferred_airlines')
-    currency = request.data.get('currency')
-    preferred_language = request.data.get('preferred_language')
+    data = request.data
+    budget = data.get('budget_preference_eur')
+    preferred_airlines = data.get('preferred_airlines')
+    currency = data.get('currency')
+    preferred_language = data.get('preferred_language')
 
     if budget is not None:
         profile.budget_preference_eur = budget
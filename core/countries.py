@@ -2,7 +2,7 @@
 ISO 3166-1 alpha-2 country codes and names for profile country selection.
 Format: (code, display name), sorted by name.
 """
-COUNTRY_CHOICES = [
+_COUNTRIES = [
     ('AF', 'Afghanistan'), ('AL', 'Albania'), ('DZ', 'Algeria'), ('AD', 'Andorra'),
     ('AO', 'Angola'), ('AG', 'Antigua and Barbuda'), ('AR', 'Argentina'), ('AM', 'Armenia'),
     ('AU', 'Australia'), ('AT', 'Austria'), ('AZ', 'Azerbaijan'), ('BS', 'Bahamas'),
@@ -55,5 +55,5 @@ COUNTRY_CHOICES = [
     ('VE', 'Venezuela'), ('VN', 'Vietnam'), ('YE', 'Yemen'), ('ZM', 'Zambia'),
     ('ZW', 'Zimbabwe'),
 ]
-# Sort by display name for dropdown
-COUNTRY_CHOICES.sort(key=lambda x: x[1])
+# Sorted by display name once at import; immutable so every render shares it
+COUNTRY_CHOICES = tuple(sorted(_COUNTRIES, key=lambda x: x[1]))
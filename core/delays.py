@@ -0,0 +1,91 @@
+"""
+In-process lookup table for historical delay predictions.
+
+The DelayPrediction table is small and rarely written, so it is loaded once per process
+into a dict keyed by (route, airline, day_of_week). The table is dropped on
+DelayPrediction save/delete (see core.signals) and rebuilt lazily on next use. Signals only
+reach the writing process, so every TABLE_RECHECK_SECONDS the row count and latest
+updated_at are compared with the ones the table was built from, as core.geo does for
+airports; bulk updates must set updated_at to be noticed.
+
+Full predict_delay responses are also cached per flight. Their key carries the table
+version, so prediction changes reach every process within TABLE_RECHECK_SECONDS. A
+flight's entry is deleted when the flight is saved or deleted in this process; edits made
+by other processes or by bulk updates show up once DELAY_RESPONSE_TTL expires.
+"""
+import threading
+import time
+
+from django.core.cache import cache
+
+DELAY_RESPONSE_TTL = 60
+TABLE_RECHECK_SECONDS = 30.0
+
+_table_lock = threading.Lock()
+_table = None
+_checked_at = 0.0
+
+
+def _load_table():
+    from .models import DelayPrediction
+    predictions = {}
+    rows = DelayPrediction.objects.order_by('id').values_list(
+        'route', 'airline', 'day_of_week', 'delay_probability', 'avg_delay_minutes', 'sample_size', 'updated_at')
+    latest = None
+    count = 0
+    for route, airline, day_of_week, probability, avg_minutes, sample_size, updated_at in rows:
+        count += 1
+        if latest is None or updated_at > latest:
+            latest = updated_at
+        # Keep the lowest id per key, matching the old filter(...).first()
+        predictions.setdefault((route, airline, day_of_week), (float(probability), avg_minutes, sample_size))
+    return {'predictions': predictions, 'stamp': (count, latest)}
+
+
+def _table_stamp():
+    from django.db.models import Count, Max
+    from .models import DelayPrediction
+    stats = DelayPrediction.objects.order_by().aggregate(rows=Count('pk'), latest=Max('updated_at'))
+    return stats['rows'], stats['latest']
+
+
+def _delay_table():
+    """Return the cached table ('predictions' map and 'stamp'), rebuilding it when stale."""
+    global _table, _checked_at
+    table = _table
+    if table is not None and time.monotonic() - _checked_at >= TABLE_RECHECK_SECONDS:
+        _checked_at = time.monotonic()
+        if _table_stamp() != table['stamp']:
+            with _table_lock:
+                if _table is table:
+                    _table = None
+            table = None
+    if table is None:
+        with _table_lock:
+            if _table is None:
+                _table = _load_table()
+                _checked_at = time.monotonic()
+            table = _table
+    return table
+
+
+def lookup_delay(route, airline, day_of_week):
+    """Return (delay_probability, avg_delay_minutes, sample_size) or None when there is no history."""
+    return _delay_table()['predictions'].get((route, airline, day_of_week))
+
+
+def invalidate_delay_table(**kwargs):
+    """Signal receiver: forget cached predictions so the next lookup reloads them."""
+    global _table
+    _table = None
+
+
+def delay_response_cache_key(flight_id):
+    count, latest = _delay_table()['stamp']
+    version = int(latest.timestamp() * 1000000) if latest else 0
+    return 'delay:{}:{}:{}'.format(flight_id, count, version)
+
+
+def invalidate_delay_response(sender, instance, **kwargs):
+    """Signal receiver: drop the cached predict_delay response for a saved or deleted flight."""
+    cache.delete(delay_response_cache_key(instance.pk))
@@ -0,0 +1,201 @@
+"""
+In-memory airport index and vectorized great-circle distance helpers.
+
+Every airport is loaded once per process: coordinates into NumPy arrays so radius searches
+run as array math instead of an ORM loop, and the rows themselves into id/IATA maps so hot
+paths resolve airports without a query. The index is dropped on Airport save/delete
+(see core.signals) and rebuilt lazily on next use. Signals only reach the writing process,
+so every INDEX_RECHECK_SECONDS the table's row count and latest updated_at are compared with
+the ones the index was built from, and other processes rebuild when they differ. Cached
+Airport instances are shared between requests and must be treated as read-only.
+"""
+import math
+import threading
+import time
+
+import numpy as np
+
+try:
+    from scipy.spatial import cKDTree
+except ImportError:  # radius and nearest lookups fall back to vectorized scans
+    cKDTree = None
+
+EARTH_RADIUS_KM = 6371.0
+INDEX_RECHECK_SECONDS = 30.0
+
+_index_lock = threading.Lock()
+_index = None
+_checked_at = 0.0
+
+
+def _load_index():
+    from .models import Airport
+    airports = list(Airport.objects.order_by())
+    count = len(airports)
+    ids = np.fromiter((a.id for a in airports), dtype=np.int64, count=count)
+    lat = np.radians(np.fromiter((a.latitude for a in airports), dtype=np.float64, count=count))
+    lon = np.radians(np.fromiter((a.longitude for a in airports), dtype=np.float64, count=count))
+    cos_lat = np.cos(lat)
+    # k-d tree over unit-sphere xyz: chord length is monotone in great-circle distance
+    tree = None
+    if cKDTree is not None and count:
+        tree = cKDTree(np.column_stack((cos_lat * np.cos(lon), cos_lat * np.sin(lon), np.sin(lat))))
+    return {
+        'ids': ids, 'lat': lat, 'lon': lon, 'cos_lat': cos_lat, 'tree': tree,
+        'by_id': {a.id: a for a in airports},
+        'by_iata': {a.iata_code.upper(): a for a in airports if a.iata_code},
+        'stamp': (count, max((a.updated_at for a in airports), default=None)),
+    }
+
+
+def _table_stamp():
+    from django.db.models import Count, Max
+    from .models import Airport
+    stats = Airport.objects.order_by().aggregate(rows=Count('pk'), latest=Max('updated_at'))
+    return stats['rows'], stats['latest']
+
+
+def bounding_box_mask(lat, lon, radius_km, lat_rad, lon_rad):
+    """
+    Boolean mask of points (radians) inside the lat/lon box that encloses the radius circle.
+    Exact for a sphere, so it never drops a point the haversine would keep; handles the
+    antimeridian by comparing wrapped longitude differences and the poles by dropping the
+    longitude bound.
+    """
+    angular = radius_km / EARTH_RADIUS_KM
+    lat0 = np.radians(lat)
+    mask = np.abs(lat_rad - lat0) <= angular
+    if abs(lat0) + angular >= np.pi / 2 or angular >= np.pi / 2:
+        return mask
+    dlon = np.arcsin(np.sin(angular) / np.cos(lat0))
+    wrapped = np.abs((lon_rad - np.radians(lon) + np.pi) % (2 * np.pi) - np.pi)
+    return mask & (wrapped <= dlon)
+
+
+def airport_index():
+    """Return the cached index ('ids', 'lat', 'lon', 'cos_lat' arrays in radians; 'tree'; 'by_id', 'by_iata' maps), building it if needed."""
+    global _index, _checked_at
+    index = _index
+    if index is not None and time.monotonic() - _checked_at >= INDEX_RECHECK_SECONDS:
+        _checked_at = time.monotonic()
+        if _table_stamp() != index['stamp']:
+            with _index_lock:
+                if _index is index:
+                    _index = None
+            index = None
+    if index is None:
+        with _index_lock:
+            if _index is None:
+                _index = _load_index()
+                _checked_at = time.monotonic()
+            index = _index
+    return index
+
+
+def airport_by_iata(code):
+    """Return the cached Airport for an IATA code (any case), or None."""
+    return airport_index()['by_iata'].get((code or '').strip().upper())
+
+
+def airports_by_id(ids):
+    """Return {id: Airport} from the cached index for the given ids; unknown ids are skipped."""
+    by_id = airport_index()['by_id']
+    return {airport_id: by_id[airport_id] for airport_id in ids if airport_id in by_id}
+
+
+def airports_for_display():
+    """Return the cached airports ordered by (country, city, name) for dropdowns; built once per index."""
+    index = airport_index()
+    ordered = index.get('display')
+    if ordered is None:
+        ordered = sorted(index['by_id'].values(), key=lambda a: (a.country, a.city, a.name))
+        index['display'] = ordered
+    return ordered
+
+
+def airport_index_version():
+    """(row count, latest updated_at) the cached index was built from; changes whenever airports do."""
+    return airport_index()['stamp']
+
+
+def invalidate_airport_index(**kwargs):
+    """Signal receiver: forget cached coordinates so the next lookup reloads them."""
+    global _index
+    _index = None
+
+
+def haversine_term(lat, lon, lat_rad, lon_rad, cos_lat=None):
+    """
+    The haversine "a" term from (lat, lon) in degrees to arrays of points in radians.
+    Distance is monotone in it, so radius checks can compare it to radius_term() directly.
+    """
+    lat0 = np.radians(lat)
+    lon0 = np.radians(lon)
+    if cos_lat is None:
+        cos_lat = np.cos(lat_rad)
+    return np.sin((lat_rad - lat0) / 2.0) ** 2 + np.cos(lat0) * cos_lat * np.sin((lon_rad - lon0) / 2.0) ** 2
+
+
+def radius_term(radius_km):
+    """The haversine term a point exactly radius_km away would have."""
+    return np.sin(min(radius_km / (2.0 * EARTH_RADIUS_KM), np.pi / 2)) ** 2
+
+
+def term_to_km(a):
+    """Convert haversine terms back to great-circle km."""
+    return 2.0 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def haversine_km(lat, lon, lat_rad, lon_rad, cos_lat=None):
+    """Great-circle distance in km from (lat, lon) in degrees to arrays of points in radians."""
+    return term_to_km(haversine_term(lat, lon, lat_rad, lon_rad, cos_lat))
+
+
+def great_circle_km(lat1, lon1, lat2, lon2):
+    """Scalar haversine distance in km between two (lat, lon) points in degrees."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    a = (math.sin((phi2 - phi1) / 2.0) ** 2
+         + math.cos(phi1) * math.cos(phi2) * math.sin(math.radians(lon2 - lon1) / 2.0) ** 2)
+    return 2.0 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(a, 1.0)))
+
+
+def _unit_vector(lat, lon):
+    """Unit-sphere xyz for (lat, lon) in degrees, matching the k-d tree's coordinates."""
+    lat0, lon0 = np.radians(lat), np.radians(lon)
+    return np.cos(lat0) * np.cos(lon0), np.cos(lat0) * np.sin(lon0), np.sin(lat0)
+
+
+def _radius_candidates(index, lat, lon, radius_km):
+    """Index positions that may lie within radius_km: a k-d tree ball query, or the bounding box without scipy."""
+    if index['tree'] is None:
+        return np.flatnonzero(bounding_box_mask(lat, lon, radius_km, index['lat'], index['lon']))
+    angular = min(radius_km / EARTH_RADIUS_KM, np.pi)
+    # Chord for the radius, padded so float error at the edge cannot drop a point
+    chord = 2.0 * np.sin(angular / 2.0) + 1e-9
+    return np.asarray(index['tree'].query_ball_point(_unit_vector(lat, lon), chord), dtype=np.intp)
+
+
+def airports_within_radius(lat, lon, radius_km):
+    """Return (airport_ids, distances_km) for airports within radius_km, nearest first."""
+    index = airport_index()
+    candidates = _radius_candidates(index, lat, lon, radius_km)
+    # Filter on the haversine term; sqrt/arcsin only run for the airports that are kept
+    a = haversine_term(lat, lon, index['lat'][candidates], index['lon'][candidates], index['cos_lat'][candidates])
+    mask = a <= radius_term(radius_km)
+    ids = index['ids'][candidates][mask]
+    distances = term_to_km(a[mask])
+    order = np.argsort(distances, kind='stable')
+    return ids[order].tolist(), distances[order].tolist()
+
+
+def nearest_airport(lat, lon):
+    """Return (Airport, great-circle km) nearest to (lat, lon) in degrees, or (None, None) if there are no airports."""
+    index = airport_index()
+    if not len(index['ids']):
+        return None, None
+    if index['tree'] is not None:
+        _, i = index['tree'].query(_unit_vector(lat, lon))
+    else:
+        i = np.argmin(haversine_term(lat, lon, index['lat'], index['lon'], index['cos_lat']))
+    distance = haversine_km(lat, lon, index['lat'][i], index['lon'][i], index['cos_lat'][i])
+    return index['by_id'][int(index['ids'][i])], float(distance)
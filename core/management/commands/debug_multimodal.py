@@ -6,6 +6,7 @@ Run: python manage.py debug_multimodal [--origin LHR] [--destination CDG] [--dat
 from datetime import date, timedelta
 
 from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
 
 from core.models import Airport, Flight, GroundTransport
 from api.services import MultiModalConnectionService
@@ -35,12 +36,16 @@ class Command(BaseCommand):
         self.stdout.write('Multi-modal debug: {} -> {} on {}'.format(origin_code, dest_code, search_date))
         self.stdout.write('')
 
-        # Resolve airports
-        try:
-            origin = Airport.objects.get(iata_code__iexact=origin_code)
-            destination = Airport.objects.get(iata_code__iexact=dest_code)
-        except Airport.DoesNotExist as e:
-            self.stderr.write(self.style.ERROR('Airport not found: {}'.format(e)))
+        # Resolve both airports in one query
+        airports = {
+            airport.iata_code.upper(): airport
+            for airport in Airport.objects.filter(iata_code__in=[origin_code, dest_code])
+        }
+        origin = airports.get(origin_code)
+        destination = airports.get(dest_code)
+        if origin is None or destination is None:
+            missing = ', '.join(code for code in (origin_code, dest_code) if code not in airports)
+            self.stderr.write(self.style.ERROR('Airport not found: {}'.format(missing)))
             self.stdout.write('Add airports and flights to the database for the date {}'.format(search_date))
             return
 
@@ -49,7 +54,9 @@ class Command(BaseCommand):
 
         # Flights on this date
         all_on_date = Flight.objects.filter(departure_time__date=search_date)
-        count_on_date = all_on_date.count()
+        shown = list(all_on_date.select_related('origin_airport', 'destination_airport')[:30])
+        # Only count separately when the listing was cut off
+        count_on_date = len(shown) if len(shown) < 30 else all_on_date.count()
         self.stdout.write('Flights on {}: total {}'.format(search_date, count_on_date))
 
         if count_on_date == 0:
@@ -57,7 +64,7 @@ class Command(BaseCommand):
                 'No flights on this date. Add flight data for {}.'.format(search_date)
             ))
         else:
-            for f in all_on_date.select_related('origin_airport', 'destination_airport')[:30]:
+            for f in shown:
                 self.stdout.write('  {} {} -> {}  dep={}'.format(
                     f.flight_number,
                     f.origin_airport.iata_code,
@@ -65,22 +72,22 @@ class Command(BaseCommand):
                     f.departure_time,
                 ))
 
-        direct = Flight.objects.filter(
+        # Direct flights and other first legs from the origin, counted in one pass
+        legs = Flight.objects.filter(
             origin_airport=origin,
-            destination_airport=destination,
             departure_time__date=search_date,
+        ).aggregate(
+            direct=Count('pk', filter=Q(destination_airport=destination)),
+            first_legs=Count('pk', filter=~Q(destination_airport=destination)),
         )
-        self.stdout.write('Direct {} -> {} on date: {}'.format(origin_code, dest_code, direct.count()))
-
-        first_legs = Flight.objects.filter(
-            origin_airport=origin,
-            departure_time__date=search_date,
-        ).exclude(destination_airport=destination)
-        self.stdout.write('First legs {} -> (not {}) on date: {}'.format(origin_code, dest_code, first_legs.count()))
+        self.stdout.write('Direct {} -> {} on date: {}'.format(origin_code, dest_code, legs['direct']))
+        self.stdout.write('First legs {} -> (not {}) on date: {}'.format(origin_code, dest_code, legs['first_legs']))
 
         trains = GroundTransport.objects.filter(transport_type='train').exclude(to_airport__isnull=True)
-        self.stdout.write('Trains (any): {}'.format(trains.count()))
-        for t in trains.select_related('from_airport', 'to_airport')[:10]:
+        shown_trains = list(trains.select_related('from_airport', 'to_airport')[:10])
+        train_count = len(shown_trains) if len(shown_trains) < 10 else trains.count()
+        self.stdout.write('Trains (any): {}'.format(train_count))
+        for t in shown_trains:
             self.stdout.write('  {} -> {}  {} min'.format(
                 t.from_airport.iata_code, t.to_airport.iata_code, t.duration_minutes))
 
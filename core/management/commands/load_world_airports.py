@@ -4,11 +4,11 @@ Run: python manage.py load_world_airports
 Downloads the CSV once and populates the Airport model for the profile dropdown.
 """
 import csv
-import io
-from decimal import Decimal
+from decimal import Decimal, InvalidOperation
 
 import requests
 from django.core.management.base import BaseCommand
+from django.db import transaction
 
 from core.models import Airport
 
@@ -18,21 +18,39 @@ AIRPORTS_CSV_URL = (
     'https://raw.githubusercontent.com/davidmegginson/ourairports-data/main/airports.csv'
 )
 # Only load these types (commercial/significant airports with IATA codes)
-TYPES = {'large_airport', 'medium_airport', 'small_airport'}
+TYPES = frozenset({'large_airport', 'medium_airport', 'small_airport'})
+# Layover metrics are not in the CSV; Decimal is immutable so one instance is shared by every row
+_LAYOVER_DEFAULTS = {
+    'has_lounge': False,
+    'has_sleeping_pods': False,
+    'city_access_time': 0,
+    'layover_quality_score': Decimal('0'),
+}
+# Airport coordinates are stored with 6 decimal places
+_COORD_QUANTUM = Decimal('0.000001')
 
 
 def _parse_airport_row(row):
     """Parse a CSV row into (icao_code, defaults) or None if skip."""
-    if (row.get('type') or '').strip() not in TYPES:
+    # Cheapest rejections first: most rows are other types or have no IATA code
+    if row.get('type') not in TYPES:
+        return None
+    iata = row.get('iata_code')
+    if not iata or not iata.strip():
         return None
     ident = (row.get('ident') or '').strip()[:4]
-    iata = (row.get('iata_code') or '').strip()[:3]
-    if not ident or not iata:
+    if not ident:
+        return None
+    iata = iata.strip()[:3]
+    # CSV fields go straight to Decimal; rows without coordinates are skipped
+    lat_s = (row.get('latitude_deg') or '').strip()
+    lon_s = (row.get('longitude_deg') or '').strip()
+    if not lat_s or not lon_s:
         return None
     try:
-        lat = Decimal(row.get('latitude_deg', 0))
-        lon = Decimal(row.get('longitude_deg', 0))
-    except Exception:
+        lat = Decimal(lat_s).quantize(_COORD_QUANTUM)
+        lon = Decimal(lon_s).quantize(_COORD_QUANTUM)
+    except InvalidOperation:
         return None
     return (ident.upper(), {
         'iata_code': iata.upper(),
@@ -41,27 +59,31 @@ def _parse_airport_row(row):
         'country': (row.get('iso_country') or '')[:100],
         'latitude': lat,
         'longitude': lon,
-        'has_lounge': False,
-        'has_sleeping_pods': False,
-        'city_access_time': 0,
-        'layover_quality_score': Decimal('0'),
+        **_LAYOVER_DEFAULTS,
     })
 
 
-def _upsert_airport(icao_code, defaults):
-    """Create or update one airport. Returns 'created', 'updated', or 'skipped'."""
-    try:
-        _, was_created = Airport.objects.update_or_create(
-            icao_code=icao_code,
-            defaults=defaults,
+# Rows per multi-row upsert
+BATCH_SIZE = 1000
+UPDATE_FIELDS = [
+    'iata_code', 'name', 'city', 'country', 'latitude', 'longitude',
+    'has_lounge', 'has_sleeping_pods', 'city_access_time', 'layover_quality_score',
+    'updated_at',
+]
+# Columns compared against the stored row to decide whether an upsert is needed
+COMPARED_FIELDS = UPDATE_FIELDS[:-1]
+
+
+def _upsert_batch(batch):
+    """Insert or update a batch of airports keyed on icao_code in one statement and transaction."""
+    with transaction.atomic():
+        Airport.objects.bulk_create(
+            batch,
+            update_conflicts=True,
+            unique_fields=['icao_code'],
+            update_fields=UPDATE_FIELDS,
+            batch_size=BATCH_SIZE,
         )
-        return 'created' if was_created else 'updated'
-    except Exception:
-        try:
-            Airport.objects.filter(icao_code=icao_code).update(**defaults)
-            return 'updated'
-        except Exception:
-            return 'skipped'
 
 
 class Command(BaseCommand):
@@ -85,27 +107,62 @@ class Command(BaseCommand):
         limit = options['limit']
         self.stdout.write('Fetching airports from {} ...'.format(url))
         try:
-            resp = requests.get(url, timeout=60)
-            resp.raise_for_status()
+            # Stream the CSV so rows are parsed and upserted while it downloads
+            with requests.get(url, stream=True, timeout=60) as resp:
+                resp.raise_for_status()
+                resp.encoding = 'utf-8'
+                counts = self._load(csv.DictReader(resp.iter_lines(decode_unicode=True)), limit)
         except requests.RequestException as e:
             self.stderr.write(self.style.ERROR('Failed to fetch CSV: {}'.format(e)))
             return
-        reader = csv.DictReader(io.StringIO(resp.text))
-        counts = {'created': 0, 'updated': 0, 'skipped': 0}
+        self.stdout.write(
+            self.style.SUCCESS(
+                'Done. Created: {}, Updated: {}, Unchanged: {}, Skipped: {}'.format(
+                    counts['created'], counts['updated'], counts['unchanged'], counts['skipped']
+                )
+            )
+        )
+
+    def _load(self, reader, limit):
+        """Upsert new or changed rows in batches. Returns created/updated/unchanged/skipped counts."""
+        counts = {'created': 0, 'updated': 0, 'unchanged': 0, 'skipped': 0}
+        stored = {
+            row[0]: row[1:]
+            for row in Airport.objects.values_list('icao_code', *COMPARED_FIELDS).iterator(chunk_size=5000)
+        }
+        # iata_code is unique too: a row whose IATA belongs to another ICAO would abort the batch
+        icao_by_iata = {values[0]: icao_code for icao_code, values in stored.items()}
+        seen_icaos = set()
+        batch = []
         for row in reader:
-            if limit and (counts['created'] + counts['updated']) >= limit:
+            if limit and (counts['created'] + counts['updated'] + counts['unchanged']) >= limit:
                 break
             parsed = _parse_airport_row(row)
             if not parsed:
                 counts['skipped'] += 1
                 continue
             icao_code, defaults = parsed
-            result = _upsert_airport(icao_code, defaults)
-            counts[result] += 1
-        self.stdout.write(
-            self.style.SUCCESS(
-                'Done. Created: {}, Updated: {}, Skipped: {}'.format(
-                    counts['created'], counts['updated'], counts['skipped']
-                )
-            )
-        )
+            # Truncated idents can repeat; one statement cannot upsert the same row twice
+            if icao_code in seen_icaos:
+                counts['skipped'] += 1
+                continue
+            if icao_by_iata.setdefault(defaults['iata_code'], icao_code) != icao_code:
+                counts['skipped'] += 1
+                continue
+            seen_icaos.add(icao_code)
+            current = stored.get(icao_code)
+            if current is None:
+                counts['created'] += 1
+            elif current == tuple(defaults[field] for field in COMPARED_FIELDS):
+                # Re-runs only write airports whose CSV data actually changed
+                counts['unchanged'] += 1
+                continue
+            else:
+                counts['updated'] += 1
+            batch.append(Airport(icao_code=icao_code, **defaults))
+            if len(batch) >= BATCH_SIZE:
+                _upsert_batch(batch)
+                batch = []
+        if batch:
+            _upsert_batch(batch)
+        return counts
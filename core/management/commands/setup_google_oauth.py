@@ -2,6 +2,7 @@
 Django management command to help set up Google OAuth
 """
 from django.core.management.base import BaseCommand
+from django.db import transaction
 from django.contrib.sites.models import Site
 from allauth.socialaccount.models import SocialApp
 from allauth.socialaccount.providers.google.provider import GoogleProvider
@@ -22,6 +23,7 @@ class Command(BaseCommand):
             help='Google OAuth Client Secret',
         )
 
+    @transaction.atomic
     def handle(self, *args, **options):
         self.stdout.write(self.style.SUCCESS('Setting up Google OAuth...'))
 
@@ -46,10 +48,13 @@ class Command(BaseCommand):
             self.stdout.write(
                 f'  Current Client ID: {social_app.client_id[:20]}...')
 
-            if options.get('client_id') and options.get('client_secret'):
-                social_app.client_id = options['client_id']
-                social_app.secret = options['client_secret']
-                social_app.save()
+            new_credentials = (options.get('client_id'), options.get('client_secret'))
+            if all(new_credentials) and new_credentials == (social_app.client_id, social_app.secret):
+                self.stdout.write(self.style.SUCCESS(
+                    '✓ Social Application credentials already up to date'))
+            elif all(new_credentials):
+                social_app.client_id, social_app.secret = new_credentials
+                social_app.save(update_fields=['client_id', 'secret'])
                 self.stdout.write(self.style.SUCCESS(
                     '✓ Social Application updated with new credentials'))
             else:
@@ -86,7 +91,7 @@ class Command(BaseCommand):
         self.stdout.write(
             f'Social App Client ID: {social_app.client_id[:30]}...')
         self.stdout.write(
-            f'Social App Sites: {", ".join([s.domain for s in social_app.sites.all()])}')
+            f'Social App Sites: {", ".join(social_app.sites.values_list("domain", flat=True))}')
         self.stdout.write('\n' + '='*60)
         self.stdout.write(self.style.SUCCESS('Setup complete!'))
         self.stdout.write(
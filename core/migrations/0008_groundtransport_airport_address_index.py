@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-15 09:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_alter_userprofile_currency_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='groundtransport',
+            index=models.Index(fields=['from_airport', 'to_address'], name='core_ground_from_ai_d707b2_idx'),
+        ),
+    ]
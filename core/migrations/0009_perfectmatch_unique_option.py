@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-15 09:24
+
+from django.conf import settings
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0008_groundtransport_airport_address_index'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='perfectmatch',
+            unique_together={('user1', 'user2', 'trip_option')},
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-15 09:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_perfectmatch_unique_option'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='perfectmatch',
+            index=models.Index(fields=['user1', 'user2', 'match_score'], name='core_perfec_user1_i_4acb36_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-15 09:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_perfectmatch_pair_score_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['origin_airport', 'departure_time'], name='core_flight_origin__c7b38d_idx'),
+        ),
+    ]
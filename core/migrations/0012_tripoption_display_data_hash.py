@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-15 10:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_flight_origin_departure_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tripoption',
+            name='display_data_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Digest of display_data so the same API offer is saved once', max_length=16, null=True, unique=True),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-15 10:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_tripoption_display_data_hash'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tripoption',
+            name='display_data_hash',
+            field=models.CharField(blank=True, editable=False, help_text='Digest of the saver and display_data so each user saves the same API offer once', max_length=16, null=True, unique=True),
+        ),
+    ]
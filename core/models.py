@@ -2,9 +2,10 @@ from django.db import models
 from django.contrib.auth.models import User
 from django.core.validators import MinValueValidator, MaxValueValidator
 from geopy.geocoders import Nominatim
-from geopy.distance import geodesic
 import json
 
+from .geo import great_circle_km
+
 
 class Airport(models.Model):
     """Airport model with location data"""
@@ -42,8 +43,8 @@ class Airport(models.Model):
         return f"{self.name} ({self.iata_code})"
 
     def distance_to(self, lat, lon):
-        """Calculate distance in km to a point"""
-        return geodesic((self.latitude, self.longitude), (lat, lon)).kilometers
+        """Calculate great-circle distance in km to a point"""
+        return great_circle_km(float(self.latitude), float(self.longitude), float(lat), float(lon))
 
 
 class GroundTransport(models.Model):
@@ -73,6 +74,11 @@ class GroundTransport(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['from_airport', 'to_address']),
+        ]
+
     def __str__(self):
         return f"{self.name} from {self.from_airport.iata_code}"
 
@@ -114,6 +120,7 @@ class Flight(models.Model):
         indexes = [
             models.Index(fields=['origin_airport',
                          'destination_airport', 'departure_time']),
+            models.Index(fields=['origin_airport', 'departure_time']),
             models.Index(fields=['price_eur']),
         ]
 
@@ -337,6 +344,14 @@ class TripOption(models.Model):
         blank=True,
         help_text="Flight/offer details when saved from API (no DB flight)"
     )
+    display_data_hash = models.CharField(
+        max_length=16,
+        null=True,
+        blank=True,
+        unique=True,
+        editable=False,
+        help_text="Digest of the saver and display_data so each user saves the same API offer once"
+    )
 
     created_at = models.DateTimeField(auto_now_add=True)
 
@@ -433,6 +448,10 @@ class PerfectMatch(models.Model):
 
     class Meta:
         ordering = ['-match_score', '-created_at']
+        unique_together = ['user1', 'user2', 'trip_option']
+        indexes = [
+            models.Index(fields=['user1', 'user2', 'match_score']),
+        ]
 
     def __str__(self):
         return f"Match: {self.user1.username} & {self.user2.username} - Option {self.trip_option.id}"
@@ -1,10 +1,12 @@
 """
 Signal handlers for automatic profile creation
 """
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.auth.models import User
-from .models import UserProfile
+from .delays import invalidate_delay_response, invalidate_delay_table
+from .geo import invalidate_airport_index
+from .models import Airport, DelayPrediction, Flight, UserProfile
 
 
 @receiver(post_save, sender=User)
@@ -33,3 +35,11 @@ def save_user_profile(sender, instance, **kwargs):
         # Ignore errors if profile doesn't exist or database schema is outdated
         # This can happen during migrations
         pass
+
+
+post_save.connect(invalidate_airport_index, sender=Airport, dispatch_uid='airport_index_save')
+post_delete.connect(invalidate_airport_index, sender=Airport, dispatch_uid='airport_index_delete')
+post_save.connect(invalidate_delay_table, sender=DelayPrediction, dispatch_uid='delay_table_save')
+post_delete.connect(invalidate_delay_table, sender=DelayPrediction, dispatch_uid='delay_table_delete')
+post_save.connect(invalidate_delay_response, sender=Flight, dispatch_uid='delay_response_save')
+post_delete.connect(invalidate_delay_response, sender=Flight, dispatch_uid='delay_response_delete')
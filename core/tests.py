@@ -0,0 +1,278 @@
+"""
+Core app tests for NearNode.
+Run: python manage.py test core
+"""
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.contrib.auth import get_user_model
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+from core.models import Airport, Flight, TripOption, UserProfile
+from core.management.commands.load_world_airports import _parse_airport_row
+
+User = get_user_model()
+
+# Test-only credential; not used in production.
+TEST_AUTH_SECRET = 'testpass123'
+
+
+class ParseAirportRowTest(TestCase):
+    """OurAirports CSV rows are parsed into (icao_code, defaults) or rejected."""
+
+    ROW = {
+        'ident': 'lfpg', 'type': 'large_airport', 'name': 'Charles de Gaulle',
+        'latitude_deg': '49.012798309326', 'longitude_deg': '2.5499999523163',
+        'iso_country': 'FR', 'municipality': 'Paris', 'iata_code': ' cdg ',
+    }
+
+    def _row(self, **overrides):
+        return {**self.ROW, **overrides}
+
+    def test_parses_codes_and_quantizes_coordinates_to_decimal(self):
+        icao, defaults = _parse_airport_row(self._row())
+        self.assertEqual(icao, 'LFPG')
+        self.assertEqual(defaults['iata_code'], 'CDG')
+        self.assertEqual((defaults['name'], defaults['city'], defaults['country']), ('Charles de Gaulle', 'Paris', 'FR'))
+        self.assertIsInstance(defaults['latitude'], Decimal)
+        self.assertEqual(defaults['latitude'], Decimal('49.012798'))
+        self.assertEqual(defaults['longitude'], Decimal('2.550000'))
+        self.assertEqual(defaults['layover_quality_score'], Decimal('0'))
+
+    def test_rejects_other_airport_types(self):
+        for airport_type in ('heliport', 'closed', 'seaplane_base', '', None):
+            self.assertIsNone(_parse_airport_row(self._row(type=airport_type)), airport_type)
+        self.assertIsNone(_parse_airport_row({k: v for k, v in self.ROW.items() if k != 'type'}))
+
+    def test_rejects_missing_or_blank_iata_code(self):
+        for iata in ('', '   ', None):
+            self.assertIsNone(_parse_airport_row(self._row(iata_code=iata)), repr(iata))
+
+    def test_rejects_missing_ident(self):
+        self.assertIsNone(_parse_airport_row(self._row(ident='  ')))
+
+    def test_rejects_empty_or_invalid_coordinates(self):
+        for coords in ({'latitude_deg': ''}, {'longitude_deg': '  '}, {'latitude_deg': None}, {'longitude_deg': 'n/a'}):
+            self.assertIsNone(_parse_airport_row(self._row(**coords)), coords)
+
+
+class LoadWorldAirportsCommandTest(TestCase):
+    """OurAirports CSV import upserts airports in batches."""
+
+    CSV = (
+        'ident,type,name,latitude_deg,longitude_deg,iso_country,municipality,iata_code\n'
+        'LFPG,large_airport,Charles de Gaulle,49.012798309326,2.5499999523163,FR,Paris,CDG\n'
+        'EDDB,large_airport,Berlin Brandenburg,52.3667,13.5033,DE,Berlin,BER\n'
+        'XXXX,small_airport,Duplicate IATA,10.0,10.0,FR,Nowhere,CDG\n'
+        'EGLL,heliport,Heliport,51.47,-0.45,GB,London,LHR\n'
+    )
+
+    def _run(self):
+        from django.core.management import call_command
+        from io import StringIO
+        resp = MagicMock()
+        resp.iter_lines.return_value = iter(self.CSV.splitlines())
+        resp.__enter__.return_value = resp
+        out = StringIO()
+        with patch('core.management.commands.load_world_airports.requests.get', return_value=resp) as mock_get:
+            call_command('load_world_airports', stdout=out)
+        self.assertTrue(mock_get.call_args.kwargs['stream'])
+        resp.iter_lines.assert_called_once_with(decode_unicode=True)
+        return out.getvalue()
+
+    def test_creates_then_updates_and_skips_conflicting_iata(self):
+        Airport.objects.create(
+            icao_code='LFPG', iata_code='CDG', name='Old name', city='Paris', country='FR',
+            latitude=Decimal('49.0'), longitude=Decimal('2.5'))
+        with CaptureQueriesContext(connection) as ctx:
+            out = self._run()
+        self.assertIn('Created: 1, Updated: 1, Unchanged: 0, Skipped: 2', out)
+        self.assertEqual(Airport.objects.get(icao_code='LFPG').name, 'Charles de Gaulle')
+        self.assertTrue(Airport.objects.filter(icao_code='EDDB', iata_code='BER').exists())
+        self.assertFalse(Airport.objects.filter(icao_code='XXXX').exists())
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT')]
+        self.assertEqual(len(inserts), 1)
+
+    def test_rerun_writes_only_changed_rows(self):
+        self._run()
+        with CaptureQueriesContext(connection) as ctx:
+            out = self._run()
+        self.assertIn('Created: 0, Updated: 0, Unchanged: 2, Skipped: 2', out)
+        self.assertFalse([q for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))])
+
+
+class ProfilePageAirportListTest(TestCase):
+    """Profile dropdown is served from the cached airport index."""
+
+    def setUp(self):
+        from core.geo import invalidate_airport_index
+        invalidate_airport_index()
+        for icao, iata, city, country in [
+            ('LFPG', 'CDG', 'Paris', 'France'),
+            ('EDDB', 'BER', 'Berlin', 'Germany'),
+            ('LFLL', 'LYS', 'Lyon', 'France'),
+        ]:
+            Airport.objects.create(
+                icao_code=icao, iata_code=iata, name=iata, city=city, country=country,
+                latitude=Decimal('48.0'), longitude=Decimal('2.0'))
+        self.user = User.objects.create_user(username='dropdown', password=TEST_AUTH_SECRET)
+        self.client.force_login(self.user)
+        cache.clear()
+
+    def test_dropdown_ordered_without_airport_query(self):
+        from core.geo import airport_index
+        airport_index()
+        profile = self.user.profile
+        profile.home_airport = Airport.objects.get(iata_code='CDG')
+        profile.save()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/profile/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([a.iata_code for a in response.context['airports']], ['LYS', 'CDG', 'BER'])
+        self.assertContains(response, 'data-selected="CDG"')
+        self.assertNotRegex(response.content.decode(), r'value="CDG"[^>]*selected')
+        self.assertEqual(
+            len([q for q in ctx.captured_queries if 'FROM "core_userprofile"' in q['sql']]), 1)
+        self.assertFalse([q for q in ctx.captured_queries if 'FROM "core_airport"' in q['sql']])
+
+    def test_cached_dropdown_follows_home_airport_and_airport_changes(self):
+        profile = self.user.profile
+        for iata in ('CDG', 'BER'):
+            profile.home_airport = Airport.objects.get(iata_code=iata)
+            profile.save()
+            self.assertContains(self.client.get('/profile/'), 'data-selected="{}"'.format(iata))
+        # Both home airports share one cached copy of the option list
+        fragments = [key for key in cache._cache if 'template.cache.airports_dropdown' in key]
+        self.assertEqual(len(fragments), 1)
+        Airport.objects.filter(iata_code='LYS').update(name='Lyon Saint-Exupery', updated_at=timezone.now())
+        from core.geo import invalidate_airport_index
+        invalidate_airport_index()
+        self.assertContains(self.client.get('/profile/'), 'Lyon Saint-Exupery')
+
+    def test_saved_trip_cards_load_in_one_query(self):
+        import re
+        cdg = Airport.objects.get(iata_code='CDG')
+        ber = Airport.objects.get(iata_code='BER')
+        departure = timezone.now() + timedelta(days=3)
+        for number in ('AF1', 'AF2'):
+            flight = Flight.objects.create(
+                flight_number=number, airline='AF', origin_airport=cdg, destination_airport=ber,
+                departure_time=departure, arrival_time=departure + timedelta(hours=2),
+                price_eur=Decimal('90'), duration_minutes=120,
+            )
+            trip = TripOption.objects.create(
+                flight=flight, total_trip_cost_eur=Decimal('90'), total_trip_time_minutes=120,
+                saved_at=timezone.now())
+            trip.saved_by.add(self.user)
+        from core.geo import airport_index
+        airport_index()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get('/profile/')
+        self.assertContains(response, 'CDG – Paris, France')
+        related = re.compile(r'FROM "core_(flight|flightconnection|airport|groundtransport)"')
+        self.assertFalse([q['sql'] for q in ctx.captured_queries if related.search(q['sql'])])
+
+
+class SaveTripViewTest(TestCase):
+    """Saving a trip links it to the user once and keeps the first saved_at."""
+
+    def setUp(self):
+        self.user = User.objects.create_user(username='saver', password=TEST_AUTH_SECRET)
+        self.client.force_login(self.user)
+        self.trip = TripOption.objects.create(total_trip_cost_eur=Decimal('50'), total_trip_time_minutes=60)
+
+    def _save(self):
+        return self.client.post(
+            '/api/save-trip/', data={'trip_option_id': self.trip.pk}, content_type='application/json')
+
+    def test_resave_is_idempotent(self):
+        # Session, user, language profile, trip lookup, link insert, saved_at update
+        with self.assertNumQueries(6):
+            self.assertTrue(self._save().json()['success'])
+        self.trip.refresh_from_db()
+        first_saved_at = self.trip.saved_at
+        self.assertIsNotNone(first_saved_at)
+        with self.assertNumQueries(5):
+            self.assertTrue(self._save().json()['success'])
+        self.trip.refresh_from_db()
+        self.assertEqual(self.trip.saved_at, first_saved_at)
+        self.assertEqual(list(self.trip.saved_by.all()), [self.user])
+
+    def test_save_by_flight_id_copies_price_and_duration(self):
+        origin = Airport.objects.create(
+            icao_code='LFPG', iata_code='CDG', name='CDG', city='Paris', country='France',
+            latitude=Decimal('49.0'), longitude=Decimal('2.5'))
+        destination = Airport.objects.create(
+            icao_code='EDDB', iata_code='BER', name='BER', city='Berlin', country='Germany',
+            latitude=Decimal('52.4'), longitude=Decimal('13.5'))
+        departure = timezone.now() + timedelta(days=2)
+        flight = Flight.objects.create(
+            flight_number='AF9', airline='AF', origin_airport=origin, destination_airport=destination,
+            departure_time=departure, arrival_time=departure + timedelta(minutes=105),
+            price_eur=Decimal('123.45'), duration_minutes=105)
+        response = self.client.post(
+            '/api/save-trip/', data={'flight_id': str(flight.pk)}, content_type='application/json')
+        trip = TripOption.objects.get(pk=response.json()['trip_id'])
+        self.assertEqual((trip.flight_id, trip.total_trip_cost_eur, trip.total_trip_time_minutes),
+                         (flight.pk, Decimal('123.45'), 105))
+        missing = self.client.post(
+            '/api/save-trip/', data={'flight_id': flight.pk + 100}, content_type='application/json')
+        self.assertEqual(missing.status_code, 400)
+
+    def test_same_offer_saved_once(self):
+        offer = {'total_trip_cost_eur': 89.5, 'total_trip_time_minutes': 95,
+                 'flight': {'flight_number': 'LH1', 'origin_airport': {'iata_code': 'FRA'}}}
+        reordered = {'flight': {'origin_airport': {'iata_code': 'FRA'}, 'flight_number': 'LH1'},
+                     'total_trip_time_minutes': 95, 'total_trip_cost_eur': 89.5}
+        ids = [
+            self.client.post('/api/save-trip/', data={'offer': payload}, content_type='application/json').json()['trip_id']
+            for payload in (offer, reordered)
+        ]
+        self.assertEqual(ids[0], ids[1])
+        self.assertEqual(TripOption.objects.filter(display_data__isnull=False).count(), 1)
+        self.assertEqual(TripOption.objects.get(pk=ids[0]).total_trip_cost_eur, Decimal('89.50'))
+
+    def test_same_offer_gets_a_row_per_user(self):
+        offer = {'total_trip_cost_eur': 89.5, 'total_trip_time_minutes': 95, 'flight': {'flight_number': 'LH1'}}
+        first = self.client.post('/api/save-trip/', data={'offer': offer}, content_type='application/json').json()
+        other = User.objects.create_user(username='other-saver', password=TEST_AUTH_SECRET)
+        self.client.force_login(other)
+        second = self.client.post('/api/save-trip/', data={'offer': offer}, content_type='application/json').json()
+        self.assertNotEqual(first['trip_id'], second['trip_id'])
+        self.assertEqual(list(TripOption.objects.get(pk=first['trip_id']).saved_by.all()), [self.user])
+        self.assertEqual(list(TripOption.objects.get(pk=second['trip_id']).saved_by.all()), [other])
+        self.assertIsNotNone(TripOption.objects.get(pk=second['trip_id']).saved_at)
+
+    def test_unsave_and_malformed_body(self):
+        self._save()
+        # Session, user, language profile, link delete
+        with self.assertNumQueries(4):
+            response = self.client.post(
+                '/api/unsave-trip/', data={'trip_option_id': self.trip.pk}, content_type='application/json')
+        self.assertTrue(response.json()['success'])
+        self.assertFalse(self.trip.saved_by.exists())
+        response = self.client.post(
+            '/api/unsave-trip/', data={'trip_option_id': self.trip.pk + 100}, content_type='application/json')
+        self.assertEqual(response.status_code, 404)
+        response = self.client.post('/api/save-trip/', data='{not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+
+
+class SignupViewTest(TestCase):
+    """Signup fills the profile that the User post_save signal creates."""
+
+    def test_signup_populates_signal_created_profile(self):
+        response = self.client.post('/signup/', {
+            'username': 'newcomer', 'password1': TEST_AUTH_SECRET, 'password2': TEST_AUTH_SECRET,
+            'email': 'new@example.com', 'first_name': 'Nia', 'phone_number': '+33 1 23',
+        })
+        self.assertRedirects(response, '/profile/', fetch_redirect_response=False)
+        profile = UserProfile.objects.get(user__username='newcomer')
+        self.assertEqual(
+            (profile.email, profile.first_name, profile.last_name, profile.phone_number),
+            ('new@example.com', 'Nia', '', '+33 1 23'))
+        self.assertEqual(profile.user.email, 'new@example.com')
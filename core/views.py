@@ -5,17 +5,25 @@ from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.views.decorators.http import require_http_methods
 from django.http import JsonResponse
+from django.db import transaction
 from core.models import UserProfile, Airport, TripOption, Flight, FlightConnection
 from core.countries import COUNTRY_CHOICES
+from core.geo import airport_index_version, airports_by_id, airports_for_display
 from django.views.decorators.csrf import csrf_exempt
 from django.utils import timezone
 from django.utils import translation
 from django.utils.translation import gettext as _
 from django.conf import settings
 from decimal import Decimal
+import hashlib
 import json
 import requests
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 
 @login_required
 def home_view(request):
@@ -46,22 +54,13 @@ def set_language_preference(request):
     return response
 
 
-def _populate_user_profile(user, profile, post_data):
-    """Helper function to populate user and profile with additional data"""
-    email = post_data.get('email')
-    if email:
-        user.email = email
-        profile.email = email
-        user.save()
-
-    if post_data.get('first_name'):
-        profile.first_name = post_data.get('first_name')
-    if post_data.get('last_name'):
-        profile.last_name = post_data.get('last_name')
-    if post_data.get('phone_number'):
-        profile.phone_number = post_data.get('phone_number')
-
-    profile.save()
+def _populate_user_profile(profile, post_data):
+    """Helper function to fill the signup-only profile fields and save them in one UPDATE"""
+    fields = [field for field in ('first_name', 'last_name', 'phone_number') if post_data.get(field)]
+    for field in fields:
+        setattr(profile, field, post_data.get(field))
+    if fields:
+        profile.save(update_fields=fields)
 
 
 def signup_view(request):
@@ -72,10 +71,13 @@ def signup_view(request):
     if request.method == 'POST':
         form = UserCreationForm(request.POST)
         if form.is_valid():
-            user = form.save()
-            profile = UserProfile.objects.create(user=user)
-            _populate_user_profile(user, profile, request.POST)
-            login(request, user)
+            with transaction.atomic():
+                user = form.save(commit=False)
+                user.email = request.POST.get('email') or ''
+                # post_save creates the profile and copies the email (core.signals)
+                user.save()
+                _populate_user_profile(user.profile, request.POST)
+            login(request, user, backend='django.contrib.auth.backends.ModelBackend')
             messages.success(request, _('Account created successfully!'))
             return redirect('profile')
         else:
@@ -156,7 +158,7 @@ def _update_profile_from_post(profile, user, post_data, request_obj):
     airport_code = post_data.get('home_airport')
     if airport_code:
         try:
-            airport = Airport.objects.get(iata_code=airport_code)
+            airport = Airport.objects.get(iata_code=airport_code.strip().upper())
             profile.home_airport = airport
         except Airport.DoesNotExist:
             messages.error(request_obj, _('Invalid airport code.'))
@@ -174,14 +176,28 @@ def _update_profile_from_post(profile, user, post_data, request_obj):
     profile.save()
 
 
+# Every FK the saved-trip cards render, joined into the one saved_trips query
+_SAVED_TRIP_RELATIONS = (
+    'flight__origin_airport',
+    'flight__destination_airport',
+    'flight_connection__first_flight__origin_airport',
+    'flight_connection__first_flight__destination_airport',
+    'flight_connection__second_flight__origin_airport',
+    'flight_connection__second_flight__destination_airport',
+    'flight_connection__ground_transport',
+)
+
+
 @login_required
 def profile_view(request):
     """User profile view"""
-    profile, created = UserProfile.objects.get_or_create(user=request.user)
-
-    # If profile was just created (e.g., from Google signup), populate from user
-    if created:
-        _initialize_new_profile(profile, request.user)
+    # Usually already loaded (and cached on request.user) by UserProfileLocaleMiddleware
+    profile = getattr(request.user, 'profile', None)
+    if profile is None:
+        profile, created = UserProfile.objects.get_or_create(user=request.user)
+        # If profile was just created (e.g., from Google signup), populate from user
+        if created:
+            _initialize_new_profile(profile, request.user)
 
     if request.method == 'POST':
         _update_profile_from_post(profile, request.user, request.POST, request)
@@ -190,20 +206,29 @@ def profile_view(request):
 
     # Get saved trips
     saved_trips = list(
-        TripOption.objects.filter(saved_by=request.user).order_by('-saved_at', '-created_at')
+        TripOption.objects.filter(saved_by=request.user)
+        .select_related(*_SAVED_TRIP_RELATIONS)
+        .order_by('-saved_at', '-created_at')
     )
     # Attach destination weather for each trip (non-persisted)
     for trip in saved_trips:
         city = trip.get_destination_city()
         trip.destination_weather = _fetch_weather_for_city(city) if city else None
 
-    # Get all airports for dropdown (world list; order by country, city, name)
-    airports = Airport.objects.all().order_by('country', 'city', 'name')
+    # World airport list for the dropdown (country, city, name), from the per-process airport index
+    airports = airports_for_display()
+    if profile.home_airport_id:
+        # Dropdown preselects its IATA code; take it from the airport index instead of a lazy FK fetch
+        home_airport = airports_by_id([profile.home_airport_id]).get(profile.home_airport_id)
+        if home_airport is not None:
+            profile.home_airport = home_airport
 
     context = {
         'profile': profile,
         'saved_trips': saved_trips,
         'airports': airports,
+        # Versions the cached dropdown fragment in core/profile.html
+        'airports_version': airport_index_version(),
         'country_choices': COUNTRY_CHOICES,
         'currency_choices': UserProfile.CURRENCY_CHOICES,
         'language_choices': getattr(settings, 'LANGUAGES', UserProfile.LANGUAGE_CHOICES),
@@ -245,7 +270,24 @@ def _fetch_weather_for_city(city_name):
         return None
 
 
-def _get_or_create_trip_option(data):
+def _json_body(request):
+    """Decode a JSON request body, using orjson when available."""
+    if orjson is None:
+        return json.loads(request.body)
+    return orjson.loads(request.body)
+
+
+def _offer_hash(offer, user_id):
+    """Short stable digest of a user's offer payload (key order independent) for TripOption.display_data_hash."""
+    if orjson is None:
+        encoded = json.dumps(offer, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    else:
+        encoded = orjson.dumps(offer, option=orjson.OPT_SORT_KEYS, default=str)
+    # The saver is part of the digest so each user gets their own row and saved_at
+    return hashlib.blake2b(b'%d:' % user_id + encoded, digest_size=8).hexdigest()
+
+
+def _get_or_create_trip_option(data, user):
     """Helper function to get or create a trip option from request data.
     Accepts trip_option_id, flight_id, connection_id (DB), or offer (API payload).
     """
@@ -265,15 +307,18 @@ def _get_or_create_trip_option(data):
             cost = Decimal('0')
         if minutes is None:
             minutes = 0
-        return TripOption.objects.create(
-            flight=None,
-            flight_connection=None,
-            total_trip_cost_eur=Decimal(str(cost)),
-            total_trip_time_minutes=int(minutes),
-            display_data=offer,
-            match_score=Decimal('100.0'),
-            rank=1
+        # The same user saving the same offer again reuses their row instead of inserting a duplicate
+        trip_option, _created = TripOption.objects.get_or_create(
+            display_data_hash=_offer_hash(offer, user.pk),
+            defaults={
+                'total_trip_cost_eur': Decimal(str(cost)),
+                'total_trip_time_minutes': int(minutes),
+                'display_data': offer,
+                'match_score': Decimal('100.0'),
+                'rank': 1,
+            },
         )
+        return trip_option
 
     # DB flight (flight_id must be an integer PK)
     if flight_id is not None:
@@ -282,21 +327,22 @@ def _get_or_create_trip_option(data):
         except (TypeError, ValueError):
             fid = None
         if fid is not None:
-            flight = Flight.objects.get(id=fid)
+            price, minutes = Flight.objects.filter(id=fid).values_list('price_eur', 'duration_minutes').get()
             return TripOption.objects.create(
-                flight=flight,
-                total_trip_cost_eur=flight.price_eur,
-                total_trip_time_minutes=flight.duration_minutes,
+                flight_id=fid,
+                total_trip_cost_eur=price,
+                total_trip_time_minutes=minutes,
                 match_score=Decimal('100.0'),
                 rank=1
             )
 
     if connection_id:
-        connection = FlightConnection.objects.get(id=connection_id)
+        connection_pk, cost, minutes = FlightConnection.objects.filter(id=connection_id).values_list(
+            'pk', 'total_cost_eur', 'total_duration_minutes').get()
         return TripOption.objects.create(
-            flight_connection=connection,
-            total_trip_cost_eur=connection.total_cost_eur,
-            total_trip_time_minutes=connection.total_duration_minutes,
+            flight_connection_id=connection_pk,
+            total_trip_cost_eur=cost,
+            total_trip_time_minutes=minutes,
             match_score=Decimal('100.0'),
             rank=1
         )
@@ -310,16 +356,19 @@ def save_trip(request):
     """Save a trip option"""
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
-            trip_option = _get_or_create_trip_option(data)
+            data = _json_body(request)
+            trip_option = _get_or_create_trip_option(data, request.user)
 
             if not trip_option:
                 return JsonResponse({'success': False, 'error': 'No trip identifier provided'}, status=400)
 
-            trip_option.saved_by.add(request.user)
+            # Link row insert is a no-op when already saved; saved_at is only set the first time
+            TripOption.saved_by.through.objects.bulk_create(
+                [TripOption.saved_by.through(tripoption_id=trip_option.pk, user_id=request.user.pk)],
+                ignore_conflicts=True,
+            )
             if not trip_option.saved_at:
-                trip_option.saved_at = timezone.now()
-                trip_option.save()
+                TripOption.objects.filter(pk=trip_option.pk, saved_at__isnull=True).update(saved_at=timezone.now())
             return JsonResponse({'success': True, 'message': 'Trip saved successfully!', 'trip_id': trip_option.id})
         except TripOption.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Trip not found'}, status=404)
@@ -335,12 +384,15 @@ def unsave_trip(request):
     """Remove a saved trip"""
     if request.method == 'POST':
         try:
-            data = json.loads(request.body)
+            data = _json_body(request)
             trip_option_id = data.get('trip_option_id')
 
             if trip_option_id:
-                trip_option = TripOption.objects.get(id=trip_option_id)
-                trip_option.saved_by.remove(request.user)
+                # Delete the link row directly; only look the trip up when nothing was removed
+                removed, _deleted = TripOption.saved_by.through.objects.filter(
+                    tripoption_id=trip_option_id, user_id=request.user.pk).delete()
+                if not removed and not TripOption.objects.filter(id=trip_option_id).exists():
+                    raise TripOption.DoesNotExist
                 return JsonResponse({'success': True, 'message': 'Trip removed from saved trips'})
         except TripOption.DoesNotExist:
             return JsonResponse({'success': False, 'error': 'Trip not found'}, status=404)
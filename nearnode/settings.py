@@ -169,6 +169,15 @@ REST_FRAMEWORK = {
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.IsAuthenticatedOrReadOnly',
     ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.ORJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'api.parsers.ORJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 20,
 }
@@ -204,6 +213,8 @@ GOOGLE_ROUTES_URL = config(
 AMADEUS_BASE_URL = config('AMADEUS_BASE_URL', default='https://test.api.amadeus.com')
 AMADEUS_TOKEN_PATH = config('AMADEUS_TOKEN_PATH', default='/v1/security/oauth2/token')
 AMADEUS_FLIGHT_OFFERS_PATH = config('AMADEUS_FLIGHT_OFFERS_PATH', default='/v2/shopping/flight-offers')
+# Cap on offers per Flight Offers Search call (API default is 250, which can be several MB)
+AMADEUS_MAX_OFFERS = config('AMADEUS_MAX_OFFERS', default=50, cast=int)
 OPENWEATHER_BASE_URL = config('OPENWEATHER_BASE_URL', default='https://api.openweathermap.org/data/2.5')
 
 # AI Search LLM. Set in .env: AI_SEARCH_LLM_BACKEND=ollama, OLLAMA_BASE_URL, AI_SEARCH_OLLAMA_MODEL.
@@ -213,6 +224,10 @@ OLLAMA_BASE_URL = config('OLLAMA_BASE_URL', default='')
 AI_SEARCH_OPENAI_MODEL = config('AI_SEARCH_OPENAI_MODEL', default='')
 AI_SEARCH_GROQ_MODEL = config('AI_SEARCH_GROQ_MODEL', default='')
 AI_SEARCH_OLLAMA_MODEL = config('AI_SEARCH_OLLAMA_MODEL', default='')
+# Parsed AI-search queries are cached this long. With AI_SEARCH_ASYNC_PARSE, cache misses are
+# answered with the keyword parse and the LLM call runs in a Celery worker.
+AI_SEARCH_PARSE_CACHE_TTL = config('AI_SEARCH_PARSE_CACHE_TTL', default=86400, cast=int)
+AI_SEARCH_ASYNC_PARSE = config('AI_SEARCH_ASYNC_PARSE', default=False, cast=bool)
 
 # Booking source overrides (optional).
 # - Keep empty to use built-in defaults from BookingComparisonService.